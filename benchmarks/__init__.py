@@ -0,0 +1,11 @@
+"""
+Headless benchmarks for the boxconfig core: link parsing, config generation and proxy checks
+against local stand-in servers. Run from the repository root:
+
+    python -m benchmarks                 # run everything and compare with benchmarks/baseline.json
+    python -m benchmarks --quick -k parse
+    python -m benchmarks --save          # record this machine's numbers as the baseline
+
+A best time more than --threshold slower than its baseline is reported as a regression and makes
+the run exit with status 1.
+"""
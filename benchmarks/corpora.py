@@ -0,0 +1,86 @@
+"""Deterministic synthetic inputs: proxy links of every supported kind, WireGuard confs and proxy lists."""
+
+import json
+import uuid
+import base64
+import random
+
+from boxconfig.models import AddedProxy
+
+SS_METHODS = ("aes-128-gcm", "aes-256-gcm", "chacha20-ietf-poly1305", "2022-blake3-aes-128-gcm")
+TRANSPORTS = ("tcp", "ws", "grpc", "http")
+
+def _rng(seed) -> random.Random: return random.Random(seed)
+
+def _host(rng) -> str:
+    roll = rng.random()
+    if roll < 0.6: return f"node{rng.randrange(10**6)}.{rng.choice(('example.com', 'example.net', 'test.org'))}"
+    if roll < 0.9: return f"198.51.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+    return f"2001:db8::{rng.randrange(1, 0xffff):x}"
+
+def _uuid(rng) -> str: return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+def _b64(text: str, urlsafe=False) -> str:
+    raw = text.encode()
+    return (base64.urlsafe_b64encode(raw) if urlsafe else base64.b64encode(raw)).decode().rstrip("=")
+
+def vmess_link(rng) -> str:
+    obj = {"v": "2", "ps": f"vm-{rng.randrange(10**5)}", "add": _host(rng), "port": str(rng.randrange(1, 65536)), "id": _uuid(rng),
+           "aid": "0", "scy": "auto", "net": rng.choice(TRANSPORTS), "type": "none", "host": "", "path": "/ray", "tls": rng.choice(("tls", ""))}
+    return "vmess://" + _b64(json.dumps(obj), urlsafe=rng.random() < 0.5)
+
+def vless_link(rng) -> str:
+    host = _host(rng); netloc = f"[{host}]" if ":" in host else host
+    return (f"vless://{_uuid(rng)}@{netloc}:{rng.randrange(1, 65536)}?encryption=none&security={rng.choice(('tls', 'reality', 'none'))}"
+            f"&type={rng.choice(TRANSPORTS)}&sni={host}&path=%2Fws#vl-{rng.randrange(10**5)}")
+
+def ss_link(rng) -> str:
+    host = _host(rng); netloc = f"[{host}]" if ":" in host else host
+    userinfo = f"{rng.choice(SS_METHODS)}:{_b64(str(rng.getrandbits(64)))}"
+    if rng.random() < 0.7: userinfo = _b64(userinfo, urlsafe=True)  # SIP002 base64 userinfo; the rest are plain
+    return f"ss://{userinfo}@{netloc}:{rng.randrange(1, 65536)}#ss-{rng.randrange(10**5)}"
+
+def socks_string(rng) -> str:
+    host = f"203.0.113.{rng.randrange(1, 255)}" if rng.random() < 0.5 else f"socks{rng.randrange(10**5)}.example.com"
+    if rng.random() < 0.5: return f"{host}:{rng.randrange(1, 65536)}"
+    return f"{host}:{rng.randrange(1, 65536)}:user{rng.randrange(1000)}:pw{rng.randrange(10**6)}"
+
+def other_link(rng) -> str:
+    host = _host(rng)
+    return rng.choice((f"socks5://u:p@{host}:1080", f"http://{host}:8080", f"https://{host}:443", f"trojan://x@{host}:443", "not a proxy at all"))
+
+def wireguard_conf(rng) -> str:
+    host = _host(rng); endpoint = f"[{host}]" if ":" in host else host
+    key = lambda: base64.b64encode(rng.randbytes(32)).decode()
+    return (f"[Interface]\nPrivateKey = {key()}\nAddress = 10.{rng.randrange(256)}.{rng.randrange(256)}.2/32, fd00::{rng.randrange(1, 0xffff):x}/128\nDNS = 1.1.1.1\n\n"
+            f"[Peer]\nPublicKey = {key()}\nAllowedIPs = 0.0.0.0/0, ::/0\nEndpoint = {endpoint}:{rng.randrange(1, 65536)}\n")
+
+GENERATORS = {"vmess": vmess_link, "vless": vless_link, "shadowsocks": ss_link, "socks": socks_string, "wireguard": wireguard_conf, "other": other_link}
+
+def corpus(kind: str, n: int, seed=1) -> list:
+    """n inputs of one kind, or a mix of every kind for "mixed". The same (kind, n, seed) gives the same list."""
+    rng = _rng(seed)
+    if kind == "mixed":
+        kinds = list(GENERATORS)
+        return [GENERATORS[rng.choice(kinds)](rng) for _ in range(n)]
+    gen = GENERATORS[kind]
+    return [gen(rng) for _ in range(n)]
+
+def proxy_list(n: int, seed=2) -> list:
+    """n selected AddedProxy objects of the link types, about 80% with a measured latency and 10% unreachable."""
+    from boxconfig.links import proxy_from_link
+    rng = _rng(seed); out = []
+    makers = (vmess_link, vless_link, ss_link, lambda r: "socks5://" + socks_string(r).split(":", 2)[0] + f":{r.randrange(1, 65536)}")
+    while len(out) < n:
+        proxy, _ = proxy_from_link(rng.choice(makers)(rng))
+        if proxy is None: continue
+        roll = rng.random()
+        if roll < 0.8: proxy.status = "Reachable"; proxy.latency_ms = rng.uniform(5, 800)
+        elif roll < 0.9: proxy.status = "Unreachable"
+        out.append(proxy)
+    return out
+
+def standin_proxy(ptype: str, port: int, user="") -> AddedProxy:
+    """A socks5/http proxy pointing at a local stand-in; a distinct `user` keeps its check off the warm caches."""
+    data = {"server": "127.0.0.1", "server_port": port, "username": user, "password": "pw" if user else ""}
+    return AddedProxy(ptype, f"{ptype.upper()} 127.0.0.1:{port}", data)
@@ -0,0 +1,151 @@
+"""Benchmark registry, timing loop, baseline file and regression report."""
+
+import gc
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import importlib
+import statistics
+from contextlib import contextmanager
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_REPEAT = 5
+REGRESSION_THRESHOLD = 0.5  # a best time this much slower than the baseline is a regression; shared machines jitter by ~30%
+NOISE_FLOOR_MS = 0.05  # differences smaller than this are never flagged
+MIN_SAMPLE_SECONDS = 0.05  # short benchmarks are looped until one sample takes at least this long
+MAX_LOOPS = 10000
+
+class SkipBenchmark(Exception):
+    """Raised by a setup that cannot run here (e.g. a missing optional dependency)."""
+
+class Benchmark:
+    """
+    `setup(size)` is a generator that prepares its inputs and yields (run, items); the runner times
+    run() with measure(), then closes the generator so it can tear down servers. run() may return
+    a dict of extra numbers to record (e.g. a success ratio).
+    """
+    def __init__(self, group, name, setup, sizes, quick_sizes=None, repeat=None, threshold=None):
+        self.group = group; self.name = name; self.setup = contextmanager(setup)
+        self.sizes = tuple(sizes); self.quick_sizes = tuple(quick_sizes or sizes)
+        self.repeat = repeat; self.threshold = threshold
+
+    def key(self, size) -> str: return f"{self.group}.{self.name}[{size}]"
+
+BENCHMARKS = []
+
+def benchmark(group, sizes, quick_sizes=None, repeat=None, threshold=None):
+    """Registers a setup generator as a benchmark named after it (minus a bench_ prefix)."""
+    def register(setup):
+        name = setup.__name__[len("bench_"):] if setup.__name__.startswith("bench_") else setup.__name__
+        BENCHMARKS.append(Benchmark(group, name, setup, sizes, quick_sizes, repeat, threshold))
+        return setup
+    return register
+
+def _timed(run, loops):
+    gc.collect(); gc_was_enabled = gc.isenabled(); gc.disable()
+    try:
+        start = time.perf_counter(); extra = None
+        for _ in range(loops): extra = run()
+        return time.perf_counter() - start, extra
+    finally:
+        if gc_was_enabled: gc.enable()
+
+def measure(run, items, repeat) -> dict:
+    """
+    Times run() like timeit: calls are looped until a sample lasts MIN_SAMPLE_SECONDS (the first
+    sample doubles as warm-up), then `repeat` samples are taken with the garbage collector off.
+    Regressions are judged on the best sample, the one least disturbed by the rest of the machine.
+    """
+    loops = 1
+    while True:
+        elapsed, extra = _timed(run, loops)
+        if elapsed >= MIN_SAMPLE_SECONDS or loops >= MAX_LOOPS: break
+        loops = min(MAX_LOOPS, loops * max(2, int(MIN_SAMPLE_SECONDS / max(elapsed, 1e-6))))
+    times = []
+    for _ in range(repeat):
+        elapsed, extra = _timed(run, loops); times.append(elapsed / loops)
+    best, median = min(times) * 1000, statistics.median(times) * 1000
+    result = {"best_ms": round(best, 4), "median_ms": round(median, 4), "max_ms": round(max(times) * 1000, 4),
+              "per_item_us": round(best * 1000 / max(1, items), 3), "items": items, "loops": loops, "runs": repeat}
+    result.update(extra or {})
+    return result
+
+def run_benchmarks(selected, quick=False, repeat=DEFAULT_REPEAT, out=sys.stdout) -> dict:
+    results = {}
+    for b in selected:
+        for size in (b.quick_sizes if quick else b.sizes):
+            key = b.key(size)
+            try:
+                with b.setup(size) as (run, items): results[key] = measure(run, items, b.repeat or repeat)
+            except SkipBenchmark as e:
+                print(f"{key:<46} skipped: {e}", file=out); continue
+            r = results[key]
+            extra = "  ".join(f"{k}={v}" for k, v in r.items() if k not in ("best_ms", "median_ms", "max_ms", "per_item_us", "items", "loops", "runs"))
+            print(f"{key:<46} {r['best_ms']:>11.3f} ms  (median {r['median_ms']:.3f})  {r['per_item_us']:>11.3f} us/item  {extra}", file=out)
+    return results
+
+def compare(results: dict, baseline: dict, threshold=REGRESSION_THRESHOLD) -> list:
+    """Returns (key, baseline ms, current ms, change, verdict) for every key present in both."""
+    thresholds = {b.key(size): b.threshold for b in BENCHMARKS for size in b.sizes + b.quick_sizes if b.threshold}
+    rows = []
+    for key, r in results.items():
+        base = baseline.get(key)
+        if not base: continue
+        old, new = base["best_ms"], r["best_ms"]
+        change = (new - old) / old if old else 0.0; limit = thresholds.get(key, threshold)
+        if change > limit and new - old > NOISE_FLOOR_MS: verdict = "REGRESSION"
+        elif change < -limit and old - new > NOISE_FLOOR_MS: verdict = "faster"
+        else: verdict = ""
+        rows.append((key, old, new, change, verdict))
+    return rows
+
+def load_baseline(path) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f: return json.load(f).get("results", {})
+    except FileNotFoundError: return {}
+
+def save_baseline(path, results: dict):
+    """Merges results into the baseline file, so a filtered run only replaces the keys it measured."""
+    merged = {**load_baseline(path), **results}
+    blob = {"machine": {"python": platform.python_version(), "implementation": platform.python_implementation(),
+                        "platform": platform.platform(), "processor": platform.machine(), "cpus": os.cpu_count()},
+            "saved_at": time.strftime("%Y-%m-%d %H:%M:%S"), "results": dict(sorted(merged.items()))}
+    with open(path, "w", encoding="utf-8") as f: json.dump(blob, f, indent=1); f.write("\n")
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Times parsing, config generation and checks against local stand-ins.")
+    parser.add_argument("-k", dest="filters", action="append", default=[], help="only benchmarks whose key contains this text (repeatable)")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes, for a fast smoke run")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed runs per benchmark (default %(default)s)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare against (default benchmarks/baseline.json)")
+    parser.add_argument("--save", action="store_true", help="store this run's numbers in the baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="slowdown fraction flagged as a regression (default %(default)s)")
+    parser.add_argument("--json", help="also write this run's results to a file")
+    parser.add_argument("--list", action="store_true", help="list benchmark keys and exit")
+    return parser
+
+def main(argv=None) -> int:
+    importlib.import_module(f"{__package__}.suites")  # defining the suites registers them in BENCHMARKS
+    args = build_parser().parse_args(argv)
+    matches = lambda b: not args.filters or any(f in b.key(size) for f in args.filters for size in b.sizes + b.quick_sizes)
+    selected = [b for b in BENCHMARKS if matches(b)]
+    if args.list:
+        for b in selected: print("\n".join(b.key(size) for size in (b.quick_sizes if args.quick else b.sizes)))
+        return 0
+    if not selected: print("No benchmark matches.", file=sys.stderr); return 2
+    results = run_benchmarks(selected, args.quick, max(1, args.repeat))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(results, f, indent=1)
+    if args.save:
+        save_baseline(args.baseline, results); print(f"Saved {len(results)} results to {args.baseline}."); return 0
+    rows = compare(results, load_baseline(args.baseline), args.threshold)
+    if not rows: print(f"No baseline numbers to compare with in {args.baseline}; run with --save to record them."); return 0
+    print(f"\nAgainst {args.baseline}:")
+    for key, old, new, change, verdict in rows:
+        print(f"{key:<46} {old:>11.3f} -> {new:>11.3f} ms  {change:>+7.1%}  {verdict}")
+    regressions = [row for row in rows if row[4] == "REGRESSION"]
+    print(f"{len(regressions)} regressions, {sum(1 for row in rows if row[4] == 'faster')} faster, {len(rows)} compared.")
+    return 1 if regressions else 0
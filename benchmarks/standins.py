@@ -0,0 +1,130 @@
+"""
+Local stand-ins for the network a check talks to: a TCP listener for the latency prober, and
+SOCKS5 and HTTP proxies that answer the Geo-IP, connectivity and speed-test download requests
+themselves. Each takes `delay` (seconds added before every reply, i.e. a slower proxy), `loss`
+(fraction of connections dropped without a reply) and `rate` (download pacing in bytes per second,
+0 = as fast as loopback goes), so check paths can be timed without leaving the machine.
+"""
+
+import json
+import time
+import random
+import socket
+import struct
+import threading
+from contextlib import contextmanager
+from urllib.parse import parse_qs, urlsplit
+
+STANDIN_HOST = "bench.invalid"  # never resolved: the stand-in proxies answer for it
+GEO_ANSWER = {"status": "success", "country": "Nowhere", "regionName": "Loopback", "query": "192.0.2.1"}
+DOWNLOAD_PATH = "/__down"  # ?bytes=N, like the real speed-test endpoint
+DOWNLOAD_CHUNK = 64 * 1024
+_DOWNLOAD_BLOCK = bytes(range(256)) * (DOWNLOAD_CHUNK // 256)
+
+class StandIn:
+    """A threaded loopback server; subclasses implement handle(conn). Use as a context manager."""
+    def __init__(self, delay=0.0, loss=0.0, seed=0, rate=0):
+        self.delay = delay; self.loss = loss; self.rate = rate; self._rng = random.Random(seed); self._rng_lock = threading.Lock()
+        self.connections = self.dropped = self.requests = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0)); self._sock.listen(1024)
+        self.port = self._sock.getsockname()[1]
+        self._closed = threading.Event()
+        threading.Thread(target=self._accept, name=f"{type(self).__name__}-{self.port}", daemon=True).start()
+
+    def _accept(self):
+        while not self._closed.is_set():
+            try: conn, _ = self._sock.accept()
+            except OSError: return
+            self.connections += 1
+            with self._rng_lock: drop = self._rng.random() < self.loss
+            if drop: self.dropped += 1; conn.close(); continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.handle(conn)
+        except OSError: pass
+        finally: conn.close()
+
+    def handle(self, conn): pass  # plain TCP: the handshake is all a probe needs
+
+    def close(self):
+        self._closed.set(); self._sock.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+def _read_exact(f, n) -> bytes:
+    data = f.read(n)
+    if len(data) < n: raise OSError("short read")
+    return data
+
+def _send_download(standin, conn, size):
+    """Sends `size` bytes, paced to standin.rate; the pacing is by wall clock so it does not drift."""
+    conn.sendall(f"HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\nContent-Length: {size}\r\n\r\n".encode())
+    sent = 0; start = time.perf_counter()
+    while sent < size and not standin._closed.is_set():
+        n = min(DOWNLOAD_CHUNK, size - sent); conn.sendall(_DOWNLOAD_BLOCK[:n]); sent += n
+        if standin.rate:
+            ahead = sent / standin.rate - (time.perf_counter() - start)
+            if ahead > 0: standin._closed.wait(ahead)
+
+def _serve_http(standin, f, conn, proxied=False):
+    """Answers HTTP/1.1 GETs on a kept-alive connection until the client closes it."""
+    while True:
+        line = f.readline()
+        if not line: return
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        while f.readline() not in (b"\r\n", b"\n", b""): pass
+        standin.requests += 1
+        if standin.delay: standin._closed.wait(standin.delay)
+        if method == "CONNECT" or (proxied and not target.startswith("http://")):
+            conn.sendall(b"HTTP/1.1 405 Method Not Allowed\r\nContent-Length: 0\r\n\r\n"); continue
+        url = urlsplit(target)
+        if url.path == DOWNLOAD_PATH:
+            _send_download(standin, conn, int(parse_qs(url.query).get("bytes", ["0"])[0])); continue
+        if target.endswith("/generate_204"): status, body = "204 No Content", b""
+        else: status, body = "200 OK", json.dumps(GEO_ANSWER).encode()
+        conn.sendall(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+
+class TcpStandIn(StandIn):
+    """Accepts and closes. The kernel completes the handshake, so `delay` does not apply here."""
+
+class HttpProxyStandIn(StandIn):
+    """An HTTP proxy that serves every absolute-URI GET itself."""
+    def handle(self, conn):
+        with conn.makefile("rb") as f: _serve_http(self, f, conn, proxied=True)
+
+class Socks5StandIn(StandIn):
+    """A SOCKS5 proxy (no auth or any username/password) whose tunnels end in a local HTTP responder."""
+    def handle(self, conn):
+        with conn.makefile("rb") as f:
+            _, nmethods = _read_exact(f, 2); methods = _read_exact(f, nmethods)
+            if self.delay: self._closed.wait(self.delay)
+            if 2 in methods:
+                conn.sendall(b"\x05\x02")
+                _, ulen = _read_exact(f, 2); _read_exact(f, ulen); plen = _read_exact(f, 1)[0]; _read_exact(f, plen)
+                conn.sendall(b"\x01\x00")
+            else: conn.sendall(b"\x05\x00")
+            _, cmd, _, atyp = _read_exact(f, 4)
+            if atyp == 1: _read_exact(f, 4)
+            elif atyp == 3: _read_exact(f, _read_exact(f, 1)[0])
+            elif atyp == 4: _read_exact(f, 16)
+            _read_exact(f, 2)
+            if cmd != 1: conn.sendall(b"\x05\x07\x00\x01" + bytes(6)); return
+            conn.sendall(b"\x05\x00\x00\x01" + socket.inet_aton("127.0.0.1") + struct.pack("!H", 0))
+            _serve_http(self, f, conn)
+
+@contextmanager
+def standin_endpoints():
+    """Points the Geo-IP, connectivity and speed-test URLs at STANDIN_HOST over plain HTTP for the duration."""
+    from boxconfig import network, checks, throughput
+    saved = network.GEOIP_ENDPOINTS, checks.CONNECTIVITY_URL, throughput.THROUGHPUT_URL
+    network.GEOIP_ENDPOINTS = [(f"http://{STANDIN_HOST}/json", network._parse_ip_api)]
+    checks.CONNECTIVITY_URL = f"http://{STANDIN_HOST}/generate_204"
+    throughput.THROUGHPUT_URL = f"http://{STANDIN_HOST}{DOWNLOAD_PATH}?bytes={{bytes}}"
+    try: yield
+    finally: network.GEOIP_ENDPOINTS, checks.CONNECTIVITY_URL, throughput.THROUGHPUT_URL = saved
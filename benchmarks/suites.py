@@ -0,0 +1,171 @@
+"""The benchmarks. Setups build their inputs outside the timed region; see runner.Benchmark."""
+
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+from boxconfig.decoders import (_decode_vmess, _decode_vless, _decode_shadowsocks, detect_proxy_type, parse_socks_string,
+                                parse_wireguard_conf)
+from boxconfig.links import parse_link, LinkParseError
+from boxconfig.config import FragmentCache, build_config
+
+from .corpora import corpus, proxy_list, standin_proxy
+from .runner import SkipBenchmark, benchmark
+from .standins import TcpStandIn, HttpProxyStandIn, Socks5StandIn, standin_endpoints
+
+PARSE_SIZES, PARSE_QUICK = (10, 1000, 100000), (10, 1000, 10000)
+GENERATE_SIZES, GENERATE_QUICK = (10, 1000, 10000), (10, 1000)
+CHECK_SIZES, CHECK_QUICK = (20,), (5,)
+NETWORK_THRESHOLD = 1.0  # loopback timings are noisier than pure CPU work
+STANDIN_DELAY = 0.02  # seconds per reply for the "slow" stand-ins
+STANDIN_LOSS = 0.1
+SPEED_SIZES, SPEED_QUICK = (1, 16), (1,)  # MB downloaded per speed test
+SPEED_PACED_RATE = 2_500_000  # bytes/s the "paced" stand-in sends, i.e. a 20 Mbps proxy
+SPEED_BUDGET_MBPS = 40  # shared by SPEED_CONCURRENT tests in the budgeted run
+SPEED_CONCURRENT = 4
+SPEED_BURST_SECONDS = 0.02  # budget burst allowance; the app's 0.25s would cover most of a quick run's transfer
+
+# --- Parsing ---
+def _map_bench(fn, kind, size):
+    items = corpus(kind, size)
+    def run():
+        for s in items: fn(s)
+    yield run, size
+
+@benchmark("parse", PARSE_SIZES, PARSE_QUICK)
+def bench_detect_proxy_type(size): yield from _map_bench(detect_proxy_type, "mixed", size)
+
+@benchmark("parse", PARSE_SIZES, PARSE_QUICK)
+def bench_decode_vmess(size): yield from _map_bench(_decode_vmess, "vmess", size)
+
+@benchmark("parse", PARSE_SIZES, PARSE_QUICK)
+def bench_decode_vless(size): yield from _map_bench(_decode_vless, "vless", size)
+
+@benchmark("parse", PARSE_SIZES, PARSE_QUICK)
+def bench_decode_shadowsocks(size): yield from _map_bench(_decode_shadowsocks, "shadowsocks", size)
+
+@benchmark("parse", PARSE_SIZES, PARSE_QUICK)
+def bench_parse_socks_string(size): yield from _map_bench(parse_socks_string, "socks", size)
+
+@benchmark("parse", PARSE_SIZES, PARSE_QUICK)
+def bench_parse_wireguard_conf(size): yield from _map_bench(parse_wireguard_conf, "wireguard", size)
+
+@benchmark("parse", PARSE_SIZES, PARSE_QUICK)
+def bench_parse_link(size):
+    """The whole import path for one line: classify, decode, validate."""
+    items = corpus("mixed", size)
+    def run():
+        failed = 0
+        for s in items:
+            try: parse_link(s)
+            except LinkParseError: failed += 1
+        return {"rejected": failed}
+    yield run, size
+
+# --- Config Generation ---
+@benchmark("generate", GENERATE_SIZES, GENERATE_QUICK)
+def bench_build_config(size):
+    """A first Generate: every outbound fragment is serialized."""
+    proxies = proxy_list(size)
+    yield (lambda: build_config(proxies) and None), size
+
+@benchmark("generate", GENERATE_SIZES, GENERATE_QUICK)
+def bench_build_config_cached(size):
+    """A repeat Generate with the app's FragmentCache warm."""
+    proxies = proxy_list(size); cache = FragmentCache()
+    yield (lambda: build_config(proxies, cache) and None), size
+
+# --- Checks Against Stand-ins ---
+def _closed_port() -> int:
+    s = socket.socket(); s.bind(("127.0.0.1", 0)); port = s.getsockname()[1]; s.close()
+    return port
+
+@benchmark("network", CHECK_SIZES, CHECK_QUICK, threshold=NETWORK_THRESHOLD)
+def bench_tcp_ping(size):
+    """Sequential single-sample probes through the shared prober loop."""
+    from boxconfig.network import _tcp_ping_host
+    with TcpStandIn() as server:
+        def run():
+            ok = sum(1 for _ in range(size) if _tcp_ping_host("127.0.0.1", server.port, timeout=2.0)[0] != float("inf"))
+            return {"ok_ratio": round(ok / size, 3)}
+        yield run, size
+
+@benchmark("network", (1000,), (200,), threshold=NETWORK_THRESHOLD)
+def bench_probe_many(size):
+    """One concurrent probe batch, STANDIN_LOSS of it aimed at a closed port (connection refused)."""
+    from boxconfig.network import PROBER
+    with TcpStandIn() as server:
+        closed = _closed_port(); step = round(1 / STANDIN_LOSS)
+        endpoints = [("127.0.0.1", closed if i % step == 0 else server.port) for i in range(size)]
+        def run():
+            results = PROBER.probe_many(endpoints, samples=1, timeout=2.0)
+            return {"ok_ratio": round(sum(1 for r in results if r.ok) / size, 3)}
+        yield run, size
+
+def _check_bench(standin_cls, ptype, size, warm, delay=0.0, loss=0.0):
+    from boxconfig.network import DEPENDENCIES_AVAILABLE, SESSIONS
+    if not DEPENDENCIES_AVAILABLE: raise SkipBenchmark("requests and PySocks are needed for the SOCKS5/HTTP check path")
+    from boxconfig.checks import check_proxy
+    with standin_cls(delay=delay, loss=loss) as server, standin_endpoints():
+        fresh = iter(range(10**9))
+        def run():
+            # Warm: one proxy, so its session and cached exit answer are reused. Cold: a new user every time.
+            proxies = [standin_proxy(ptype, server.port)] * size if warm else [standin_proxy(ptype, server.port, f"u{next(fresh)}") for _ in range(size)]
+            ok = sum(1 for p in proxies if check_proxy(p))
+            return {"ok_ratio": round(ok / size, 3)}
+        try: yield run, size
+        finally: SESSIONS.close_all()
+
+@benchmark("network", CHECK_SIZES, CHECK_QUICK, threshold=NETWORK_THRESHOLD)
+def bench_check_socks5_cold(size): yield from _check_bench(Socks5StandIn, "socks5", size, warm=False)
+
+@benchmark("network", CHECK_SIZES, CHECK_QUICK, threshold=NETWORK_THRESHOLD)
+def bench_check_socks5_warm(size): yield from _check_bench(Socks5StandIn, "socks5", size, warm=True)
+
+@benchmark("network", CHECK_SIZES, CHECK_QUICK, threshold=NETWORK_THRESHOLD)
+def bench_check_http_cold(size): yield from _check_bench(HttpProxyStandIn, "http", size, warm=False)
+
+@benchmark("network", CHECK_SIZES, CHECK_QUICK, threshold=NETWORK_THRESHOLD)
+def bench_check_http_warm(size): yield from _check_bench(HttpProxyStandIn, "http", size, warm=True)
+
+@benchmark("network", CHECK_SIZES, CHECK_QUICK, threshold=NETWORK_THRESHOLD)
+def bench_check_socks5_slow_lossy(size):
+    """STANDIN_DELAY per reply and STANDIN_LOSS of connections dropped, cold caches."""
+    yield from _check_bench(Socks5StandIn, "socks5", size, warm=False, delay=STANDIN_DELAY, loss=STANDIN_LOSS)
+
+# --- Speed Tests Against Stand-ins ---
+def _speed_bench(standin_cls, ptype, size, rate=0, budget_mbps=0, concurrent=1):
+    from boxconfig.network import DEPENDENCIES_AVAILABLE, SESSIONS
+    if not DEPENDENCIES_AVAILABLE: raise SkipBenchmark("requests and PySocks are needed for the speed test path")
+    from boxconfig.throughput import BandwidthBudget, throughput_test
+    with standin_cls(rate=rate) as server, standin_endpoints():
+        proxies = [standin_proxy(ptype, server.port, f"s{i}") for i in range(concurrent)]
+        budget = BandwidthBudget(budget_mbps, burst_seconds=SPEED_BURST_SECONDS)
+        def run():
+            budget.configure(budget_mbps)  # each run starts with only the burst allowance
+            with ThreadPoolExecutor(concurrent) as pool:
+                list(pool.map(lambda p: throughput_test(p, max_bytes=size * 1_000_000, max_seconds=60, budget=budget), proxies))
+            stats = [p.throughput_stats for p in proxies]
+            if any("error" in st for st in stats): raise RuntimeError(stats[0].get("error"))
+            # mbps: what the proxies deliver (budget waits excluded, summed); delivered_mbps: all bytes over the wall time.
+            delivered = sum(st["bytes"] for st in stats) * 8 / max(st["seconds"] for st in stats) / 1e6
+            return {"mbps": round(sum(st["mbps"] for st in stats), 1), "delivered_mbps": round(delivered, 1), "stalls": sum(st["stalls"] for st in stats)}
+        try: yield run, size * concurrent
+        finally: SESSIONS.close_all()
+
+@benchmark("network", SPEED_SIZES, SPEED_QUICK, repeat=3, threshold=NETWORK_THRESHOLD)
+def bench_speed_socks5(size):
+    """One download at loopback speed: the cost of the read loop itself (per_item_us is per MB)."""
+    yield from _speed_bench(Socks5StandIn, "socks5", size)
+
+@benchmark("network", SPEED_SIZES, SPEED_QUICK, repeat=3, threshold=NETWORK_THRESHOLD)
+def bench_speed_http(size): yield from _speed_bench(HttpProxyStandIn, "http", size)
+
+@benchmark("network", (4,), (1,), repeat=3, threshold=NETWORK_THRESHOLD)
+def bench_speed_paced(size):
+    """A proxy sending SPEED_PACED_RATE; the reported mbps should match it."""
+    yield from _speed_bench(Socks5StandIn, "socks5", size, rate=SPEED_PACED_RATE)
+
+@benchmark("network", (4,), (1,), repeat=3, threshold=NETWORK_THRESHOLD)
+def bench_speed_budgeted(size):
+    """SPEED_CONCURRENT tests under one SPEED_BUDGET_MBPS budget; delivered_mbps should stay near it while mbps stays at loopback speed."""
+    yield from _speed_bench(Socks5StandIn, "socks5", size, budget_mbps=SPEED_BUDGET_MBPS, concurrent=SPEED_CONCURRENT)
@@ -0,0 +1,32 @@
+"""
+Headless core of BoxConfig: link parsing, proxy checks and sing-box config generation.
+Nothing here imports Kivy. Submodules load on first attribute access, so parsing or
+generating a config never pays for asyncio or requests.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "AddedProxy": "models", "select_proxies": "models", "SORT_NAMES": "models", "FIELD_NAMES": "models", "format_latency": "models",
+    "memory_report": "models", "memory_summary": "models", "format_throughput": "models",
+    "detect_proxy_type": "decoders", "parse_socks_string": "decoders", "parse_wireguard_conf": "decoders", "LINK_DECODERS": "decoders",
+    "LinkParseError": "links", "ParsedLink": "links", "parse_link": "links", "parse_many": "links", "proxy_from_link": "links",
+    "ProxyIndex": "links", "proxy_identity": "links", "merge_duplicate": "links", "forget_checks": "links", "insert_proxy": "links", "ImportJob": "links",
+    "MERGE_SKIP": "links", "MERGE_REPLACE": "links", "MERGE_NEWEST": "links", "MERGE_POLICIES": "links",
+    "outbound_tag_for_type": "config", "TagAllocator": "config", "FragmentCache": "config", "config_template": "config", "build_config": "config",
+    "rank_proxies": "config", "UNREACHABLE_POLICIES": "config", "URLTEST_DEFAULTS": "config", "GENERATION_SETTINGS": "config", "generation_options": "config",
+    "GEN_ORDERS": "config",
+    "DNS_CACHE": "network", "GEOIP_CACHE": "network", "SESSIONS": "network", "PROBER": "network", "ProbeResult": "network",
+    "CheckEngine": "engine", "DEFAULT_CHECK_CONCURRENCY": "engine", "DeltaQueue": "engine", "check_proxy": "checks",
+    "HealthMonitor": "monitor", "format_age": "monitor", "monitor_entries": "monitor",
+    "METRICS": "metrics", "MetricsRegistry": "metrics", "Histogram": "metrics", "STAGES": "metrics", "stage_trace": "metrics",
+    "LatencyHistory": "history", "format_history": "history", "HISTORY_SIZE": "history",
+    "throughput_test": "throughput", "throughput_options": "throughput", "THROUGHPUT_SETTINGS": "throughput", "BandwidthBudget": "throughput", "BUDGET": "throughput",
+    "StateStore": "state", "proxy_from_state": "state", "proxy_to_state": "state",
+}
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None: raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f"{__name__}.{module}"), name)
@@ -0,0 +1,140 @@
+"""Single-proxy checks: TCP probes, Geo-IP through the proxy and the caches behind them."""
+
+import time
+import socket
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+from .logs import DEBUG, INFO, WARNING
+from .history import with_result
+from .metrics import METRICS, format_stages, record_stage, stage_trace
+from .models import AddedProxy
+from .network import (DEPENDENCIES_AVAILABLE, DNS_CACHE, FAMILIES, GEOIP_CACHE, SESSIONS, PROBER, CHECK_SAMPLES, CONNECTIVITY_URL,
+                      _describe_error, _format_geo, _proxy_netloc, geoip_via_session, proxy_url, timed_get, via_proxy_addresses)
+
+# --- Proxy Check ---
+def _no_log(message, level=INFO): pass
+
+def check_proxy(proxy: AddedProxy, hedged=False, log=_no_log, on_update=None) -> bool:
+    """
+    Checks one proxy. Progress messages go to log(message, level), step details at DEBUG.
+    The fields the check sets (status, info, latency_ms, latency_stats, checked_at, latency_history)
+    are passed to on_update(fields) when the check starts and when it ends, and the caller applies
+    them; without on_update they are set on proxy directly. Per-stage timings are kept in
+    latency_stats["stages"] and recorded in METRICS; latency_history becomes a copy with this
+    result added. Returns True if the proxy is reachable.
+    """
+    if on_update is None:
+        def on_update(fields):
+            for k, v in fields.items(): setattr(proxy, k, v)
+    start = time.perf_counter()
+    with stage_trace() as trace: ok, r = _check(proxy, hedged, log, on_update)
+    trace.add("total", (time.perf_counter() - start) * 1000); stages = trace.rounded()
+    r.latency_stats["stages"] = stages
+    METRICS.observe_check(proxy.uid, proxy.label, proxy.ptype, ok, stages)
+    log(f"-> Stages for {proxy.label}: {format_stages(stages)}", DEBUG)
+    r.checked_at = time.time()
+    r.latency_history = with_result(proxy.latency_history, ok, r.latency_ms, r.checked_at)
+    on_update(vars(r))
+    return ok
+
+def _check(proxy, hedged, log, on_update):
+    """check_proxy's body; returns (reachable, fields) with the final fields not yet applied."""
+    ptype = proxy.ptype.lower()
+    d = proxy.data
+    host, port, user, pw = None, None, None, None
+    on_update({"status": "Checking...", "info": "..."})
+    r = SimpleNamespace()  # the fields this check sets, kept off the proxy until on_update
+
+    log(f"Checking proxy: {proxy.label} ({proxy.ptype})", DEBUG)
+
+    try:
+        if ptype in ('socks5', 'http', 'wireguard'):
+            host, port, user, pw = d.get('server'), d.get('server_port'), d.get('username'), d.get('password')
+        elif ptype in ('vmess', 'vless', 'shadowsocks'):
+            decoded = proxy.decoded
+            host, port = decoded.get('server'), decoded.get('server_port')
+
+        if not host or not port:
+            raise Exception("Invalid Host/Port in config")
+
+        if ptype == 'wireguard':
+            if not DEPENDENCIES_AVAILABLE:
+                raise Exception("requests module needed for WG check")
+
+            log(f"-> Resolving endpoint {host} for WireGuard...", DEBUG)
+            try:
+                infos, latency_ms = DNS_CACHE.resolve(host); record_stage("resolve", latency_ms)
+                resolved_ip = FAMILIES.order(infos)[0]
+                r.status = "Reachable"
+                r.latency_ms = None; r.latency_stats = {"resolve": latency_ms}
+                r.info = f"Endpoint IP: {resolved_ip}"
+                log(f"-> Success for {proxy.label}. Endpoint resolved.")
+
+                cached_geo = GEOIP_CACHE.get(resolved_ip)
+                if cached_geo:
+                    r.info = _format_geo(cached_geo)
+                    log(f"-> Geo-IP for WG (cached): {r.info}", DEBUG)
+                else:
+                    log(f"-> Performing Geo-IP lookup for WireGuard IP {resolved_ip}...", DEBUG)
+                try:
+                    if not cached_geo:
+                        response = SESSIONS.get().get(f"https://ip-api.com/json/{resolved_ip}?fields=status,message,country,regionName", timeout=10)
+                        response.raise_for_status()
+                        geo_data = response.json()
+                        if geo_data.get("status") == "success":
+                            geo = {"country": geo_data.get("country"), "region": geo_data.get("regionName"), "ip": resolved_ip}
+                            GEOIP_CACHE.put(resolved_ip, geo)
+                            r.info = _format_geo(geo)
+                            log(f"-> Geo-IP for WG Success: {r.info}")
+                except Exception as e:
+                    log(f"-> Geo-IP for WG failed: {e}", WARNING)
+
+            except socket.gaierror:
+                raise Exception("Host Not Found")
+
+        elif ptype in ('socks5', 'http') and DEPENDENCIES_AVAILABLE:
+            log(f"-> Performing Geo-IP check for {host}:{port}...", DEBUG)
+            proxy_infos, resolve_ms = DNS_CACHE.resolve(host); record_stage("resolve", resolve_ms)
+
+            def through(proxy_ip):
+                session = SESSIONS.get(proxy_url(ptype, proxy_ip, port, user, pw))
+                via = f"{ptype}://{user or ''}@{_proxy_netloc(proxy_ip)}:{port}"
+                cached_geo = GEOIP_CACHE.get_exit(via)
+                if cached_geo:
+                    # Exit location is known; only prove the proxy still forwards traffic.
+                    response, latency_ms, reused = timed_get(session, CONNECTIVITY_URL)
+                    response.raise_for_status()
+                    log(f"-> Using cached Geo-IP for {proxy.label}", DEBUG)
+                    return proxy_ip, _format_geo(cached_geo), latency_ms, reused
+                def api_failed(url, exc): log(f"-> Geo-IP API {urlparse(url).hostname} failed: {exc}", DEBUG)
+                geo, latency_ms, reused = geoip_via_session(session, hedged=hedged, on_error=api_failed)
+                if geo.get("ip"): GEOIP_CACHE.put(geo["ip"], geo, via=via)
+                return proxy_ip, _format_geo(geo), latency_ms, reused
+
+            def retry(proxy_ip, exc): log(f"-> {proxy_ip} not reachable ({_describe_error(exc)}), trying the other address family", DEBUG)
+            proxy_ip, r.info, latency_ms, reused = via_proxy_addresses(proxy_infos, through, on_retry=retry)
+
+            r.status = "Reachable"
+            r.latency_ms = latency_ms; r.latency_stats = {"min": latency_ms, "median": latency_ms, "p95": latency_ms, "jitter": 0.0, "loss": 0.0, "samples": 1, "ip": proxy_ip, "resolve_ms": resolve_ms, "reused": reused}
+            log(f"-> Geo-IP Success for {proxy.label}: {r.info}")
+
+        else: # Fallback for other types or if dependencies are missing
+            result = PROBER.probe(host, int(port), samples=CHECK_SAMPLES)
+            record_stage("resolve", result.resolve_ms)
+            if result.ok: record_stage("connect", result.median)
+            if not result.ok:
+                raise Exception(result.error or "Timeout")
+            r.status = "Reachable"
+            r.latency_ms = result.median; r.latency_stats = result.stats()
+            r.info = f"Resolved IP: {result.ip}"
+            log(f"-> Ping Success for {proxy.label}. Latency: {result.summary()}, resolve {result.resolve_ms:.0f}ms")
+
+    except Exception as e:
+        r.status = "Unreachable"
+        r.latency_ms = None; r.latency_stats = {}
+        error_message = _describe_error(e)
+        r.info = f"Error: {error_message}"
+        log(f"-> Failure for {proxy.label}. Reason: {error_message}", WARNING)
+
+    return r.status == "Reachable", r
@@ -0,0 +1,168 @@
+"""
+Headless command line for the BoxConfig core, e.g.:
+
+    python -m boxconfig import links.txt --check --generate -o config.json
+    cat links.txt | python -m boxconfig import - --state settings.json --save
+    python -m boxconfig generate --state settings.json -o config.json
+    python -m boxconfig check --state settings.json --speed --budget 50 --order throughput --generate
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+
+from .config import GEN_ORDERS
+from .links import MERGE_POLICIES, MERGE_SKIP, IMPORT_MAX_ERROR_DETAILS, ProxyIndex, insert_proxy, proxy_from_link
+from .state import StateStore
+
+def _err(message): print(message, file=sys.stderr)
+
+def _iter_sources(sources):
+    """Yields lines from each file ("-" is stdin) one at a time, so large pastes are never held whole."""
+    for src in sources or ["-"]:
+        if src == "-":
+            yield from sys.stdin
+            continue
+        with open(src, "r", encoding="utf-8", errors="replace") as f: yield from f
+
+def import_links(lines, proxies, index, policy, verbose=False) -> dict:
+    counts = {"added": 0, "replaced": 0, "skipped": 0, "failed": 0}
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip(): continue
+        proxy, reason = proxy_from_link(line)
+        if proxy is None:
+            counts["failed"] += 1
+            if verbose or counts["failed"] <= IMPORT_MAX_ERROR_DETAILS: _err(f"line {line_no}: {reason}")
+            continue
+        result, _ = insert_proxy(proxies, index, proxy, policy)
+        counts[result] += 1
+    hidden = counts["failed"] - IMPORT_MAX_ERROR_DETAILS
+    if hidden > 0 and not verbose: _err(f"... {hidden} more import errors not shown.")
+    return counts
+
+def _log_for(verbose):
+    return (lambda message, level=None: _err(message)) if verbose else (lambda message, level=None: None)
+
+def _run_engine(check_fn, proxies, concurrency, deadline=None) -> dict:
+    """Runs check_fn over proxies on a CheckEngine and waits; Ctrl-C drops what has not started."""
+    from .engine import CheckEngine
+    from .network import PROBER
+    done = threading.Event(); summary = {}
+    def finished(progress): summary.update(progress); done.set()
+    engine = CheckEngine(check_fn, concurrency=concurrency, on_finished=finished)
+    if not engine.submit(proxies, deadline=deadline): return engine.progress()
+    try:
+        while not done.wait(0.5): pass
+    except KeyboardInterrupt:
+        engine.cancel(); PROBER.cancel_all(); done.wait()
+    return summary
+
+def check_all(proxies, concurrency, deadline=None, hedged=False, verbose=False) -> dict:
+    from .checks import check_proxy
+    log = _log_for(verbose)
+    summary = _run_engine(lambda p: check_proxy(p, hedged=hedged, log=log), proxies, concurrency, deadline)
+    for p in proxies:
+        if p.status in ("Queued", "Checking..."): p.status = "Idle"
+    return summary
+
+def speed_test_all(proxies, options, verbose=False) -> dict:
+    from .throughput import THROUGHPUT_CONCURRENCY, throughput_test
+    log = _log_for(verbose)
+    return _run_engine(lambda p: throughput_test(p, log=log, **options), proxies, THROUGHPUT_CONCURRENCY)
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--state", help="settings.json saved by the app (read for proxies and defaults)")
+    common.add_argument("--save", action="store_true", help="write proxies and check results back to --state")
+    common.add_argument("--check", action="store_true", help="check proxies before generating")
+    common.add_argument("--generate", action="store_true", help="write a sing-box config for the selected proxies")
+    common.add_argument("-o", "--output", help="config output path (default: stdout)")
+    common.add_argument("--order", choices=list(GEN_ORDERS), help="outbound order (default: saved setting or latency)")
+    common.add_argument("--unreachable", choices=["demote", "drop", "keep"], help="what to do with proxies whose last check failed (default: saved setting or demote)")
+    common.add_argument("--urltest", action="store_true", default=None, help="add an urltest outbound and make it the default")
+    common.add_argument("--urltest-url", help="URL the urltest outbound probes")
+    common.add_argument("--urltest-interval", help='urltest probe interval, e.g. "3m"')
+    common.add_argument("--urltest-tolerance", type=int, help="ms a faster outbound must win by before urltest switches")
+    common.add_argument("--all", action="store_true", help="check every proxy, not only selected ones")
+    common.add_argument("--merge", choices=list(MERGE_POLICIES), help="duplicate policy (default: saved setting or skip)")
+    common.add_argument("--concurrency", type=int, help="concurrent checks")
+    common.add_argument("--deadline", type=float, help="seconds before pending checks are skipped")
+    common.add_argument("--hedged", action="store_true", default=None, help="race Geo-IP endpoints")
+    common.add_argument("--metrics", help="after checking, write per-stage check metrics here (.prom: Prometheus text, otherwise JSON)")
+    common.add_argument("--speed", action="store_true", help="speed test the SOCKS5/HTTP proxies that are reachable after --check (or all of them)")
+    common.add_argument("--speed-mb", type=float, help="speed test download size cap in MB (default: saved setting or 5)")
+    common.add_argument("--speed-seconds", type=float, help="speed test time cap in seconds (default: saved setting or 10)")
+    common.add_argument("--budget", type=float, help="total Mbps shared by concurrent speed tests, 0 = unlimited (default: saved setting or 0)")
+    common.add_argument("-v", "--verbose", action="store_true")
+    parser = argparse.ArgumentParser(prog="boxconfig", description="Import, check and generate sing-box configs without the UI.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", parents=[common], help="import links from files or stdin")
+    imp.add_argument("sources", nargs="*", help='link files, one link per line ("-" or none reads stdin)')
+    sub.add_parser("check", parents=[common], help="check the proxies saved in --state")
+    sub.add_parser("generate", parents=[common], help="generate a config from the proxies saved in --state")
+    return parser
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    args.check = args.check or args.command == "check"
+    args.generate = args.generate or args.command == "generate"
+    if args.save and not args.state: _err("--save needs --state"); return 2
+
+    store = StateStore(args.state) if args.state else None
+    settings, proxies = store.load() if store else ({}, [])
+    index = ProxyIndex(); index.rebuild(proxies)
+    policy = args.merge or (settings.get("merge_policy") if settings.get("merge_policy") in MERGE_POLICIES else MERGE_SKIP)
+
+    if args.command == "import":
+        start = time.monotonic()
+        try: counts = import_links(_iter_sources(args.sources), proxies, index, policy, args.verbose)
+        except OSError as e: _err(f"boxconfig: {e}"); return 1
+        _err(f"Imported {counts['added']} added, {counts['replaced']} replaced, {counts['skipped']} duplicates skipped ({MERGE_POLICIES[policy]}), {counts['failed']} failed in {time.monotonic() - start:.2f}s.")
+
+    if args.check:
+        from .engine import DEFAULT_CHECK_CONCURRENCY
+        from .network import DNS_CACHE, GEOIP_CACHE
+        from .metrics import METRICS
+        if args.state: GEOIP_CACHE.load(os.path.join(os.path.dirname(os.path.abspath(args.state)), "geoip_cache.json"))
+        try: concurrency = args.concurrency or int(settings.get("check_concurrency") or DEFAULT_CHECK_CONCURRENCY)
+        except ValueError: concurrency = DEFAULT_CHECK_CONCURRENCY
+        try: deadline = args.deadline if args.deadline is not None else float(settings.get("check_deadline") or 0)
+        except ValueError: deadline = 0
+        hedged = args.hedged if args.hedged is not None else bool(settings.get("hedged_geoip"))
+        targets = [p for p in proxies if p.selected or args.all]
+        progress = check_all(targets, concurrency, deadline or None, hedged, args.verbose)
+        for p in targets: _err(f"{p.status:<12} {p.latency:<16} {p.label}  {p.info}")
+        _err(f"Checked {progress['done']}/{progress['total']}: {progress['ok']} reachable, {progress['failed']} failed, {progress['skipped']} skipped in {progress['elapsed']:.1f}s ({progress['rate']:.1f} checks/sec).")
+        if args.verbose: _err(DNS_CACHE.summary()); _err(GEOIP_CACHE.summary()); _err(METRICS.summary())
+        if args.metrics:
+            try: METRICS.write(args.metrics)
+            except OSError as e: _err(f"boxconfig: {e}"); return 1
+        GEOIP_CACHE.save()
+
+    if args.speed:
+        from .throughput import THROUGHPUT_TYPES, throughput_options
+        overrides = {"speed_max_mb": args.speed_mb, "speed_max_seconds": args.speed_seconds, "speed_budget_mbps": args.budget}
+        options = throughput_options({**settings, **{k: v for k, v in overrides.items() if v is not None}})
+        targets = [p for p in proxies if (p.selected or args.all) and p.ptype.lower() in THROUGHPUT_TYPES and (not args.check or p.status == "Reachable")]
+        progress = speed_test_all(targets, options, args.verbose)
+        for p in targets: _err(f"{p.throughput or 'N/A':<36} {p.label}")
+        budget = f"{options['budget_mbps']:g} Mbps budget" if options["budget_mbps"] else "no budget"
+        _err(f"Speed tested {progress['done']}/{progress['total']}: {progress['ok']} measured, {progress['failed']} failed in {progress['elapsed']:.1f}s ({budget}).")
+
+    if args.save:
+        store.track(proxies); store.compact()
+
+    if args.generate:
+        from .config import build_config, generation_options
+        overrides = {"gen_order": args.order, "gen_unreachable": args.unreachable, "urltest_on": args.urltest,
+                     "urltest_url": args.urltest_url, "urltest_interval": args.urltest_interval, "urltest_tolerance": args.urltest_tolerance}
+        options = generation_options({**settings, **{k: v for k, v in overrides.items() if v is not None}})
+        text, proxy_tags = build_config([p for p in proxies if p.selected], **options)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f: f.write(text)
+            _err(f"Generated config with {len(proxy_tags)} proxies: {args.output}")
+        else:
+            sys.stdout.write(text + "\n")
+    return 0
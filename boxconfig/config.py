@@ -0,0 +1,233 @@
+"""sing-box outbound building, tag allocation and config generation."""
+
+import json
+import hashlib
+import functools
+
+from .models import AddedProxy
+from .links import proxy_identity
+
+# --- Outbounds ---
+def _outbound_from_added(outbound_tag_for_type, p) -> dict:
+    t = p.ptype.lower(); tag = base_outbound_tag(p, outbound_tag_for_type)
+    if t == "wireguard":
+        d = p.data; sp = int(d.get("server_port") or 51820); local_addrs = [a.strip() for a in (d.get("local_address") or "").split(",") if a.strip()]
+        return {"type":"wireguard","tag":tag,"interface_name":"wg0", "local_address": local_addrs or ["10.74.200.203/32"], "private_key": d.get("private_key",""), "peers":[{"server": d.get("server",""), "server_port": sp, "public_key": d.get("peer_public_key",""), "allowed_ips":["0.0.0.0/0","::/0"]}], "mtu":1420}
+    if t in ("socks5","http","https"):
+        d = p.data; ob = {"type":"socks" if t=="socks5" else t,"tag":tag,"server": d.get("server",""), "server_port": int(d.get("server_port") or 0)}
+        if d.get("username"): ob["username"] = d.get("username"); ob["password"] = d.get("password","")
+        return ob
+    if t == "vmess":
+        d = p.decoded;
+        if not d: return {}
+        ob = {"type":"vmess","tag":tag,"server":d["server"],"server_port":d["server_port"], "uuid":d["uuid"],"alter_id": d.get("alter_id",0),"security": d.get("security","auto")}
+        if d.get("tls"): ob["tls"] = {"enabled": True, "server_name": d.get("sni") or ""};
+        if d.get("transport") in ("ws","grpc","quic","http"): ob["transport"] = {"type": d.get("transport"), "path": d.get("path","")}
+        return ob
+    if t == "vless":
+        d = p.decoded;
+        if not d: return {}
+        ob = {"type":"vless","tag":tag,"server":d["server"],"server_port":d["server_port"],"uuid":d["uuid"],"flow": d.get("flow","")}
+        if d.get("tls"): ob["tls"] = {"enabled": True, "server_name": d.get("sni") or ""};
+        if d.get("transport") in ("ws","grpc","quic","http"): ob["transport"] = {"type": d.get("transport"), "path": d.get("path","")}
+        return ob
+    if t == "shadowsocks":
+        d = p.decoded;
+        if not d: return {}
+        return {"type":"shadowsocks","tag":tag,"server":d["server"],"server_port":d["server_port"], "method": d["method"], "password": d["password"]}
+    return {}
+
+def outbound_tag_for_type(proxy_type: str):
+    t = (proxy_type or "").lower()
+    if t == "wireguard": return "WG-US";
+    if t == "socks5": return "SOCKS5-PROXY"
+    if t == "vmess": return "VMESS-PROXY";
+    if t == "vless": return "VLESS-PROXY"
+    if t == "shadowsocks": return "SS-PROXY";
+    if t == "http": return "HTTP-PROXY"
+    return "PROXY"
+
+# --- Outbound Tags ---
+RESERVED_TAGS = frozenset({"direct", "block", "dns", "dns-out", "PROXY", "auto"})
+
+def base_outbound_tag(p, tag_for_type=outbound_tag_for_type) -> str:
+    """Human-readable tag: type prefix plus host:port, e.g. "VLESS-example.com:443"."""
+    d = p.decoded; server = str(d.get("server") or "proxy"); port = d.get("server_port")
+    host = f"[{server}]" if ":" in server else server
+    prefix = tag_for_type(p.ptype.lower()).split("-")[0]
+    return f"{prefix}-{host}:{port}" if port else f"{prefix}-{host}"
+
+def _identity_hash(p, length=6) -> str:
+    return _hash_identity(proxy_identity(p))[:length]
+
+@functools.lru_cache(maxsize=4096)  # every tag carries one, so a regeneration mostly re-hashes identities it has seen
+def _hash_identity(identity: tuple) -> str:
+    return hashlib.sha1(repr(identity).encode("utf-8")).hexdigest()
+
+class TagAllocator:
+    """
+    Assigns unique, deterministic outbound tags in linear time, using a set of used tags. Every
+    tag is the readable base tag plus a short hash of the proxy's own identity, e.g.
+    "VLESS-b.example.com:443-e252b3", so it depends on nothing else: not list order, not which
+    other proxies are selected. A proxy keeps its tag across regenerations (clash_api selections
+    keep pointing at the same outbound). Appending it only on a collision would not do: which of
+    two proxies sharing a base tag got the bare one would depend on whether the other is selected,
+    so deselecting one would rename the other.
+    """
+    def __init__(self, reserved=RESERVED_TAGS): self.used = set(reserved)
+
+    def allocate(self, proxies) -> list:
+        tags = []
+        for p in proxies:
+            base = f"{base_outbound_tag(p)}-{_identity_hash(p)}"; tag = base; n = 2
+            while tag in self.used: tag = f"{base}-{n}"; n += 1  # identical proxies
+            self.used.add(tag); tags.append(tag)
+        return tags
+
+# --- Latency Ranking ---
+UNREACHABLE_DEMOTE, UNREACHABLE_DROP, UNREACHABLE_KEEP = "demote", "drop", "keep"
+UNREACHABLE_POLICIES = {UNREACHABLE_DEMOTE: "Move Last", UNREACHABLE_DROP: "Leave Out", UNREACHABLE_KEEP: "Keep"}
+GEN_ORDERS = {"latency": "Latency", "throughput": "Throughput", "added": "Added"}
+URLTEST_TAG = "auto"
+URLTEST_DEFAULTS = {"url": "https://www.gstatic.com/generate_204", "interval": "3m", "tolerance": 50}
+
+def _rank_key(p, demote=True, by_throughput=False) -> tuple:
+    if p.status == "Reachable":
+        if by_throughput and p.throughput_mbps: return (0, 0, -p.throughput_mbps)
+        ms = p.sustained_ms
+        return (0, 1 if ms is not None else 2, ms or 0.0)
+    return (2 if demote and p.status == "Unreachable" else 1, 0, 0.0)  # unchecked proxies sit between the two
+
+def rank_proxies(proxies, by_latency=True, unreachable=UNREACHABLE_DEMOTE, by_throughput=False) -> list:
+    """
+    Orders proxies by their checks: reachable ones fastest first by sustained latency (see
+    AddedProxy.sustained_ms; those without a latency figure after them), then unchecked ones. With
+    by_throughput, reachable proxies with a measured throughput come first, highest Mbps first. Unreachable ones follow the policy: "demote" moves
+    them last, "drop" leaves them out, "keep" ranks them like unchecked ones. Without by_latency
+    the added order is kept apart from that policy. Sorting is stable; `proxies` is not modified.
+    """
+    if unreachable == UNREACHABLE_DROP: out = [p for p in proxies if p.status != "Unreachable"]
+    else: out = list(proxies)
+    demote = unreachable == UNREACHABLE_DEMOTE
+    if by_latency: out.sort(key=lambda p: _rank_key(p, demote, by_throughput))
+    elif demote: out.sort(key=lambda p: p.status == "Unreachable")
+    return out
+
+# Saved-settings keys for generation, with their defaults; see generation_options().
+GENERATION_SETTINGS = {"gen_order": "latency", "gen_unreachable": UNREACHABLE_DEMOTE, "urltest_on": False,
+                       "urltest_url": "", "urltest_interval": "", "urltest_tolerance": None}
+
+def generation_options(settings: dict) -> dict:
+    """build_config keyword arguments from the GENERATION_SETTINGS keys of a settings dict (missing or blank keys use defaults)."""
+    get = lambda k: settings.get(k) if settings.get(k) not in (None, "") else GENERATION_SETTINGS[k]
+    urltest = None
+    if get("urltest_on"):
+        urltest = {k: get(f"urltest_{k}") for k in URLTEST_DEFAULTS if get(f"urltest_{k}") not in (None, "")}
+    unreachable = get("gen_unreachable") if get("gen_unreachable") in UNREACHABLE_POLICIES else UNREACHABLE_DEMOTE
+    order = get("gen_order") if get("gen_order") in GEN_ORDERS else GENERATION_SETTINGS["gen_order"]
+    return {"by_latency": order != "added", "by_throughput": order == "throughput", "unreachable": unreachable, "urltest": urltest}
+
+# --- Config Generation ---
+_OUTBOUNDS_PLACEHOLDER = "\x00outbounds\x00"
+
+def config_template(outbounds, final_route_tag="direct", dns_detour_tag="direct") -> dict:
+    return {
+        "log": {"level": "error"},
+        "dns": {
+            "servers": [
+                {
+                    "address": "https://1.1.1.1/dns-query",
+                    "detour": dns_detour_tag
+                }
+            ]
+        },
+        "inbounds": [
+            {
+                "type": "tproxy",
+                "tag": "tproxy-in",
+                "listen": "::",
+                "listen_port": 9898,
+                "sniff": True
+            },
+            {
+                "type": "redirect",
+                "tag": "redirect-in",
+                "listen": "::",
+                "listen_port": 9797,
+                "sniff": True,
+                "sniff_override_destination": False
+            }
+        ],
+        "outbounds": outbounds,
+        "route": {
+            "final": final_route_tag,
+            "auto_detect_interface": False
+        },
+        "experimental": {
+            "clash_api": {
+                "external_controller": "0.0.0.0:9090",
+                "external_ui": "dashboard"
+            }
+        }
+    }
+
+class FragmentCache:
+    """
+    Serialized outbound fragments (already indented for the outbounds array), keyed by proxy content
+    and allocated tag. Entries not used by the latest generation are dropped, so the cache never
+    holds more than the current selection.
+    """
+    def __init__(self): self._fragments = {}; self.reused = self.built = 0
+
+    @staticmethod
+    def key(p: AddedProxy, tag: str) -> tuple:
+        return (tag, p.ptype, p.raw or json.dumps(p.data, sort_keys=True))
+
+    def build(self, proxies, tags, indent="    "):
+        """Returns (fragments, tags) for proxies that produce an outbound, reusing unchanged fragments."""
+        fresh, fragments, kept_tags = {}, [], []
+        self.reused = self.built = 0
+        for p, tag in zip(proxies, tags):
+            key = self.key(p, tag)
+            frag = fresh.get(key) or self._fragments.get(key)
+            if frag is not None: self.reused += 1
+            else:
+                ob = _outbound_from_added(outbound_tag_for_type, p)
+                if not ob: continue
+                ob['tag'] = tag
+                frag = indent + json.dumps(ob, indent=2).replace("\n", "\n" + indent)
+                self.built += 1
+            fresh[key] = frag; fragments.append(frag); kept_tags.append(tag)
+        self._fragments = fresh
+        return fragments, kept_tags
+
+    def clear(self): self._fragments.clear()
+
+def build_config(proxies, cache: FragmentCache = None, by_latency=True, unreachable=UNREACHABLE_DEMOTE, urltest=None, by_throughput=False):
+    """
+    Builds the sing-box config text for the given proxies, ordered by rank_proxies() so the selectors
+    default to the best measured exit. With `urltest` (a dict overriding URLTEST_DEFAULTS, {} for the
+    defaults) an "auto" urltest outbound over all proxies becomes the selectors' default instead, so
+    the running core keeps picking the fastest one. Per-proxy outbounds come from the fragment cache
+    and are spliced into the serialized template, so only changed proxies are re-serialized.
+    Returns (config_text, proxy_tags) with proxy_tags in outbound order.
+    """
+    cache = cache if cache is not None else FragmentCache()
+    tag_of = dict(zip(map(id, proxies), TagAllocator().allocate(proxies)))  # tags follow the selection, not the ranking
+    ranked = rank_proxies(proxies, by_latency, unreachable, by_throughput)
+    fragments, proxy_tags = cache.build(ranked, [tag_of[id(p)] for p in ranked]) if ranked else ([], [])
+    head = ['    ' + json.dumps({"type": "direct", "tag": "direct"}, indent=2).replace("\n", "\n    ")]
+    tail = []
+    final_route_tag = dns_detour_tag = "direct"
+    if proxy_tags:
+        members, default = proxy_tags, proxy_tags[0]
+        if urltest is not None:
+            tail.append('    ' + json.dumps({"type": "urltest", "tag": URLTEST_TAG, "outbounds": proxy_tags, **URLTEST_DEFAULTS, **urltest}, indent=2).replace("\n", "\n    "))
+            members, default = [URLTEST_TAG] + proxy_tags, URLTEST_TAG
+        for tag in ("PROXY", "dns-out"):
+            selector = {"type": "selector", "tag": tag, "outbounds": members + ["direct"], "default": default}
+            tail.append('    ' + json.dumps(selector, indent=2).replace("\n", "\n    "))
+        final_route_tag, dns_detour_tag = "PROXY", "dns-out"
+    text = json.dumps(config_template(_OUTBOUNDS_PLACEHOLDER, final_route_tag, dns_detour_tag), indent=2)
+    outbounds = "[\n" + ",\n".join(head + fragments + tail) + "\n  ]"
+    return text.replace(json.dumps(_OUTBOUNDS_PLACEHOLDER), outbounds, 1), proxy_tags
@@ -0,0 +1,97 @@
+"""Proxy link classification and per-type decoders. Pure functions, no I/O."""
+
+import json
+import re
+import base64
+from urllib.parse import urlparse, parse_qs, unquote
+
+_SCHEME_RE = re.compile(r"^([A-Za-z][A-Za-z0-9+.\-]*)://")
+_SOCKS_RE = re.compile(r"^\s*([\w\.\-]+):(\d+)(?::([^:\s]+):([^:\s]+))?\s*$")
+_HOST_PORT_RE = re.compile(r"^[\w\.\-]+:\d+$")
+_WG_ENDPOINT_V6_RE = re.compile(r'\[(.*)\]:(\d+)')
+_WG_ADDRESS_SPLIT_RE = re.compile(r"[,\s]+")
+_VLESS_RE = re.compile(r"^vless://(?P<user>[^@/?#]*)@(?P<host>\[[^\]]*\]|[^:/?#@]+):(?P<port>\d+)/?(?:\?(?P<query>[^#]*))?(?:#.*)?$", re.I)
+_SS_RE = re.compile(r"^ss://(?P<user>[^@/?#]+)@(?P<host>\[[^\]]*\]|[^:/?#@]+):(?P<port>\d+)", re.I)
+SCHEME_TYPES = {"vmess": "vmess", "vless": "vless", "ss": "shadowsocks", "socks5": "socks5", "socks": "socks5", "socks5h": "socks5", "http": "http", "https": "http"}
+
+def _decode_vmess(url: str) -> dict:
+    try:
+        payload = url.split("://", 1)[1]
+        missing = len(payload) % 4
+        if missing: payload += "=" * (4 - missing)
+        obj = json.loads(base64.urlsafe_b64decode(payload.encode()).decode("utf-8", "ignore"))
+        return {"server": obj.get("add", ""), "server_port": int(obj.get("port", 0) or 0), "uuid": obj.get("id", ""), "alter_id": int(obj.get("aid", 0) or 0), "security": obj.get("scy") or "auto", "transport": obj.get("net") or "tcp", "sni": obj.get("sni") or obj.get("host") or "", "path": obj.get("path") or "", "header": obj.get("type") or "", "tls": (obj.get("tls") or "").lower() in ("tls", "reality", "xtls")}
+    except Exception: return {}
+
+def _query_first(query: str) -> dict:
+    """parse_qs(query) reduced to the first value per key, without building lists."""
+    out = {}
+    for part in query.split("&"):
+        if not part: continue
+        key, _, val = part.partition("=")
+        if key not in out: out[key] = unquote(val.replace("+", " ")) if ("%" in val or "+" in val) else val
+    return out
+
+def _host_port(m) -> tuple:
+    return m.group("host").strip("[]").lower(), int(m.group("port"))
+
+def _decode_vless(url: str) -> dict:
+    try:
+        m = _VLESS_RE.match(url)
+        if m:
+            user = unquote(m.group("user")); host, port = _host_port(m); qs = _query_first(m.group("query") or "")
+        else:
+            u = urlparse(url)
+            user = unquote(u.username or ""); host = u.hostname or ""; port = int(u.port or 0); qs = {k: v[0] for k, v in parse_qs(u.query).items()}
+        return {"server": host, "server_port": port, "uuid": user, "flow": qs.get("flow") or "", "transport": qs.get("type") or "tcp", "sni": qs.get("sni") or "", "path": qs.get("path") or "", "tls": (qs.get("security") or "").lower() in ("tls", "reality", "xtls")}
+    except Exception: return {}
+
+def _decode_shadowsocks(url: str) -> dict:
+    try:
+        m = _SS_RE.match(url)
+        if m: host, port = _host_port(m); userinfo = m.group("user")
+        else: u = urlparse(url); host = u.hostname or ""; port = int(u.port or 0); userinfo = u.netloc.split("@")[0]
+        if ":" not in userinfo:
+            missing = len(userinfo) % 4
+            if missing: userinfo += "=" * (4 - missing)
+            userinfo = base64.urlsafe_b64decode(userinfo.encode()).decode("utf-8", "ignore")
+        method, password = userinfo.split(":", 1)
+        return {"server": host, "server_port": port, "method": method, "password": password}
+    except Exception: return {}
+    
+LINK_DECODERS = {"vmess": _decode_vmess, "vless": _decode_vless, "shadowsocks": _decode_shadowsocks}
+
+def parse_socks_string(s: str):
+    m = _SOCKS_RE.match((s or "").strip())
+    if not m: return None
+    return {"server": m.group(1), "server_port": int(m.group(2)), "username": m.group(3) or "", "password": m.group(4) or ""}
+
+def detect_proxy_type(s: str):
+    """Single-pass classifier: one scheme match and a dict lookup, no URL parsing."""
+    s = (s or "").strip()
+    if not s: return "unknown"
+    if s.startswith("[Interface]") or "PrivateKey" in s: return "wireguard"
+    m = _SCHEME_RE.match(s)
+    if m: return SCHEME_TYPES.get(m.group(1).lower(), "unknown")
+    netloc = s.split("/", 1)[0]
+    if "@" in netloc or _HOST_PORT_RE.match(netloc) or _SOCKS_RE.match(s): return "socks5"
+    return "unknown"
+
+def parse_wireguard_conf(text: str) -> dict:
+    out = {"private_key": "", "local_address": [], "peer_public_key": "", "server": "", "server_port": ""}
+    lines = (text or "").splitlines()
+    for L in lines:
+        if "=" not in L: continue
+        key, val = L.split("=", 1); key, val = key.strip(), val.strip()
+        if key == "PrivateKey": out["private_key"] = val
+        if key == "Address": out["local_address"] = [a.strip() for a in _WG_ADDRESS_SPLIT_RE.split(val) if a.strip()]
+        if key == "PublicKey": out["peer_public_key"] = val
+        if key == "Endpoint":
+            match_ipv6 = _WG_ENDPOINT_V6_RE.match(val)
+            if match_ipv6: out["server"] = match_ipv6.group(1); out["server_port"] = int(match_ipv6.group(2))
+            elif ':' in val.rsplit(']', 1)[-1]:
+                host, port = val.rsplit(":", 1); out["server"] = host.strip()
+                try: out["server_port"] = int(port.strip())
+                except (ValueError, TypeError): out["server_port"] = ""
+            else: out["server"] = val
+    return out
@@ -0,0 +1,118 @@
+"""Bounded, round-robin bulk check engine and the hand-off of its results. Has no network imports, so the UI can build one at startup."""
+
+import os
+import time
+import threading
+from collections import deque, OrderedDict
+
+# --- Bulk Check Engine ---
+_MOBILE = "ANDROID_ARGUMENT" in os.environ or os.environ.get("KIVY_BUILD") == "ios"  # same test kivy.utils.platform uses
+DEFAULT_CHECK_CONCURRENCY = 8 if _MOBILE else 32
+
+class CheckEngine:
+    """
+    Runs proxy checks on a bounded pool of worker threads.
+    Proxies are queued per type and workers take from the queues round-robin, so one
+    slow type cannot starve the others. Workers exit as soon as the queues are empty.
+    """
+    def __init__(self, check_fn, concurrency=DEFAULT_CHECK_CONCURRENCY, on_progress=None, on_finished=None, on_skipped=None):
+        self.check_fn = check_fn
+        self.concurrency = max(1, int(concurrency))
+        self.on_progress = on_progress; self.on_finished = on_finished; self.on_skipped = on_skipped
+        self._lock = threading.Lock()
+        self._queues = {}; self._types = deque(); self._queued_ids = set()
+        self._workers = 0; self._deadline = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.total = self.done = self.ok = self.failed = self.skipped = 0
+        self.started_at = time.monotonic(); self.finished_at = None
+
+    @property
+    def running(self): return self._workers > 0
+
+    def submit(self, proxies, deadline=None) -> int:
+        """Queues proxies for checking and returns how many were newly queued."""
+        with self._lock:
+            if not self._workers: self._reset_stats(); self._deadline = None
+            if deadline: self._deadline = time.monotonic() + float(deadline)
+            queued = 0
+            for p in proxies:
+                if id(p) in self._queued_ids: continue
+                t = (p.ptype or "unknown").lower()
+                if t not in self._queues: self._queues[t] = deque(); self._types.append(t)
+                self._queues[t].append(p); self._queued_ids.add(id(p)); queued += 1
+            self.total += queued
+            spawn = min(self.concurrency - self._workers, len(self._queued_ids))
+            self._workers += max(0, spawn)
+        for _ in range(spawn): threading.Thread(target=self._run, daemon=True).start()
+        return queued
+
+    def cancel(self) -> list:
+        """Drops every proxy that has not started checking yet. In-flight checks run to completion."""
+        with self._lock: dropped = self._drain_locked()
+        if dropped and self.on_skipped: self.on_skipped(dropped)
+        return dropped
+
+    def _drain_locked(self):
+        dropped = [p for q in self._queues.values() for p in q]
+        self._queues.clear(); self._types.clear(); self._queued_ids.clear()
+        self.skipped += len(dropped)
+        return dropped
+
+    def _next_locked(self):
+        while self._types:
+            t = self._types[0]; q = self._queues[t]
+            if not q: del self._queues[t]; self._types.popleft(); continue
+            self._types.rotate(-1)
+            p = q.popleft(); self._queued_ids.discard(id(p))
+            return p
+        return None
+
+    def progress(self) -> dict:
+        elapsed = max((self.finished_at or time.monotonic()) - self.started_at, 1e-6)
+        return {"total": self.total, "done": self.done, "ok": self.ok, "failed": self.failed, "skipped": self.skipped, "queued": len(self._queued_ids), "running": self._workers, "elapsed": elapsed, "rate": self.done / elapsed}
+
+    def _run(self):
+        while True:
+            expired = []
+            with self._lock:
+                if self._deadline and time.monotonic() > self._deadline: expired = self._drain_locked()
+                proxy = self._next_locked()
+                if proxy is None:
+                    self._workers -= 1; last = self._workers == 0
+                    if last: self.finished_at = time.monotonic()
+                    break
+            if expired and self.on_skipped: self.on_skipped(expired)
+            try: ok = bool(self.check_fn(proxy))
+            except Exception: ok = False
+            with self._lock:
+                self.done += 1
+                if ok: self.ok += 1
+                else: self.failed += 1
+            if self.on_progress: self.on_progress(self.progress())
+        if expired and self.on_skipped: self.on_skipped(expired)
+        if last and self.on_finished: self.on_finished(self.progress())
+
+# --- Result Hand-off ---
+class DeltaQueue:
+    """
+    Thread-safe hand-off of per-proxy field updates from workers to the thread that owns the
+    proxies. post() merges into an update still pending for the same proxy, so a proxy that
+    changes several times between drains is applied once; drain(limit) takes the oldest `limit`.
+    """
+    def __init__(self): self._lock = threading.Lock(); self._pending = OrderedDict()
+
+    def __len__(self): return len(self._pending)
+
+    def post(self, proxy, fields: dict):
+        with self._lock:
+            entry = self._pending.get(id(proxy))
+            if entry is None: self._pending[id(proxy)] = (proxy, dict(fields))
+            else: entry[1].update(fields)
+
+    def drain(self, limit=None) -> list:
+        """Removes and returns up to `limit` (all if None) pending (proxy, fields) pairs, oldest first."""
+        with self._lock:
+            n = len(self._pending) if limit is None else min(limit, len(self._pending))
+            return [self._pending.popitem(last=False)[1] for _ in range(n)]
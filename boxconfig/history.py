@@ -0,0 +1,136 @@
+"""
+Per-proxy check history: the last HISTORY_SIZE results in fixed-size numeric ring buffers, with
+rolling p50/p95, success rate and trend kept up to date as results arrive. Network-free.
+"""
+
+import sys
+import math
+import base64
+import binascii
+from array import array
+from bisect import bisect_left, insort
+
+HISTORY_SIZE = 32  # results kept per proxy; the oldest is overwritten
+HISTORY_MIN_SAMPLES = 3  # results (and latency figures) needed before the rolling figures replace the last check
+HISTORY_TREND_SAMPLES = 8  # latency figures needed before a trend is fitted
+TREND_STEADY = 0.15  # latency change across the window, as a fraction of its mean, still called steady
+FAILED = -1.0  # stored for a failed check; NaN marks a reachable result without a figure (a resolve-only WireGuard check)
+
+class LatencyHistory:
+    """
+    Results of the last `size` checks. `at` (uint32 epoch seconds) and `ms` (float32) are ring
+    buffers written at `head`; `sorted` holds the window's latency figures in order for the
+    percentiles, and running sums over (result number, ms) give a least-squares trend, so a new
+    result costs one insert and one removal and a summary reads a few numbers. Result numbers count
+    from `x0`, moved up to the oldest result each time the ring wraps, when the sums are recomputed
+    from the window: they stay small however long the session runs, and rounding never piles up.
+    A history handed to another thread is not changed again: with_result() returns an updated copy.
+    """
+    __slots__ = ("size", "at", "ms", "head", "ok", "sorted", "seq", "x0", "_sx", "_sxx", "_sy", "_sxy")
+    def __init__(self, size=HISTORY_SIZE):
+        self.size = size; self.at = array("I"); self.ms = array("f"); self.sorted = array("f")
+        self.head = self.ok = self.seq = self.x0 = 0; self._sx = self._sxx = self._sy = self._sxy = 0.0
+
+    def record(self, ok, ms, at):
+        """Adds one check result: reachable or not, its latency (None if it had no figure) and wall-clock time."""
+        self._push(FAILED if not ok else math.nan if ms is None else ms, at)
+
+    def _push(self, value, at):
+        if len(self.ms) == self.size:  # full: the oldest result is at head
+            self._count(self.ms[self.head], self.seq - self.size, -1)
+            self.at[self.head] = int(at); self.ms[self.head] = value
+        else: self.at.append(int(at)); self.ms.append(value)
+        self._count(self.ms[self.head], self.seq, 1)  # read back, so the float32-rounded value is what gets counted
+        self.head = (self.head + 1) % self.size; self.seq += 1
+        if not self.head: self._resum()  # once per lap
+
+    def _count(self, v, x, sign):
+        if v < 0: return
+        self.ok += sign
+        if v != v: return  # NaN: reachable, no figure
+        if sign > 0: insort(self.sorted, v)
+        else: del self.sorted[bisect_left(self.sorted, v)]
+        x -= self.x0; self._sx += sign * x; self._sxx += sign * x * x; self._sy += sign * v; self._sxy += sign * x * v
+
+    def _resum(self):
+        """Recomputes the trend sums from the window, numbering results from the oldest (the ring is full, so it is at head)."""
+        self.x0 = self.seq - len(self.ms); self._sx = self._sxx = self._sy = self._sxy = 0.0
+        for x, v in enumerate(self.ms[self.head:] + self.ms[:self.head]):
+            if v >= 0: self._sx += x; self._sxx += x * x; self._sy += v; self._sxy += x * v  # NaN compares false
+
+    def copy(self) -> "LatencyHistory":
+        h = LatencyHistory.__new__(LatencyHistory)
+        for k in self.__slots__: setattr(h, k, getattr(self, k))
+        h.at = self.at[:]; h.ms = self.ms[:]; h.sorted = self.sorted[:]
+        return h
+
+    # Summaries
+    @property
+    def samples(self) -> int: return len(self.ms)
+
+    @property
+    def figures(self) -> int: return len(self.sorted)
+
+    @property
+    def success_rate(self) -> float: return self.ok / len(self.ms) if self.ms else None
+
+    @property
+    def last_at(self) -> int: return self.at[self.head - 1] if self.at else 0
+
+    def quantile(self, q) -> float:
+        """Nearest-rank quantile of the window's latency figures; None without any."""
+        n = len(self.sorted)
+        return self.sorted[min(n - 1, max(0, math.ceil(q * n) - 1))] if n else None
+
+    def trend(self) -> float:
+        """Fitted latency change across the window as a fraction of its mean (positive: getting slower); None with too few figures."""
+        n = len(self.sorted)
+        if n < HISTORY_TREND_SAMPLES or self._sy <= 0: return None
+        den = n * self._sxx - self._sx * self._sx
+        if den <= 0: return None
+        slope = (n * self._sxy - self._sx * self._sy) / den  # ms per result
+        return slope * len(self.ms) / (self._sy / n)
+
+    def score(self) -> float:
+        """p50 divided by the success rate, so a proxy failing half its checks ranks as if twice as slow; None with too few figures."""
+        if len(self.sorted) < HISTORY_MIN_SAMPLES: return None
+        return self.quantile(0.5) / max(self.success_rate, 0.05)
+
+    def summary(self) -> dict:
+        return {"samples": self.samples, "success_rate": self.success_rate, "p50_ms": self.quantile(0.5), "p95_ms": self.quantile(0.95),
+                "trend": self.trend(), "last_at": self.last_at}
+
+    # Saved form: base64 of the timestamps then the latencies, oldest first, little-endian.
+    def to_state(self) -> str:
+        at = self.at[self.head:] + self.at[:self.head]; ms = self.ms[self.head:] + self.ms[:self.head]
+        if sys.byteorder == "big": at.byteswap(); ms.byteswap()
+        return base64.b64encode(at.tobytes() + ms.tobytes()).decode("ascii")
+
+    @classmethod
+    def from_state(cls, text: str):
+        """A history from to_state() text (replayed, so a changed HISTORY_SIZE applies); None if it is empty or damaged."""
+        try: raw = base64.b64decode(text or "", validate=True)
+        except (binascii.Error, ValueError): return None
+        n = len(raw) // 8
+        if not n: return None
+        at = array("I"); at.frombytes(raw[:4 * n]); ms = array("f"); ms.frombytes(raw[4 * n:8 * n])
+        if sys.byteorder == "big": at.byteswap(); ms.byteswap()
+        h = cls()
+        for t, v in zip(at, ms): h._push(v, t)
+        return h
+
+def with_result(history, ok, ms, at) -> LatencyHistory:
+    """A copy of history (a new one if None) with one more result."""
+    h = history.copy() if history is not None else LatencyHistory()
+    h.record(ok, ms, at)
+    return h
+
+def format_history(h: LatencyHistory, last="N/A") -> str:
+    """Display text, e.g. "p50 42ms, p95 80ms, 96% ok of 25, getting slower (+30%)"; `last` stands in for too few figures."""
+    rate = f"{h.success_rate:.0%} ok of {h.samples}"
+    if h.figures < HISTORY_MIN_SAMPLES: return f"{last}, {rate}"
+    trend = h.trend()
+    if trend is None: drift = ""
+    elif abs(trend) < TREND_STEADY: drift = ", steady"
+    else: drift = f", getting {'slower' if trend > 0 else 'faster'} ({trend:+.0%})"
+    return f"p50 {h.quantile(0.5):.0f}ms, p95 {h.quantile(0.95):.0f}ms, {rate}{drift}"
@@ -0,0 +1,212 @@
+"""Link parsing, duplicate detection and streaming import of pasted link lists."""
+
+import time
+import threading
+from dataclasses import dataclass
+from urllib.parse import urlparse, unquote
+
+from .decoders import LINK_DECODERS, detect_proxy_type, parse_socks_string, parse_wireguard_conf
+from .models import AddedProxy
+
+# --- Link Parser ---
+class LinkParseError(ValueError):
+    """Raised by parse_link with a human-readable reason."""
+
+@dataclass
+class ParsedLink:
+    """A classified and decoded proxy string, ready to become an AddedProxy."""
+    ptype: str
+    fields: dict
+    raw: str = ""
+
+    @property
+    def label(self) -> str:
+        f = self.fields
+        if self.ptype == "wireguard": return f"WG {f.get('server')}:{f.get('server_port')}"
+        if self.ptype in ("socks5", "http"): return f"{self.ptype.upper()} {f.get('server')}:{f.get('server_port')}"
+        return f"{self.ptype.upper()} {f.get('server') or '(Pasted)'}"
+
+    def to_proxy(self) -> AddedProxy:
+        if self.ptype in LINK_DECODERS: return AddedProxy(ptype=self.ptype, label=self.label, data={}, raw=self.raw, parsed=self.fields)
+        if self.ptype == "wireguard":
+            data = dict(self.fields, local_address=",".join(self.fields.get("local_address") or []), server_port=int(self.fields.get("server_port") or 51820))
+            return AddedProxy(ptype="wireguard", label=self.label, data=data)
+        return AddedProxy(ptype=self.ptype, label=self.label, data=dict(self.fields))
+
+def _parse_userinfo_url(s: str, ptype: str) -> dict:
+    u = urlparse(s if "://" in s else f"{ptype}://{s}")
+    return {"server": u.hostname or "", "server_port": int(u.port or 0), "username": unquote(u.username or ""), "password": unquote(u.password or "")}
+
+def parse_link(text: str) -> ParsedLink:
+    """Classifies text once and runs exactly one decoder for its type. Raises LinkParseError."""
+    s = (text or "").strip()
+    if not s: raise LinkParseError("Empty line")
+    ptype = detect_proxy_type(s)
+    try:
+        if ptype in LINK_DECODERS: fields = LINK_DECODERS[ptype](s)
+        elif ptype == "wireguard": fields = parse_wireguard_conf(s) if "PrivateKey" in s else {}
+        elif ptype == "socks5": fields = _parse_userinfo_url(s, ptype) if ("://" in s or "@" in s) else (parse_socks_string(s) or {})
+        elif ptype == "http": fields = _parse_userinfo_url(s, ptype)
+        else: raise LinkParseError("Unsupported link type")
+    except (ValueError, TypeError) as e:
+        if isinstance(e, LinkParseError): raise
+        raise LinkParseError(f"Could not decode {ptype} link: {e}")
+    if not fields or not (fields.get("server") or fields.get("private_key")): raise LinkParseError(f"Could not decode {ptype} link")
+    return ParsedLink(ptype=ptype, fields=fields, raw=s)
+
+def parse_many(lines, skip_blank=True):
+    """
+    Parses an iterable of lines, yielding (line_no, ParsedLink or None, error or None) per line.
+    Blank lines are skipped unless skip_blank is False.
+    """
+    for line_no, line in enumerate(lines, 1):
+        if skip_blank and not line.strip(): continue
+        try: yield line_no, parse_link(line), None
+        except LinkParseError as e: yield line_no, None, str(e)
+
+def proxy_from_link(text: str):
+    """Builds an AddedProxy from a single-line proxy link. Returns (proxy, None) or (None, reason)."""
+    try: parsed = parse_link(text)
+    except LinkParseError as e: return None, str(e)
+    if parsed.ptype == "wireguard": return None, "WireGuard configs must be imported through the form"
+    return parsed.to_proxy(), None
+
+# --- Duplicate Detection ---
+MERGE_SKIP, MERGE_REPLACE, MERGE_NEWEST = "skip", "replace", "newest"
+MERGE_POLICIES = {MERGE_SKIP: "Skip", MERGE_REPLACE: "Replace", MERGE_NEWEST: "Keep Newest"}
+
+def proxy_identity(p: AddedProxy) -> tuple:
+    """Canonical identity: type + server + port + credential. Labels and check results are ignored."""
+    d = p.decoded; t = p.ptype.lower()
+    try: port = int(d.get("server_port") or 0)
+    except (TypeError, ValueError): port = 0
+    secret = d.get("uuid") or d.get("password") or d.get("private_key") or ""
+    return (t, str(d.get("server") or "").strip("[]").lower(), port, secret, d.get("method") or d.get("username") or "")
+
+class ProxyIndex:
+    """
+    Identity-key -> proxy hash index kept alongside MainScreen.added_proxies, so duplicate
+    detection on insert is O(1) however long the list gets. Keys are remembered per proxy,
+    so an entry can still be dropped after the proxy itself was edited. rebuild() is deferred to
+    the first lookup, since computing identities decodes every proxy.
+    """
+    def __init__(self): self._by_key = {}; self._key_of = {}; self._pending = None
+
+    def __len__(self): self._build(); return len(self._by_key)
+
+    def rebuild(self, proxies):
+        self._by_key.clear(); self._key_of.clear(); self._pending = proxies
+
+    def _build(self):
+        if self._pending is None: return
+        proxies, self._pending = self._pending, None
+        for p in proxies: self._by_key.setdefault(self._remember(p), p)
+
+    def _remember(self, p):
+        key = proxy_identity(p); self._key_of[id(p)] = key
+        return key
+
+    def find(self, p):
+        """Returns another proxy already indexed under p's identity, or None."""
+        self._build()
+        other = self._by_key.get(proxy_identity(p))
+        return other if other is not p else None
+
+    def add(self, p): self._build(); self._by_key[self._remember(p)] = p
+
+    def discard(self, p):
+        self._build()
+        key = self._key_of.pop(id(p), None)
+        if key is not None and self._by_key.get(key) is p: del self._by_key[key]
+
+    def rekey(self, p): self.discard(p); self.add(p)
+
+def merge_duplicate(existing: AddedProxy, incoming: AddedProxy, policy: str) -> bool:
+    """
+    Resolves a duplicate according to policy; True means `existing` now carries the incoming
+    payload. Replacing keeps the existing entry's list position and selection.
+    """
+    if policy == MERGE_SKIP: return False
+    if policy == MERGE_NEWEST and (existing.updated_at or 0) > (incoming.updated_at or 0): return False
+    existing.label = incoming.label; existing.data = incoming.data; existing.raw = incoming.raw
+    existing.parsed = incoming.parsed; existing.updated_at = incoming.updated_at or time.time()
+    forget_checks(existing)
+    return True
+
+def forget_checks(p: AddedProxy):
+    """Clears check and speed test results (history included): they belonged to the endpoint p pointed at before a merge or edit."""
+    p.status = "Idle"; p.info = "N/A"; p.latency_ms = None; p.latency_stats = {}; p.latency_history = None
+    p.checked_at = 0.0; p.throughput_mbps = None; p.throughput_stats = {}
+
+def insert_proxy(proxies: list, index: ProxyIndex, proxy: AddedProxy, policy: str):
+    """
+    Appends proxy to proxies unless an identical one is indexed, in which case the merge policy decides.
+    Returns (result, kept_proxy) where result is "added", "replaced" or "skipped".
+    """
+    proxy.updated_at = proxy.updated_at or time.time()
+    existing = index.find(proxy)
+    if existing is None:
+        proxies.append(proxy); index.add(proxy)
+        return "added", proxy
+    if merge_duplicate(existing, proxy, policy):
+        index.rekey(existing)
+        return "replaced", existing
+    return "skipped", existing
+
+# --- Streaming Import ---
+IMPORT_BATCH_SIZE = 200
+IMPORT_MAX_BATCHES_IN_FLIGHT = 2
+IMPORT_MAX_ERROR_DETAILS = 50
+
+def _iter_lines(text: str):
+    """Yields (line_no, line, end_offset) without materialising a list of every line."""
+    pos = 0; n = len(text); line_no = 0
+    while pos < n:
+        end = text.find("\n", pos)
+        if end == -1: end = n
+        line_no += 1
+        yield line_no, text[pos:end], end
+        pos = end + 1
+
+class ImportJob:
+    """
+    Parses pasted links on a background thread and hands results over in batches.
+    At most IMPORT_MAX_BATCHES_IN_FLIGHT batches wait for the consumer at once, so memory
+    stays proportional to the batch size rather than the size of the paste.
+    Callbacks run on the worker thread: on_batch(proxies, errors, progress) must call
+    batch_done() once the batch has been consumed; on_finished(summary) runs last.
+    """
+    def __init__(self, text: str, on_batch, on_finished, batch_size=IMPORT_BATCH_SIZE):
+        self.text = text; self.on_batch = on_batch; self.on_finished = on_finished; self.batch_size = batch_size
+        self.added = self.failed = self.blank = 0
+        self._cancel = threading.Event(); self._slots = threading.Semaphore(IMPORT_MAX_BATCHES_IN_FLIGHT)
+
+    def start(self):
+        threading.Thread(target=self._run, name="import-job", daemon=True).start()
+        return self
+
+    def cancel(self): self._cancel.set()
+
+    @property
+    def cancelled(self): return self._cancel.is_set()
+
+    def batch_done(self): self._slots.release()
+
+    def _flush(self, proxies, errors, offset):
+        while not self._slots.acquire(timeout=0.1):
+            if self.cancelled: return
+        self.on_batch(proxies, errors, offset / max(len(self.text), 1))
+
+    def _run(self):
+        start = time.monotonic(); proxies = []; errors = []; offset = 0
+        for line_no, line, offset in _iter_lines(self.text):
+            if self.cancelled: break
+            if not line.strip(): self.blank += 1; continue
+            proxy, reason = proxy_from_link(line)
+            if proxy: proxies.append(proxy); self.added += 1
+            else: errors.append((line_no, reason)); self.failed += 1
+            if len(proxies) + len(errors) >= self.batch_size:
+                self._flush(proxies, errors, offset); proxies = []; errors = []
+        if (proxies or errors) and not self.cancelled: self._flush(proxies, errors, offset)
+        self.text = ""
+        self.on_finished({"added": self.added, "failed": self.failed, "blank": self.blank, "cancelled": self.cancelled, "elapsed": time.monotonic() - start})
@@ -0,0 +1,93 @@
+"""
+Thread-safe application log: a bounded in-memory ring for the Log tab and a background writer that
+appends to the log file in batches, rotating it by size. Nothing here touches Kivy, so check workers
+can log directly.
+"""
+
+import os
+import sys
+import threading
+from collections import deque
+from itertools import islice
+from datetime import datetime
+
+# --- Levels ---
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: "Debug", INFO: "Info", WARNING: "Warning", ERROR: "Error"}
+_LEVEL_TAGS = {DEBUG: "DEBUG ", INFO: "", WARNING: "WARNING ", ERROR: "ERROR "}
+
+# --- Ring Log ---
+LOG_RING_SIZE = 2000  # lines kept in memory
+LOG_VIEW_LINES = 300  # lines the Log tab renders
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+LOG_FLUSH_INTERVAL = 0.5  # seconds the writer waits to batch lines
+LOG_PENDING_MAX = 50000  # unwritten lines kept before new ones skip the file (they stay in the ring)
+
+class RingLog:
+    """
+    log() formats and stores a line and returns immediately; `seq` counts lines ever stored, so a
+    viewer can tell whether tail() changed since it last looked. Lines below `level` are dropped.
+    After open(), a writer thread appends whatever accumulated every LOG_FLUSH_INTERVAL to the file
+    (echoing it to stdout when `echo` is set) and rotates the file to .1 .. .N past `max_bytes`.
+    """
+    def __init__(self, capacity=LOG_RING_SIZE, level=INFO, echo=True, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+        self.level = level; self.echo = echo; self.max_bytes = max_bytes; self.backups = backups
+        self.path = None; self.seq = 0; self.filtered = 0; self._unwritten = 0
+        self._ring = deque(maxlen=capacity); self._pending = []
+        self._lock = threading.Lock(); self._closing = threading.Event()
+        self._thread = None
+
+    def log(self, message, level=INFO):
+        if level < self.level: self.filtered += 1; return
+        entry = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {_LEVEL_TAGS.get(level, '')}{message}\n"
+        with self._lock:
+            self._ring.append(entry); self.seq += 1
+            if len(self._pending) < LOG_PENDING_MAX: self._pending.append(entry)
+            else: self._unwritten += 1
+
+    def tail(self, n=LOG_VIEW_LINES) -> list:
+        with self._lock:
+            return list(islice(self._ring, max(0, len(self._ring) - n), None))
+
+    def open(self, path=None):
+        """Starts the writer, appending to path if given; lines logged before this are written first."""
+        self.path = path
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, name="log-writer", daemon=True); self._thread.start()
+
+    def _writer(self):
+        while not self._closing.wait(LOG_FLUSH_INTERVAL): self.flush()
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []; unwritten, self._unwritten = self._unwritten, 0
+        if unwritten: batch.append(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] WARNING {unwritten} log lines were not written to the file (writer backlog)\n")
+        if not batch: return
+        if self.echo: sys.stdout.write("".join(batch))
+        if not self.path: return
+        try:
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            f = open(self.path, "a", encoding="utf-8")
+            try:
+                for line in batch:  # buffered, so still one write per batch unless the file rotates
+                    if self.max_bytes and size and size + len(line) > self.max_bytes:
+                        f.close(); self._rotate(); f = open(self.path, "a", encoding="utf-8"); size = 0
+                    f.write(line); size += len(line)
+            finally: f.close()
+        except OSError as e:
+            sys.stderr.write(f"CRITICAL: Failed to write to log file: {e}\n")
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src): os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups: os.replace(self.path, f"{self.path}.1")
+        else: os.remove(self.path)
+
+    def close(self):
+        """Stops the writer after a final flush."""
+        self._closing.set()
+        if self._thread is not None: self._thread.join(timeout=5)
+        self.flush()
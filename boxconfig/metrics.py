@@ -0,0 +1,190 @@
+"""
+Per-stage check timings and the registry they are aggregated in. A check opens a stage_trace();
+code along the check path (including hooks on the HTTP stack, see network.py) adds the time it
+spends to the trace of its thread, and the finished trace is recorded in METRICS. Network-free.
+"""
+
+import json
+import time
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# --- Stage Traces ---
+# resolve: DNS for the proxy or server. connect: TCP to it. handshake: SOCKS negotiation or HTTP
+# CONNECT. tls: TLS to the API. first_byte: from the request going out to response headers, minus
+# any connection setup. total: the whole check. Reused connections skip connect/handshake/tls.
+STAGES = ("resolve", "connect", "handshake", "tls", "first_byte", "total")
+SETUP_STAGES = ("connect", "handshake", "tls")
+
+class StageTrace:
+    """Milliseconds per stage for one check; a stage hit twice (e.g. a Geo-IP fallback) accumulates."""
+    __slots__ = ("stages",)
+    def __init__(self): self.stages = {}
+
+    def add(self, stage, ms): self.stages[stage] = self.stages.get(stage, 0.0) + ms
+
+    def get(self, stage) -> float: return self.stages.get(stage, 0.0)
+
+    def setup_ms(self) -> float: return sum(self.stages.get(s, 0.0) for s in SETUP_STAGES)
+
+    def merge(self, other):
+        for stage, ms in other.stages.items(): self.add(stage, ms)
+
+    def rounded(self) -> dict: return {s: round(self.stages[s], 1) for s in STAGES if s in self.stages}
+
+_local = threading.local()
+
+@contextmanager
+def stage_trace():
+    """Collects the stages timed on this thread until the block exits; nests by shadowing."""
+    outer = getattr(_local, "trace", None); trace = _local.trace = StageTrace()
+    try: yield trace
+    finally: _local.trace = outer
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+def record_stage(stage, ms):
+    trace = current_trace()
+    if trace is not None: trace.add(stage, ms)
+
+def format_stages(stages: dict) -> str:
+    return ", ".join(f"{s.replace('_', ' ')} {stages[s]:.0f}ms" for s in STAGES if s in stages)
+
+# --- Histograms ---
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)  # upper bounds; a last bucket holds the rest
+METRICS_MAX_PROXIES = 5000  # proxies with their own histograms; the least recently checked are dropped
+
+class Histogram:
+    """Fixed-bucket histogram of milliseconds. Counts live in an unsigned array, so a few thousand stay small."""
+    __slots__ = ("counts", "sum", "count", "min", "max")
+    def __init__(self):
+        self.counts = array("L", bytes(array("L").itemsize * (len(BUCKETS_MS) + 1))); self.sum = 0.0; self.count = 0
+        self.min = float("inf"); self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1; self.sum += ms; self.count += 1
+        if ms < self.min: self.min = ms
+        if ms > self.max: self.max = ms
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts): self.counts[i] += n
+        self.sum += other.sum; self.count += other.count
+        self.min = min(self.min, other.min); self.max = max(self.max, other.max)
+
+    def quantile(self, q) -> float:
+        """Estimate by linear interpolation inside the bucket holding the q-th observation, kept within the observed min and max."""
+        if not self.count: return None
+        rank = q * self.count; seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = BUCKETS_MS[i - 1] if i else 0.0; upper = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max
+                return min(self.max, max(self.min, lower + (upper - lower) * max(0.0, rank - seen) / n))
+            seen += n
+        return self.max
+
+    @property
+    def mean(self) -> float: return self.sum / self.count if self.count else None
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "sum_ms": round(self.sum, 1), "p50_ms": _round(self.quantile(0.5)), "p95_ms": _round(self.quantile(0.95)),
+                "buckets": {("+Inf" if i == len(BUCKETS_MS) else str(BUCKETS_MS[i])): n for i, n in enumerate(self.counts) if n}}
+
+def _round(v): return None if v is None else round(v, 1)
+
+# --- Registry ---
+class MetricsRegistry:
+    """
+    Thread-safe aggregate of recorded checks: counts by proxy type and result, stage histograms by
+    proxy type (fleet-wide) and per proxy (the METRICS_MAX_PROXIES most recently checked). Export
+    with to_json() or to_prometheus(); summary() is the one-line view for the Log tab.
+    """
+    def __init__(self, max_proxies=METRICS_MAX_PROXIES):
+        self.max_proxies = max_proxies; self._lock = threading.Lock(); self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._checks = {}  # (ptype, result) -> count
+            self._stages = {}  # (stage, ptype) -> Histogram
+            self._proxies = OrderedDict()  # uid -> [label, ptype, checks, failures, {stage: Histogram}]
+            self.started_at = time.time()
+
+    def observe_check(self, uid, label, ptype, ok, stages: dict):
+        ptype = (ptype or "unknown").lower(); result = "ok" if ok else "failed"
+        with self._lock:
+            self._checks[(ptype, result)] = self._checks.get((ptype, result), 0) + 1
+            entry = self._proxies.get(uid)
+            if entry is None:
+                entry = self._proxies[uid] = [label, ptype, 0, 0, {}]
+                if len(self._proxies) > self.max_proxies: self._proxies.popitem(last=False)
+            else: self._proxies.move_to_end(uid); entry[0] = label
+            entry[2] += 1; entry[3] += not ok
+            for stage, ms in stages.items():
+                hist = self._stages.get((stage, ptype))
+                if hist is None: hist = self._stages[(stage, ptype)] = Histogram()
+                hist.observe(ms)
+                hist = entry[4].get(stage)
+                if hist is None: hist = entry[4][stage] = Histogram()
+                hist.observe(ms)
+
+    @property
+    def checks(self) -> int: return sum(self._checks.values())
+
+    def _by_stage(self) -> dict:
+        """Fleet-wide histogram per stage, all proxy types folded together."""
+        out = {}
+        for (stage, _), hist in self._stages.items():
+            out.setdefault(stage, Histogram()).merge(hist)
+        return out
+
+    def snapshot(self, per_proxy=True) -> dict:
+        with self._lock:
+            blob = {"started_at": self.started_at, "exported_at": time.time(), "buckets_ms": list(BUCKETS_MS),
+                    "checks": [{"ptype": t, "result": r, "count": n} for (t, r), n in sorted(self._checks.items())],
+                    "stages": {s: h.to_dict() for s, h in sorted(self._by_stage().items(), key=lambda kv: STAGES.index(kv[0]))},
+                    "stages_by_type": [{"stage": s, "ptype": t, **h.to_dict()} for (s, t), h in sorted(self._stages.items())]}
+            if per_proxy:
+                blob["proxies"] = [{"uid": uid, "label": label, "ptype": t, "checks": n, "failures": f, "stages": {s: h.to_dict() for s, h in hists.items()}}
+                                   for uid, (label, t, n, f, hists) in self._proxies.items()]
+        return blob
+
+    def to_json(self, per_proxy=True) -> str: return json.dumps(self.snapshot(per_proxy), indent=1)
+
+    def to_prometheus(self) -> str:
+        """Text exposition format: a checks counter and a stage histogram in seconds, by type (per-proxy series are JSON-only)."""
+        lines = ["# HELP boxconfig_checks_total Finished proxy checks.", "# TYPE boxconfig_checks_total counter"]
+        with self._lock:
+            lines += [f'boxconfig_checks_total{{ptype="{_label(t)}",result="{r}"}} {n}' for (t, r), n in sorted(self._checks.items())]
+            lines += ["# HELP boxconfig_check_stage_seconds Time proxy checks spent in each stage.", "# TYPE boxconfig_check_stage_seconds histogram"]
+            for (stage, t), hist in sorted(self._stages.items()):
+                labels = f'stage="{stage}",ptype="{_label(t)}"'; cumulative = 0
+                for i, n in enumerate(hist.counts):
+                    cumulative += n; le = "+Inf" if i == len(BUCKETS_MS) else f"{BUCKETS_MS[i] / 1000:g}"
+                    lines.append(f'boxconfig_check_stage_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"boxconfig_check_stage_seconds_sum{{{labels}}} {hist.sum / 1000:.6f}")
+                lines.append(f"boxconfig_check_stage_seconds_count{{{labels}}} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes to_prometheus() for a .prom/.txt path, to_json() otherwise."""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w", encoding="utf-8") as f: f.write(text)
+
+    def summary(self) -> str:
+        with self._lock: stages = self._by_stage(); checks = dict(self._checks)
+        total = sum(checks.values())
+        if not total: return "Check metrics: no checks recorded yet."
+        ok = sum(n for (_, r), n in checks.items() if r == "ok")
+        spent = sum(h.sum for s, h in stages.items() if s != "total") or 1.0
+        parts = [f"{s.replace('_', ' ')} p50 {h.quantile(0.5):.0f}/p95 {h.quantile(0.95):.0f}ms ({h.sum / spent:.0%})"
+                 for s in STAGES if (h := stages.get(s)) and s != "total"]
+        overall = stages.get("total")
+        head = f"Check metrics: {total} checks, {ok / total:.0%} ok" + (f", total p50 {overall.quantile(0.5):.0f}/p95 {overall.quantile(0.95):.0f}ms" if overall else "")
+        return f"{head}. Stages (share of staged time): " + "; ".join(parts) + "."
+
+def _label(value) -> str: return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+METRICS = MetricsRegistry()
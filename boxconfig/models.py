@@ -0,0 +1,228 @@
+"""Proxy records shared by the app, the CLI and the check/generate core."""
+
+import os
+import sys
+import json
+from dataclasses import MISSING, dataclass, field, fields as dataclass_fields
+
+from .decoders import LINK_DECODERS
+from .history import HISTORY_MIN_SAMPLES, LatencyHistory, format_history
+
+def new_proxy_uid() -> str:
+    """Random id that names a proxy in the state journal; it survives edits and merges."""
+    return os.urandom(6).hex()
+
+_INTERNED = ("ptype", "status")  # a handful of distinct values shared by every record
+
+def peek(p, name, default=None):
+    """Reads a field without hydrating a stub; `default` if it is not set."""
+    try: return object.__getattribute__(p, name)
+    except AttributeError: return default
+
+def format_latency(latency_ms, stats) -> str:
+    """Display text for a check result, e.g. "42ms (min 40, p95 50, jitter 3, loss 0%)"."""
+    stats = stats or {}
+    if latency_ms is None:
+        return f"{stats['resolve']:.0f}ms (Resolve)" if stats.get("resolve") is not None else "N/A"
+    if stats.get("samples", 1) > 1 and stats.get("p95") is not None:
+        return f"{latency_ms:.0f}ms (min {stats['min']:.0f}, p95 {stats['p95']:.0f}, jitter {stats['jitter']:.0f}, loss {stats['loss']:.0%})"
+    return f"{latency_ms:.0f}ms" + (" (cold)" if stats.get("reused") is False else "")
+
+def format_throughput(mbps, stats) -> str:
+    """Display text for a throughput test, e.g. "48.2 Mbps (TTFB 120ms, 1 stall)"; empty if never tested."""
+    stats = stats or {}
+    if mbps is None: return "Speed test failed" if stats.get("error") else ""
+    stalls = stats.get("stalls", 0)
+    return f"{mbps:.1f} Mbps (TTFB {stats.get('ttfb_ms', 0):.0f}ms, {stalls} stall{'' if stalls == 1 else 's'})"
+
+@dataclass(slots=True)
+class AddedProxy:
+    """
+    Holds the state for each added proxy configuration. Records are slotted (no per-instance
+    __dict__), type and status strings are interned, and the latency text is formatted from the
+    numbers on demand rather than stored.
+    """
+    ptype: str
+    label: str
+    data: dict
+    raw: str = ""
+    selected: bool = True
+    status: str = "Idle"
+    info: str = "N/A"
+    latency_ms: float = None
+    latency_stats: dict = field(default_factory=dict)
+    parsed: dict = field(default_factory=dict, repr=False)
+    updated_at: float = 0.0
+    checked_at: float = 0.0  # wall-clock time of the last finished check, 0 if never checked
+    throughput_mbps: float = None  # last speed test's download rate, None if untested or failed
+    throughput_stats: dict = field(default_factory=dict)
+    latency_history: LatencyHistory = None  # recent check results; None until the first check
+    uid: str = field(default_factory=new_proxy_uid, compare=False)
+    _payload: str = field(default=None, init=False, repr=False, compare=False)  # undecoded payload of a stub
+
+    @classmethod
+    def stub(cls, row, payload: str, extra: dict = None):
+        """
+        A proxy holding only its index fields (`row`, in INDEX_FIELDS order) and any `extra` payload fields. The rest is
+        decoded from the `payload` JSON on first access, so a saved list can be loaded without decoding every entry.
+        """
+        p = cls.__new__(cls)
+        for set_slot, v in zip(_INDEX_SETTERS, row): set_slot(p, v)
+        p.ptype = p.ptype; p.status = p.status  # interned by __setattr__
+        if extra:
+            for k, v in extra.items(): object.__setattr__(p, k, _loaded(k, v))
+        object.__setattr__(p, "_payload", payload)
+        return p
+
+    def __getattr__(self, name):
+        # Only reached for unset slots, i.e. payload fields of a stub not yet hydrated.
+        if name.startswith("__") or peek(self, "_payload") is None: raise AttributeError(name)
+        self.hydrate()
+        return object.__getattribute__(self, name)
+
+    def hydrate(self):
+        """Decodes a stub's payload; fields already set on the stub win. No-op for full proxies."""
+        payload = peek(self, "_payload")
+        if payload is None: return
+        values = json.loads(payload); missing = object()
+        for k in PAYLOAD_FIELDS:
+            if peek(self, k, missing) is missing:  # payloads saved before a field existed get its default
+                object.__setattr__(self, k, _loaded(k, values[k]) if k in values else field_default(k))
+        object.__setattr__(self, "_payload", None)
+
+    @property
+    def hydrated(self) -> bool: return peek(self, "_payload") is None
+
+    def __setattr__(self, name, value):
+        if name in _INTERNED and type(value) is str: value = sys.intern(value)
+        # The cached decode belongs to one `raw` link; replacing the link drops it.
+        elif name == "raw" and peek(self, "raw") != value: object.__setattr__(self, "parsed", {})
+        elif name in _CODECS and type(value) is str: value = _CODECS[name][1](value)
+        object.__setattr__(self, name, value)
+
+    @property
+    def latency(self) -> str:
+        if self.status == "Checking...": return "..."
+        if self.latency_ms is None and self.status != "Reachable": return "N/A"  # no payload decode for the common case
+        return format_latency(self.latency_ms, self.latency_stats)
+
+    @property
+    def latency_summary(self) -> str:
+        """Rolling figures from latency_history once it holds HISTORY_MIN_SAMPLES results, else the last check's latency."""
+        if self.status == "Checking..." or not self.checked_at: return self.latency  # never checked: no payload decode
+        h = self.latency_history
+        return format_history(h, self.latency) if h is not None and h.samples >= HISTORY_MIN_SAMPLES else self.latency
+
+    @property
+    def sustained_ms(self) -> float:
+        """LatencyHistory.score() when there is one, else latency_ms: what ranking goes by."""
+        h = self.latency_history if self.checked_at else None
+        score = h.score() if h is not None else None
+        return self.latency_ms if score is None else score
+
+    @property
+    def throughput(self) -> str: return format_throughput(self.throughput_mbps, self.throughput_stats)
+
+    @property
+    def decoded(self) -> dict:
+        """Decoded link fields (form data for form proxies), decoded once and cached until `raw` changes."""
+        if not self.raw: return self.data
+        if not self.parsed:
+            decoder = LINK_DECODERS.get(self.ptype.lower())
+            self.parsed = decoder(self.raw) if decoder else {}
+        return self.parsed
+
+# Fields kept in the saved list's compact index; everything else is payload, hydrated on demand.
+# Snapshots record the index's column names, so columns can be added or dropped between versions.
+INDEX_FIELDS = ("uid", "ptype", "label", "selected", "status", "latency_ms", "checked_at", "throughput_mbps")
+PAYLOAD_FIELDS = ("data", "raw", "info", "latency_stats", "parsed", "updated_at", "throughput_stats", "latency_history")
+FIELD_NAMES = INDEX_FIELDS + PAYLOAD_FIELDS
+_INDEX_SETTERS = tuple(vars(AddedProxy)[k].__set__ for k in INDEX_FIELDS)  # slot descriptors: no __setattr__ per field
+_DEFAULTS = {f.name: f for f in dataclass_fields(AddedProxy) if f.default is not MISSING or f.default_factory is not MISSING}
+
+# Fields saved in another form than they are held in: name -> (to saved form, from saved form).
+_CODECS = {"latency_history": (LatencyHistory.to_state, LatencyHistory.from_state)}
+
+def _loaded(name, value):
+    codec = _CODECS.get(name)
+    return codec[1](value) if codec and type(value) is str else value
+
+def field_state(p, name):
+    """A field's value as saved (JSON-ready)."""
+    value = getattr(p, name); codec = _CODECS.get(name)
+    return codec[0](value) if codec and value is not None else value
+
+def field_default(name):
+    """A fresh default value for an AddedProxy field."""
+    f = _DEFAULTS[name]
+    return f.default if f.default_factory is MISSING else f.default_factory()
+
+# --- Filtering & Sorting ---
+STATUS_ORDER = {"Reachable": 0, "Checking...": 1, "Queued": 2, "Idle": 3, "Unreachable": 4}
+SORT_KEYS = {
+    "added": None,
+    "latency": lambda p: (p.latency_ms is None, p.latency_ms or 0.0),
+    "status": lambda p: (STATUS_ORDER.get(p.status, len(STATUS_ORDER)), p.latency_ms is None, p.latency_ms or 0.0),
+    "type": lambda p: (p.ptype.lower(), p.label.lower()),
+    "speed": lambda p: (p.throughput_mbps is None, -(p.throughput_mbps or 0.0)),
+}
+SORT_NAMES = {"added": "Added", "latency": "Latency", "status": "Status", "type": "Type", "speed": "Speed"}
+STATUS_FILTERS = ("Reachable", "Unreachable", "Idle")
+
+def _search_text(p: AddedProxy) -> str:
+    return f"{p.label} {p.ptype} {p.decoded.get('server') or ''}".lower()
+
+def select_proxies(proxies, query="", status=None, sort="added") -> list:
+    """
+    Returns the proxies matching a search query (label, type or server) and status, ordered by
+    one of SORT_KEYS. Sorting is stable, so ties keep their added order. `proxies` is not modified.
+    """
+    query = (query or "").strip().lower()
+    out = [p for p in proxies if (not status or p.status == status) and (not query or query in _search_text(p))]
+    key = SORT_KEYS.get(sort)
+    if key: out.sort(key=key)
+    return out
+
+# --- Memory Accounting ---
+MEMORY_SAMPLE = 2000  # proxies measured per report; per-proxy figures are averaged over them
+
+class _PlainRecord: pass  # an ordinary instance with a __dict__, for the comparison layout
+
+def _deep_size(obj, seen) -> int:
+    """sys.getsizeof of obj and everything it holds; objects already in `seen` (shared strings) count once."""
+    if id(obj) in seen: return 0
+    seen.add(id(obj)); size = sys.getsizeof(obj)
+    if isinstance(obj, dict): size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)): size += sum(_deep_size(v, seen) for v in obj)
+    elif isinstance(obj, AddedProxy): size += sum(_deep_size(peek(obj, k), seen) for k in FIELD_NAMES + ("_payload",))
+    elif isinstance(obj, LatencyHistory): size += sum(sys.getsizeof(a) for a in (obj.at, obj.ms, obj.sorted))
+    return size
+
+def _dict_record(p) -> _PlainRecord:
+    """p laid out as a __dict__ record with its own type/status strings and stored latency text."""
+    unset = object(); rec = _PlainRecord()
+    values = {k: v for k in FIELD_NAMES + ("_payload",) if (v := peek(p, k, unset)) is not unset}
+    for k in _INTERNED: values[k] = values[k][:1] + values[k][1:]  # a private copy, as json.loads makes
+    values["latency"] = format_latency(values.get("latency_ms"), values.get("latency_stats"))
+    rec.__dict__.update(values)
+    return rec
+
+def memory_report(proxies, sample=MEMORY_SAMPLE) -> dict:
+    """Approximate bytes per proxy for the records as they are and as plain __dict__ records, over an even sample."""
+    picked = proxies[::max(1, len(proxies) // sample)][:sample]
+    if not picked: return {"proxies": 0, "hydrated": 0, "sampled": 0, "bytes_per_proxy": 0, "dict_bytes_per_proxy": 0, "link_bytes_per_proxy": 0}
+    seen = set(); now = sum(_deep_size(p, seen) for p in picked)
+    records = [_dict_record(p) for p in picked]  # kept alive so no id is reused while measuring
+    seen = set(); before = sum(_deep_size(r, seen) + _deep_size(r.__dict__, seen) for r in records)
+    links = [len(raw) for p in picked if (raw := peek(p, "raw"))]
+    return {"proxies": len(proxies), "hydrated": sum(1 for p in proxies if peek(p, "_payload") is None), "sampled": len(picked),
+            "bytes_per_proxy": now // len(picked), "dict_bytes_per_proxy": before // len(picked),
+            "link_bytes_per_proxy": sum(links) // len(links) if links else 0}
+
+def memory_summary(report: dict) -> str:
+    if not report["proxies"]: return "Memory: no proxies loaded."
+    now, before = report["bytes_per_proxy"], report["dict_bytes_per_proxy"]
+    link = f", links themselves {report['link_bytes_per_proxy']} B" if report["link_bytes_per_proxy"] else ""
+    return (f"Memory: {report['proxies']} proxies ({report['hydrated']} decoded) take ~{now} B each as slotted records vs ~{before} B "
+            f"as __dict__ records ({1 - now / before:.0%} less){link}; ~{now * report['proxies'] / 1048576:.1f} MiB total, "
+            f"sampled {report['sampled']}.")
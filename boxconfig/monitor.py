@@ -0,0 +1,196 @@
+"""
+Background health monitor: re-checks saved proxies on a schedule so the list stays fresh without a
+manual sweep. Kivy-free and network-free; the caller supplies the check function and a snapshot of
+the proxy list (monitor_entries), so the monitor's threads only read plain fields of the proxies.
+"""
+
+import time
+import heapq
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Schedule ---
+MONITOR_INTERVAL = 900.0  # seconds between checks of a healthy proxy
+MONITOR_PRIORITY_INTERVAL = 120.0  # the same for priority proxies (selected ones, which the generated config uses)
+MONITOR_MAX_BACKOFF = 6 * 3600.0  # longest wait for a proxy that keeps failing
+MONITOR_JITTER = 0.2  # each wait is scaled by 1 +/- this, so proxies added together drift apart
+MONITOR_START_SPREAD = 60.0  # proxies never checked get their first check spread over this many seconds
+MONITOR_RATE = 0.5  # checks started per second, across all proxies
+MONITOR_BURST = 4  # checks that may start back to back after a quiet spell
+MONITOR_HOST_GAP = 5.0  # minimum seconds between checks of proxies on the same server
+MONITOR_CONCURRENCY = 4
+MONITOR_RESCAN = 5.0  # seconds between looks at the proxy list for additions and removals
+BUSY_STATUSES = ("Queued", "Checking...")
+
+def format_age(seconds) -> str:
+    """'just now', '45s ago', '12m ago', '3h ago', '2d ago'."""
+    if seconds < 5: return "just now"
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size: return f"{int(seconds // size)}{unit} ago"
+    return f"{int(seconds)}s ago"
+
+def _host(proxy) -> str:
+    try: return str(proxy.decoded.get("server") or "").lower()
+    except Exception: return ""
+
+def monitor_entries(proxies) -> tuple:
+    """
+    (proxy, host) pairs for HealthMonitor's proxies_fn. Build them on the thread that owns the list:
+    reading the host decodes each proxy there, so the checks the monitor starts find them decoded.
+    """
+    return tuple((p, _host(p)) for p in proxies)
+
+class HealthMonitor:
+    """
+    Keeps a heap of due times for the proxies in the monitor_entries() snapshot proxies_fn() returns
+    (read as is, never decoded here) and runs check_fn(proxy) on a
+    small pool as they fall due, at most `rate` starts per second (a token bucket of `burst`) and
+    never two on the same server within `host_gap`. check_fn returns whether the proxy is reachable:
+    after a success the next check is `interval` away (`priority_interval` when is_priority(proxy)),
+    and each consecutive failure doubles that up to `max_backoff`. Every wait gets +/- `jitter`.
+    A proxy whose `checked_at` is recent (a manual check) or that a sweep holds (BUSY_STATUSES)
+    is pushed back instead, and checking(uid) tells a sweep which proxies to leave alone. pause()
+    stops new checks; in-flight ones finish.
+    """
+    def __init__(self, check_fn, proxies_fn, is_priority=lambda p: p.selected, interval=MONITOR_INTERVAL,
+                 priority_interval=MONITOR_PRIORITY_INTERVAL, max_backoff=MONITOR_MAX_BACKOFF, jitter=MONITOR_JITTER,
+                 rate=MONITOR_RATE, burst=MONITOR_BURST, host_gap=MONITOR_HOST_GAP, concurrency=MONITOR_CONCURRENCY,
+                 clock=time.monotonic, rng=random.random):
+        self.check_fn = check_fn; self.proxies_fn = proxies_fn; self.is_priority = is_priority
+        self.interval = interval; self.priority_interval = priority_interval; self.max_backoff = max_backoff
+        self.jitter = jitter; self.rate = rate; self.burst = burst; self.host_gap = host_gap
+        self.concurrency = max(1, int(concurrency)); self.clock = clock; self.rng = rng
+        self._heap = []; self._due = {}  # uid -> due time of its live heap entry; older entries are skipped
+        self._live = {}; self._hosts = {}; self._failures = {}; self._inflight = set(); self._host_last = {}
+        self._done = deque()  # (uid, proxy, reachable) from finished checks, applied by the scheduler thread
+        self._tokens = float(burst); self._refilled = clock()
+        self._wake = threading.Event(); self._stopping = threading.Event(); self._resumed = threading.Event()
+        self._resumed.set(); self._rescan = True; self._rebuild = False
+        self._thread = None; self._pool = None
+        self.checks = 0; self.failed = 0
+
+    # Control
+    def start(self):
+        if self._thread is not None: return
+        self._stopping.clear(); self._rescan = True
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="monitor-check")
+        self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True); self._thread.start()
+
+    def stop(self):
+        """Stops scheduling and drops checks that have not started; returns without waiting for in-flight ones."""
+        self._stopping.set(); self._resumed.set(); self._wake.set()
+        if self._thread is not None: self._thread.join(timeout=5); self._thread = None
+        if self._pool is not None: self._pool.shutdown(wait=False, cancel_futures=True); self._pool = None
+
+    def pause(self): self._resumed.clear()
+
+    def resume(self):
+        self._tokens = min(self._tokens, 1.0)  # no burst of catch-up checks the moment the app comes back
+        self._resumed.set(); self._wake.set()
+
+    @property
+    def paused(self) -> bool: return not self._resumed.is_set()
+
+    @property
+    def running(self) -> bool: return self._thread is not None
+
+    def checking(self, uid) -> bool:
+        """Whether the monitor has claimed proxy uid for a check that has not finished."""
+        return uid in self._inflight
+
+    def reschedule(self):
+        """Recomputes every due time on the next pass, e.g. after the selection changed priorities."""
+        self._rebuild = True; self._wake.set()
+
+    def refresh(self):
+        """Picks up added and removed proxies now instead of at the next rescan."""
+        self._rescan = True; self._wake.set()
+
+    # Scheduling
+    def _base(self, proxy, failures) -> float:
+        base = self.priority_interval if self.is_priority(proxy) else self.interval
+        return min(base * 2 ** failures, max(base, self.max_backoff)) if failures else base
+
+    def next_wait(self, proxy, failures=0) -> float:
+        """Seconds until proxy's next check after `failures` consecutive failures, jitter included."""
+        return self._base(proxy, failures) * (1 + self.jitter * (2 * self.rng() - 1))
+
+    def _push(self, uid, due):
+        self._due[uid] = due; heapq.heappush(self._heap, (due, uid))
+
+    def _first_due(self, proxy, now) -> float:
+        age = time.time() - proxy.checked_at if proxy.checked_at else None
+        wait = self.next_wait(proxy, self._failures.get(proxy.uid, 0))
+        if age is None or age >= wait: return now + self.rng() * MONITOR_START_SPREAD
+        return now + wait - age
+
+    def _scan(self, now):
+        entries = self.proxies_fn()
+        self._live = {p.uid: p for p, _ in entries}; self._hosts = {p.uid: host for p, host in entries}
+        if self._rebuild: self._heap = []; self._due = {}; self._rebuild = False
+        for uid in [uid for uid in self._due if uid not in self._live]:
+            del self._due[uid]; self._failures.pop(uid, None)
+        for uid, p in self._live.items():
+            if uid not in self._due and uid not in self._inflight: self._push(uid, self._first_due(p, now))
+        if len(self._heap) > 2 * len(self._due) + 64:  # drop superseded entries once they dominate
+            self._heap = [(d, u) for d, u in self._heap if self._due.get(u) == d]; heapq.heapify(self._heap)
+        self._host_last = {h: t for h, t in self._host_last.items() if now - t < self.host_gap}
+
+    def _finish(self, now):
+        while self._done:
+            uid, proxy, ok = self._done.popleft()
+            self._inflight.discard(uid); self.checks += 1
+            failures = 0 if ok else self._failures.get(uid, 0) + 1
+            if ok: self._failures.pop(uid, None)
+            else: self._failures[uid] = failures; self.failed += 1
+            if uid in self._live: self._push(uid, now + self.next_wait(proxy, failures))
+
+    def _dispatch(self, now) -> float:
+        """Starts every check that is due and allowed; returns seconds until one might be."""
+        while self._heap:
+            due, uid = self._heap[0]
+            if self._due.get(uid) != due or uid not in self._live: heapq.heappop(self._heap); continue
+            if due > now: return due - now
+            if len(self._inflight) >= self.concurrency: return MONITOR_RESCAN  # a finishing check wakes the loop
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate); self._refilled = now
+            if self._tokens < 1: return (1 - self._tokens) / self.rate
+            heapq.heappop(self._heap); del self._due[uid]
+            proxy = self._live[uid]
+            if proxy.status in BUSY_STATUSES: self._push(uid, now + MONITOR_RESCAN); continue
+            base = self._base(proxy, self._failures.get(uid, 0))
+            age = time.time() - proxy.checked_at if proxy.checked_at else base
+            if age < base * (1 - self.jitter): self._push(uid, now + base - age); continue  # checked elsewhere meanwhile
+            host = self._hosts.get(uid); last = self._host_last.get(host)
+            if host and last is not None and now - last < self.host_gap:
+                self._push(uid, last + self.host_gap * (1 + self.rng())); continue
+            self._inflight.add(uid)  # claim first, then look again: a sweep queueing it meanwhile sees the claim or is seen here
+            if proxy.status in BUSY_STATUSES: self._inflight.discard(uid); self._push(uid, now + MONITOR_RESCAN); continue
+            self._tokens -= 1
+            if host: self._host_last[host] = now
+            self._pool.submit(self._check, uid, proxy)
+        return MONITOR_RESCAN
+
+    def _check(self, uid, proxy):
+        ok = False
+        try: ok = bool(self.check_fn(proxy))
+        except Exception: pass  # check_fn reports its own errors; this only counts as a failure
+        finally: self._done.append((uid, proxy, ok)); self._wake.set()
+
+    def _run(self):
+        next_scan = 0.0
+        while not self._stopping.is_set():
+            if not self._resumed.is_set(): self._resumed.wait(); continue
+            self._wake.clear(); now = self.clock()
+            self._finish(now)
+            if self._rescan or self._rebuild or now >= next_scan:
+                self._rescan = False; self._scan(now); next_scan = now + MONITOR_RESCAN
+            try: delay = self._dispatch(now)
+            except RuntimeError: break  # pool shut down by stop()
+            self._wake.wait(max(0.05, min(delay, next_scan - now)))
+
+    def summary(self) -> str:
+        state = "paused" if self.paused else "running"
+        return (f"Health monitor ({state}): {self.checks} background checks, {self.failed} failed, "
+                f"{len(self._failures)} proxies backing off, {len(self._due)} scheduled.")
@@ -0,0 +1,574 @@
+"""DNS and Geo-IP caches, pooled HTTP sessions and the asyncio latency prober."""
+
+import os
+import json
+import errno
+import asyncio
+import concurrent.futures
+import threading
+import time
+import socket
+import ipaddress
+import importlib.util
+import weakref
+import functools
+from dataclasses import dataclass, field
+from collections import OrderedDict
+
+from .metrics import current_trace, stage_trace
+
+# --- Dependency Management ---
+# requests/pysocks are imported on first use; only their presence is checked here.
+DEPENDENCIES_AVAILABLE = all(importlib.util.find_spec(m) is not None for m in ("requests", "socks"))
+
+# --- DNS Resolution Cache ---
+DNS_TTL = 300.0
+DNS_NEGATIVE_TTL = 30.0
+DNS_CACHE_SIZE = 2048
+
+class _PendingLookup:
+    __slots__ = ("event", "infos", "error")
+    def __init__(self): self.event = threading.Event(); self.infos = None; self.error = None
+
+class ResolverCache:
+    """
+    Thread-safe getaddrinfo cache shared by every check path. Entries expire after a TTL
+    (failures after a shorter negative TTL), the table is LRU-bounded, and concurrent
+    lookups of the same host wait on a single in-flight resolution.
+    """
+    def __init__(self, ttl=DNS_TTL, negative_ttl=DNS_NEGATIVE_TTL, max_entries=DNS_CACHE_SIZE):
+        self.ttl = ttl; self.negative_ttl = negative_ttl; self.max_entries = max_entries
+        self._lock = threading.Lock(); self._entries = OrderedDict(); self._inflight = {}
+        self.hits = self.misses = self.shared = 0
+
+    def resolve(self, host: str):
+        """
+        Returns ([(family, ip), ...], resolve_ms) with every A/AAAA record for host.
+        resolve_ms is the time this caller waited. Raises socket.gaierror if the host does not resolve.
+        """
+        start = time.perf_counter_ns()
+        try:
+            ip = ipaddress.ip_address(host.strip("[]"))
+            return [(socket.AF_INET6 if ip.version == 6 else socket.AF_INET, str(ip))], 0.0
+        except ValueError: pass
+        key = host.lower(); now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key); self.hits += 1
+                return self._unpack(entry[1], entry[2], start)
+            pending = self._inflight.get(key); owner = pending is None
+            if owner: pending = self._inflight[key] = _PendingLookup(); self.misses += 1
+            else: self.shared += 1
+        if owner:
+            try:
+                infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+                pending.infos = list(dict.fromkeys((i[0], i[4][0]) for i in infos if i[0] in (socket.AF_INET, socket.AF_INET6)))
+            except socket.gaierror as e: pending.error = e
+            except Exception as e: pending.error = socket.gaierror(str(e))
+            ttl = self.negative_ttl if pending.error else self.ttl
+            with self._lock:
+                self._entries[key] = (time.monotonic() + ttl, pending.infos, pending.error); self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+                self._inflight.pop(key, None)
+            pending.event.set()
+        else:
+            pending.event.wait()
+        return self._unpack(pending.infos, pending.error, start)
+
+    @staticmethod
+    def _unpack(infos, error, start):
+        if error: raise socket.gaierror(*error.args)
+        return list(infos), (time.perf_counter_ns() - start) / 1e6
+
+    def clear(self):
+        with self._lock: self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.shared
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "shared": self.shared, "hit_ratio": (self.hits + self.shared) / lookups if lookups else 0.0}
+
+    def summary(self) -> str:
+        st = self.stats()
+        return f"DNS cache: {st['entries']} hosts, {st['hits']} hits, {st['misses']} misses, {st['shared']} shared in-flight ({st['hit_ratio']:.0%} served without a new lookup)"
+
+DNS_CACHE = ResolverCache()
+
+def _proxy_netloc(ip: str) -> str:
+    return f"[{ip}]" if ":" in ip else ip
+
+def proxy_url(ptype: str, ip: str, port, user=None, pw=None) -> str:
+    """requests proxy URL for a socks5/http proxy at a resolved ip; socks5h leaves target names to the proxy."""
+    auth = f"{user}:{pw}@" if user and pw else ""
+    return f"{'socks5h' if ptype == 'socks5' else 'http'}://{auth}{_proxy_netloc(ip)}:{port}"
+
+# --- Geo-IP Cache ---
+GEOIP_TTL = 7 * 24 * 3600.0
+GEOIP_CACHE_SIZE = 5000
+CONNECTIVITY_URL = "https://www.gstatic.com/generate_204"
+
+class GeoIPCache:
+    """
+    Size-bounded LRU of Geo-IP answers keyed by IP, persisted as JSON so lookups survive
+    restarts. Proxy endpoints are also mapped to the exit IP they were last seen with, so
+    a re-check only needs a connectivity probe instead of another rate-limited API call.
+    """
+    def __init__(self, path=None, ttl=GEOIP_TTL, max_entries=GEOIP_CACHE_SIZE):
+        self.path = path; self.ttl = ttl; self.max_entries = max_entries
+        self._lock = threading.Lock(); self._entries = OrderedDict(); self._exits = OrderedDict(); self._dirty = False
+        self.hits = self.misses = 0
+
+    def load(self, path=None):
+        self.path = path or self.path
+        try:
+            with open(self.path, "r", encoding="utf-8") as f: blob = json.load(f)
+        except (OSError, ValueError): return 0
+        now = time.time()
+        with self._lock:
+            self._entries = OrderedDict((ip, e) for ip, e in blob.get("entries", {}).items() if e.get("expires", 0) > now)
+            self._exits = OrderedDict((k, v) for k, v in blob.get("exits", {}).items() if v in self._entries)
+        return len(self._entries)
+
+    def save(self):
+        if not (self.path and self._dirty): return
+        with self._lock:
+            blob = {"entries": dict(self._entries), "exits": dict(self._exits)}; self._dirty = False
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f: json.dump(blob, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"CRITICAL: Failed to save Geo-IP cache: {e}")
+
+    def get(self, ip: str):
+        """Returns the cached {"country", "region", "ip"} answer for ip, or None."""
+        with self._lock:
+            entry = self._entries.get(ip)
+            if entry and entry["expires"] > time.time():
+                self._entries.move_to_end(ip); self.hits += 1
+                return entry["geo"]
+            if entry: del self._entries[ip]
+            self.misses += 1
+            return None
+
+    def put(self, ip: str, geo: dict, via: str = None):
+        """Stores a Geo-IP answer for ip; `via` records which proxy endpoint exits through it."""
+        with self._lock:
+            self._entries[ip] = {"geo": geo, "expires": time.time() + self.ttl}; self._entries.move_to_end(ip)
+            if via: self._exits[via] = ip; self._exits.move_to_end(via)
+            while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+            while len(self._exits) > self.max_entries: self._exits.popitem(last=False)
+            self._dirty = True
+
+    def get_exit(self, via: str):
+        """Returns the cached answer for the exit IP last seen behind a proxy endpoint, or None."""
+        with self._lock: ip = self._exits.get(via)
+        return self.get(ip) if ip else None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "saved_requests": self.hits, "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+    def summary(self) -> str:
+        st = self.stats()
+        return f"Geo-IP cache: {st['entries']} IPs, {st['hits']} hits, {st['misses']} misses ({st['hit_ratio']:.0%} hit ratio, {st['saved_requests']} API requests saved)"
+
+GEOIP_CACHE = GeoIPCache()
+
+def _format_geo(geo: dict) -> str:
+    return f"{geo.get('country') or 'N/A'}, {geo.get('region') or 'N/A'} - {geo.get('ip') or 'N/A'}"
+
+# --- Pooled HTTP Sessions & Geo-IP Requests ---
+SESSION_POOL_SIZE = 64
+GEOIP_TIMEOUT = 15.0
+
+def _parse_ip_api(data: dict) -> dict:
+    if data.get("status") != "success": raise ValueError(data.get("message") or "API 1 Error")
+    return {"country": data.get("country"), "region": data.get("regionName"), "ip": data.get("query")}
+
+def _parse_ipinfo(data: dict) -> dict:
+    if not data.get("ip"): raise ValueError("API 2 Error")
+    return {"country": data.get("country"), "region": data.get("region"), "ip": data.get("ip")}
+
+# (url, parser) pairs tried in order, or raced in hedged mode. Point these at local servers to test.
+GEOIP_ENDPOINTS = [
+    ("https://ip-api.com/json/?fields=status,message,country,regionName,query", _parse_ip_api),
+    ("https://ipinfo.io/json", _parse_ipinfo),
+]
+
+class SessionPool:
+    """
+    LRU of requests.Session objects keyed by proxy URL (None for direct), each mounted with a
+    keep-alive adapter, so repeated checks of one proxy reuse its connections to the APIs.
+    """
+    def __init__(self, max_sessions=SESSION_POOL_SIZE, connections=4):
+        self.max_sessions = max_sessions; self.connections = connections
+        self._lock = threading.Lock(); self._sessions = OrderedDict()
+
+    def get(self, proxy_url=None):
+        with self._lock:
+            session = self._sessions.get(proxy_url)
+            if session is not None:
+                self._sessions.move_to_end(proxy_url); return session
+            import requests  # deferred: costs ~150ms and is only needed once a check runs
+            _install_stage_hooks()
+            session = requests.Session(); session.verify = False
+            adapter = requests.adapters.HTTPAdapter(pool_connections=self.connections, pool_maxsize=self.connections, max_retries=0)
+            session.mount("http://", adapter); session.mount("https://", adapter)
+            if proxy_url: session.proxies = {"http": proxy_url, "https": proxy_url}
+            self._sessions[proxy_url] = session
+            evicted = self._sessions.popitem(last=False)[1] if len(self._sessions) > self.max_sessions else None
+        if evicted: evicted.close()
+        return session
+
+    def close_all(self):
+        with self._lock: sessions = list(self._sessions.values()); self._sessions.clear()
+        for session in sessions: session.close()
+
+# --- Stage Hooks ---
+# Wrappers on the HTTP stack that add the time its connection steps take to the calling thread's
+# stage trace (see metrics.py). They cost one thread-local lookup when no trace is open.
+_HOOKS_INSTALLED = False
+
+def _timed(fn, stage, minus=()):
+    """fn, with its duration (less any `minus` stages timed inside it) added to the current trace as `stage`."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        trace = current_trace()
+        if trace is None: return fn(*args, **kwargs)
+        inner = sum(trace.get(s) for s in minus); start = time.perf_counter()
+        try: return fn(*args, **kwargs)
+        finally: trace.add(stage, (time.perf_counter() - start) * 1000 - (sum(trace.get(s) for s in minus) - inner))
+    return wrapper
+
+def _hook(owner, names, stage, minus=(), inherited=False) -> bool:
+    """
+    Wraps the first of `names` that `owner` (a class or module) defines itself, or also inherits
+    with `inherited`; False if none exists in this version.
+    """
+    for name in names:
+        fn = getattr(owner, name, None) if inherited else vars(owner).get(name)
+        if callable(fn): setattr(owner, name, _timed(fn, stage, minus)); return True
+    return False
+
+def _install_stage_hooks():
+    """
+    Hooks the private connection steps of urllib3 and PySocks. Targets differ between versions
+    (urllib3 1.x has no _ssl_wrap_socket_and_match_hostname), so a missing one is skipped and its
+    stage is simply not recorded; checks never depend on the hooks.
+    """
+    global _HOOKS_INSTALLED
+    if _HOOKS_INSTALLED: return
+    _HOOKS_INSTALLED = True
+    try:
+        import socks
+        import urllib3.connection as connection
+        from urllib3.contrib.socks import SOCKSConnection
+    except ImportError: return
+    # A SOCKS _new_conn connects and negotiates in one call; the negotiation is timed separately.
+    for cls in (connection.HTTPConnection, SOCKSConnection): _hook(cls, ("_new_conn",), "connect", minus=("handshake",))
+    negotiators = getattr(socks.socksocket, "_proxy_negotiators", None)
+    if isinstance(negotiators, dict):
+        for kind, negotiate in list(negotiators.items()): negotiators[kind] = _timed(negotiate, "handshake")
+    _hook(connection.HTTPConnection, ("_tunnel",), "handshake", inherited=True)  # HTTP CONNECT; urllib3 1.x inherits it from http.client
+    _hook(connection, ("_ssl_wrap_socket_and_match_hostname", "ssl_wrap_socket"), "tls")  # urllib3 2.x, 1.x
+
+SESSIONS = SessionPool() if DEPENDENCIES_AVAILABLE else None
+_HEDGE_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="geoip-hedge")
+
+_POOL_CONNECTIONS = weakref.WeakKeyDictionary()  # urllib3 pool -> connections opened as of its last request
+_POOL_LOCK = threading.Lock()
+
+def timed_get(session, url: str, timeout=GEOIP_TIMEOUT):
+    """
+    GETs url and returns (response, latency_ms, reused). latency_ms is the time to response
+    headers; when reused is True no connection, proxy handshake or TLS setup was part of it.
+    Under a stage trace, latency_ms less that setup is added as the first_byte stage.
+    """
+    trace = current_trace(); setup = trace.setup_ms() if trace else 0.0
+    response = session.get(url, timeout=timeout)
+    pool = getattr(response.raw, "_pool", None); reused = False
+    if pool is not None:
+        with _POOL_LOCK:
+            seen = _POOL_CONNECTIONS.get(pool)
+            reused = seen is not None and pool.num_connections == seen
+            _POOL_CONNECTIONS[pool] = pool.num_connections
+    latency_ms = response.elapsed.total_seconds() * 1000
+    if trace is not None: trace.add("first_byte", max(0.0, latency_ms - (trace.setup_ms() - setup)))
+    return response, latency_ms, reused
+
+def _geoip_from(session, url, parser, timeout):
+    response, latency_ms, reused = timed_get(session, url, timeout)
+    response.raise_for_status()
+    return parser(response.json()), latency_ms, reused
+
+def _raced_geoip_from(session, url, parser, timeout):
+    """_geoip_from on a hedge thread, returning its own stage trace so only the winner's is kept."""
+    with stage_trace() as trace: return _geoip_from(session, url, parser, timeout), trace
+
+def geoip_via_session(session, endpoints=None, hedged=False, timeout=GEOIP_TIMEOUT, on_error=None):
+    """
+    Looks up the exit location through a session's proxy. Endpoints are tried in order, or all
+    fired at once in hedged mode where the first valid answer wins. Returns (geo, latency_ms, reused).
+    """
+    endpoints = endpoints or GEOIP_ENDPOINTS; last_error = None
+    if not hedged:
+        for url, parser in endpoints:
+            try: return _geoip_from(session, url, parser, timeout)
+            except Exception as e:
+                last_error = e
+                if on_error: on_error(url, e)
+        raise last_error
+    futures = {_HEDGE_EXECUTOR.submit(_raced_geoip_from, session, url, parser, timeout): url for url, parser in endpoints}
+    caller = current_trace()
+    try:
+        for fut in concurrent.futures.as_completed(futures, timeout=timeout + 1):
+            try:
+                result, trace = fut.result()
+                if caller is not None: caller.merge(trace)
+                return result
+            except Exception as e:
+                last_error = e
+                if on_error: on_error(futures[fut], e)
+    except concurrent.futures.TimeoutError as e:
+        last_error = last_error or e
+    finally:
+        for fut in futures: fut.cancel()
+    raise last_error
+
+# --- Async Latency Prober ---
+HAPPY_EYEBALLS_DELAY = 0.25  # RFC 8305 "Connection Attempt Delay"
+CHECK_SAMPLES = 3
+
+def _describe_error(e: BaseException) -> str:
+    if isinstance(e, (asyncio.TimeoutError, socket.timeout)): return "Timeout"
+    if isinstance(e, ConnectionRefusedError): return "Connection Refused"
+    if isinstance(e, socket.gaierror): return "Host Not Found"
+    if isinstance(e, (asyncio.CancelledError, concurrent.futures.CancelledError)): return "Cancelled"
+    return (str(e).splitlines() or [type(e).__name__])[0]
+
+@dataclass
+class ProbeResult:
+    """Connect-time samples for one endpoint. Lost samples are stored as None."""
+    host: str
+    port: int
+    samples: list = field(default_factory=list)
+    ip: str = ""
+    error: str = ""
+    resolve_ms: float = 0.0
+
+    @property
+    def received(self): return sorted(x for x in self.samples if x is not None)
+    @property
+    def ok(self): return bool(self.received)
+    @property
+    def min(self): r = self.received; return r[0] if r else None
+    @property
+    def median(self):
+        r = self.received
+        if not r: return None
+        mid = len(r) // 2
+        return r[mid] if len(r) % 2 else (r[mid - 1] + r[mid]) / 2
+    @property
+    def p95(self):
+        r = self.received
+        return r[max(0, -(-len(r) * 95 // 100) - 1)] if r else None
+    @property
+    def jitter(self):
+        """Mean absolute difference between consecutive received samples, in ms."""
+        r = [x for x in self.samples if x is not None]
+        if len(r) < 2: return 0.0
+        return sum(abs(b - a) for a, b in zip(r, r[1:])) / (len(r) - 1)
+    @property
+    def loss(self): return 1.0 - len(self.received) / len(self.samples) if self.samples else 1.0
+
+    def stats(self) -> dict:
+        return {"min": self.min, "median": self.median, "p95": self.p95, "jitter": self.jitter, "loss": self.loss, "samples": len(self.samples), "ip": self.ip, "resolve_ms": self.resolve_ms}
+
+    def summary(self) -> str:
+        if not self.ok: return "N/A"
+        return f"{self.median:.0f}ms (min {self.min:.0f}, p95 {self.p95:.0f}, jitter {self.jitter:.0f}, loss {self.loss:.0%})"
+
+def _interleave_families(infos) -> list:
+    """Orders (family, ip) pairs IPv6 first, alternating families (RFC 8305 section 4)."""
+    v6 = [ip for fam, ip in infos if fam == socket.AF_INET6]; v4 = [ip for fam, ip in infos if fam == socket.AF_INET]
+    ordered = []
+    for pair in zip(v6, v4): ordered.extend(pair)
+    longer = v6 if len(v6) > len(v4) else v4
+    ordered.extend(longer[min(len(v6), len(v4)):])
+    return list(dict.fromkeys(ordered))
+
+# --- Address Families ---
+# Errors that say this network has no route over the address's family (e.g. IPv6 on an IPv4-only mobile network).
+_NO_ROUTE_ERRNOS = frozenset({errno.ENETUNREACH, errno.EHOSTUNREACH, errno.EADDRNOTAVAIL, errno.EAFNOSUPPORT})
+_NO_ROUTE_TEXT = tuple(os.strerror(n) for n in _NO_ROUTE_ERRNOS)
+
+def _family_of(ip: str) -> int: return socket.AF_INET6 if ":" in ip else socket.AF_INET
+
+def _no_route(e: BaseException, depth=6) -> bool:
+    """True if e, or an error it wraps (requests, urllib3 and PySocks all wrap), is a no-route error."""
+    if e is None or depth <= 0: return False
+    if isinstance(e, OSError) and e.errno in _NO_ROUTE_ERRNOS: return True
+    if any(text in str(e) for text in _NO_ROUTE_TEXT): return True
+    inner = [e.__cause__, e.__context__, getattr(e, "reason", None), getattr(e, "socket_err", None)] + [a for a in e.args if isinstance(a, BaseException)]
+    return any(_no_route(x, depth - 1) for x in inner if isinstance(x, BaseException) and x is not e)
+
+def _is_connect_error(e: BaseException) -> bool:
+    """A failure to reach the proxy itself (refused, no route, connect timeout, failed SOCKS/CONNECT setup)."""
+    if isinstance(e, (ConnectionError, socket.timeout)) or _no_route(e): return True
+    try: from requests.exceptions import ConnectionError as RequestsConnectionError
+    except ImportError: return False
+    return isinstance(e, RequestsConnectionError)
+
+class AddressFamilies:
+    """
+    What this network has shown about IPv4 and IPv6: when a connect over each family last worked
+    and when one last failed for want of a route. order() keeps the RFC 8305 interleaving but puts
+    families that work first and families whose last word was "no route" last.
+    """
+    def __init__(self): self._lock = threading.Lock(); self._ok = {}; self._no_route = {}
+
+    def record(self, ip: str, ok: bool):
+        family = _family_of(ip); now = time.monotonic()
+        with self._lock: (self._ok if ok else self._no_route)[family] = now
+
+    def order(self, infos) -> list:
+        addrs = _interleave_families(infos)
+        with self._lock:
+            rank = {f: 0 if self._ok.get(f, 0.0) > self._no_route.get(f, 0.0) else 2 if self._no_route.get(f) else 1
+                    for f in (socket.AF_INET, socket.AF_INET6)}
+        return sorted(addrs, key=lambda ip: rank[_family_of(ip)])
+
+    def candidates(self, infos) -> list:
+        """The first address of each family, in order() order: what a check tries, one after another."""
+        seen = set(); out = []
+        for ip in self.order(infos):
+            if _family_of(ip) not in seen: seen.add(_family_of(ip)); out.append(ip)
+        return out
+
+FAMILIES = AddressFamilies()
+
+def via_proxy_addresses(infos, fn, on_retry=None):
+    """
+    Returns fn(ip) for the first of FAMILIES.candidates(infos) that fn can connect through, moving
+    on after a connect error (on_retry(ip, error) is told); other errors and the last one propagate.
+    """
+    candidates = FAMILIES.candidates(infos)
+    for i, ip in enumerate(candidates):
+        try: result = fn(ip)
+        except Exception as e:
+            if _no_route(e): FAMILIES.record(ip, False)
+            if i == len(candidates) - 1 or not _is_connect_error(e): raise
+            if on_retry: on_retry(ip, e)
+        else:
+            FAMILIES.record(ip, True); return result
+
+async def _connect_once(ip: str, port: int, timeout: float):
+    start = time.perf_counter_ns()
+    try: _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except OSError as e:
+        if _no_route(e): FAMILIES.record(ip, False)
+        raise
+    elapsed_ms = (time.perf_counter_ns() - start) / 1e6
+    FAMILIES.record(ip, True)
+    writer.close()
+    return ip, elapsed_ms
+
+async def _race_connect(addrs: list, port: int, timeout: float, delay=HAPPY_EYEBALLS_DELAY):
+    """Starts a connection attempt per address, staggered by `delay`, and returns the first to succeed."""
+    pending = set(); last_error = None
+    try:
+        for i, ip in enumerate(addrs):
+            pending.add(asyncio.ensure_future(_connect_once(ip, port, timeout)))
+            while pending:
+                wait = delay if i < len(addrs) - 1 else None
+                done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done: break
+                for task in done:
+                    if task.exception() is None: return task.result()
+                    last_error = task.exception()
+                if i < len(addrs) - 1: break
+        raise last_error or OSError("No addresses to connect to")
+    finally:
+        for task in pending: task.cancel()
+
+async def probe_endpoint(host: str, port: int, samples=3, timeout=5.0, interval=0.05) -> ProbeResult:
+    """Resolves host once through DNS_CACHE, then takes `samples` timed TCP connects racing all of its addresses."""
+    result = ProbeResult(host=host, port=int(port))
+    loop = asyncio.get_running_loop()
+    try:
+        infos, result.resolve_ms = await asyncio.wait_for(loop.run_in_executor(None, DNS_CACHE.resolve, host), timeout)
+        addrs = FAMILIES.order(infos)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        result.samples = [None] * samples; result.error = _describe_error(e)
+        return result
+    for n in range(samples):
+        try:
+            result.ip, elapsed_ms = await _race_connect(addrs, int(port), timeout)
+            result.samples.append(elapsed_ms)
+        except asyncio.CancelledError:
+            result.error = "Cancelled"; raise
+        except Exception as e:
+            result.samples.append(None); result.error = _describe_error(e)
+        if n < samples - 1 and interval: await asyncio.sleep(interval)
+    if result.ok: result.error = ""
+    return result
+
+async def probe_many(endpoints, samples=3, timeout=5.0, concurrency=1000) -> list:
+    """Probes (host, port) pairs concurrently on the running loop, at most `concurrency` at a time."""
+    sem = asyncio.Semaphore(concurrency)
+    async def one(host, port):
+        async with sem: return await probe_endpoint(host, port, samples=samples, timeout=timeout)
+    return await asyncio.gather(*(one(h, p) for h, p in endpoints))
+
+class AsyncProber:
+    """
+    Owns one background event loop shared by every check thread, so thousands of
+    in-flight connects cost sockets rather than threads.
+    """
+    def __init__(self):
+        self._loop = None; self._lock = threading.Lock(); self._futures = set()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="prober-loop", daemon=True).start()
+            return self._loop
+
+    def submit(self, coro):
+        """Schedules a coroutine on the prober loop and returns a concurrent.futures.Future."""
+        fut = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        with self._lock: self._futures.add(fut)
+        fut.add_done_callback(self._forget)
+        return fut
+
+    def _forget(self, fut):
+        with self._lock: self._futures.discard(fut)
+
+    def probe(self, host: str, port: int, samples=3, timeout=5.0) -> ProbeResult:
+        fut = self.submit(probe_endpoint(host, port, samples=samples, timeout=timeout))
+        try: return fut.result()
+        except Exception as e: return ProbeResult(host=host, port=int(port), samples=[None] * samples, error=_describe_error(e))
+
+    def probe_many(self, endpoints, samples=3, timeout=5.0, concurrency=1000) -> list:
+        return self.submit(probe_many(list(endpoints), samples=samples, timeout=timeout, concurrency=concurrency)).result()
+
+    def cancel_all(self):
+        """Cancels every probe still in flight; their callers get a 'Cancelled' result."""
+        with self._lock: futures = list(self._futures)
+        for fut in futures: fut.cancel()
+
+PROBER = AsyncProber()
+
+
+def _tcp_ping_host(host: str, port: int, timeout=10.0):
+    """
+    Performs a TCP connection test to a given host and port.
+    Returns a tuple of (latency_in_ms, resolved_ip_or_error_message).
+    """
+    result = PROBER.probe(host, port, samples=1, timeout=timeout)
+    if result.ok: return result.min, result.ip
+    return float('inf'), result.error or "Timeout"
@@ -0,0 +1,277 @@
+"""
+Reads and writes the app's saved state: a kivy JsonStore-format snapshot holding {"settings": {...}}
+plus an append-only journal of the changes made since the snapshot was written. The snapshot keeps
+proxies as a compact index (INDEX_FIELDS rows) with one JSON payload string per proxy, which is only
+decoded when that proxy is first used.
+"""
+
+import gc
+import os
+import json
+import time
+import threading
+
+from .logs import ERROR, INFO
+from .models import AddedProxy, INDEX_FIELDS, PAYLOAD_FIELDS, FIELD_NAMES, field_default, field_state, peek
+
+STATE_KEY = "settings"
+TRANSIENT_STATUSES = ("Queued", "Checking...")
+JOURNAL_SUFFIX = ".journal"
+SAVE_DEBOUNCE = 1.0  # seconds of quiet before dirty state is written
+JOURNAL_COMPACT_MIN = 500  # journal records tolerated before folding them into the snapshot
+_STATUS_AT = INDEX_FIELDS.index("status")
+LEGACY_INDEX_FIELDS = ("uid", "ptype", "label", "selected", "status", "latency", "latency_ms", "checked_at")  # snapshots without "proxy_index_fields"
+
+def _read_snapshot(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f: blob = json.load(f)
+    except FileNotFoundError: return {}
+    return blob.get(STATE_KEY) or {}
+
+def _write_snapshot(path: str, settings: dict):
+    """Replaces the settings entry atomically, keeping any other keys the store holds."""
+    try:
+        with open(path, "r", encoding="utf-8") as f: blob = json.load(f)
+    except (OSError, ValueError): blob = {}
+    blob[STATE_KEY] = settings
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(blob, f); f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _replay_journal(path: str, settings: dict, entries: dict) -> int:
+    """Applies journal records in order; a torn last line from a crash ends the replay. Returns records applied."""
+    applied = 0
+    try: f = open(path, "r", encoding="utf-8")
+    except FileNotFoundError: return 0
+    with f:
+        for line in f:
+            try: rec = json.loads(line)
+            except ValueError: break
+            op = rec.get("op")
+            if op == "settings": settings.update(rec["settings"])
+            elif op == "put": entries[rec["id"]] = rec["proxy"]  # replacing keeps the list position
+            elif op == "set" and rec["id"] in entries:
+                entry = entries[rec["id"]]
+                if isinstance(entry, list): entry[2] = {**(entry[2] or {}), **rec["fields"]}
+                else: entry.update(rec["fields"])
+            elif op == "del": entries.pop(rec["id"], None)
+            applied += 1
+    return applied
+
+def _load_entries(path: str):
+    """
+    Returns (settings, entries): entries maps uid -> full proxy dict, or [INDEX_FIELDS row, payload JSON,
+    journaled field changes or None] for proxies from the compact index, in list order with the
+    journal applied.
+    """
+    settings = dict(_read_snapshot(path)); entries = {}
+    for i, d in enumerate(settings.pop("proxies", [])):
+        # Full records from before the compact index. They carry no uid; the snapshot position is stable until it is rewritten.
+        d.setdefault("uid", f"s{i}"); entries[d["uid"]] = d
+    names = tuple(settings.pop("proxy_index_fields", LEGACY_INDEX_FIELDS))
+    for row, payload in zip(settings.pop("proxy_index", []), settings.pop("proxy_payloads", [])):
+        if names != INDEX_FIELDS:  # written by a version with other columns
+            saved = dict(zip(names, row)); row = [saved[k] if k in saved else field_default(k) for k in INDEX_FIELDS]
+        entries[row[0]] = [row, payload, None]
+    _replay_journal(path + JOURNAL_SUFFIX, settings, entries)
+    return settings, entries
+
+def proxy_from_state(p_data: dict) -> AddedProxy:
+    # Older versions also saved a widget ref and the formatted latency text; only current fields are kept.
+    p_data = {k: v for k, v in p_data.items() if k in FIELD_NAMES}
+    if p_data.get('status') in TRANSIENT_STATUSES: p_data['status'] = "Idle"
+    return AddedProxy(**p_data)
+
+def _proxy_from_entry(entry) -> AddedProxy:
+    if not isinstance(entry, list): return proxy_from_state(entry)
+    row, payload, changes = entry; extra = None
+    if changes:
+        row = [changes.get(k, v) for k, v in zip(INDEX_FIELDS, row)]
+        extra = {k: changes[k] for k in PAYLOAD_FIELDS if k in changes}
+    if row[_STATUS_AT] in TRANSIENT_STATUSES: row = list(row); row[_STATUS_AT] = "Idle"
+    return AddedProxy.stub(row, payload, extra)
+
+def _payload_state(p: AddedProxy) -> dict:
+    """Saved payload fields of p. A stub is read without hydrating it: fields set on it overlay its decoded payload."""
+    payload = peek(p, "_payload"); unset = object()
+    if payload is None: return {k: field_state(p, k) for k in PAYLOAD_FIELDS}
+    values = json.loads(payload)
+    values.update({k: field_state(p, k) for k in PAYLOAD_FIELDS if peek(p, k, unset) is not unset})
+    return values
+
+def proxy_to_state(p: AddedProxy) -> dict:
+    return {**{k: getattr(p, k) for k in INDEX_FIELDS}, **_payload_state(p)}
+
+def _index_entry(p: AddedProxy):
+    """Index row and payload JSON for p. A stub nothing has touched reuses its payload text undecoded."""
+    payload = peek(p, "_payload"); unset = object()
+    if payload is None or any(peek(p, k, unset) is not unset for k in PAYLOAD_FIELDS):
+        payload = json.dumps(_payload_state(p), separators=(",", ":"))
+    return [getattr(p, k) for k in INDEX_FIELDS], payload
+
+# --- Journaled Store ---
+def _no_log(message, level=INFO): pass
+
+class StateStore:
+    """
+    Dirty-tracking persistence for settings and the proxy list. Mutations only mark what changed;
+    a background writer waits `debounce` seconds for the marks to settle, then appends one record
+    per changed proxy (just the changed fields where known) to <path>.journal. Once the journal
+    outgrows the list it is folded into a fresh snapshot and truncated. Marks are thread-safe; a
+    failed write keeps them for the next attempt and is reported through log(message, level).
+    The writer never walks the caller's list itself: with an `owner_call` (see track) it has the
+    owning thread hand over a copy, and reads records without hydrating them.
+    """
+    def __init__(self, path: str, debounce: float = SAVE_DEBOUNCE, compact_min: int = JOURNAL_COMPACT_MIN, log=_no_log):
+        self.path = path; self.journal_path = path + JOURNAL_SUFFIX
+        self.debounce = debounce; self.compact_min = compact_min; self.log = log; self._last_error = None
+        self.settings = {}; self.proxies = []
+        self._lock = threading.Lock(); self._io_lock = threading.RLock()
+        self._wake = threading.Event(); self._closing = threading.Event(); self._thread = None
+        self._settings_dirty = False
+        self._dirty = {}  # uid -> (proxy, set of fields, or None for the whole record, or "del")
+        self.journal_records = 0; self.writes = 0; self.compactions = 0; self.load_ms = 0.0
+        self._owner_call = None; self._handed = None; self._snapshot_requested = False
+
+    def load(self):
+        """
+        Returns (settings, proxies) from the snapshot with the journal replayed. Proxies from the
+        compact index come back as stubs (AddedProxy.stub) that decode on first use. Nothing is written.
+        """
+        start = time.perf_counter(); gc_was_enabled = gc.isenabled()
+        gc.disable()  # tens of thousands of small, long-lived objects; collections mid-load only cost time
+        try:
+            settings, entries = _load_entries(self.path)
+            proxies = [_proxy_from_entry(e) for e in entries.values()]
+        finally:
+            if gc_was_enabled: gc.enable()
+        try:
+            with open(self.journal_path, "rb") as f: self.journal_records = sum(1 for _ in f)
+        except FileNotFoundError: self.journal_records = 0
+        self.settings = dict(settings); self.proxies = proxies
+        self.load_ms = (time.perf_counter() - start) * 1000
+        return settings, proxies
+
+    def track(self, proxies: list, owner_call=None):
+        """
+        Uses the caller's live list for compaction snapshots. owner_call(fn) must run fn on the
+        thread that changes the list (e.g. via Clock.schedule_once); without one, compaction copies
+        the list wherever it runs, which suits callers that only change it between flushes.
+        """
+        self.proxies = proxies; self._owner_call = owner_call
+
+    # Marks
+    def update_settings(self, **values):
+        with self._lock:
+            if all(self.settings.get(k) == v for k, v in values.items()): return
+            self.settings.update(values); self._settings_dirty = True
+        self._schedule()
+
+    def proxy_changed(self, proxy: AddedProxy, *fields):
+        """Marks fields of proxy (its whole record when none are given) for the next write."""
+        with self._lock:
+            _, pending = self._dirty.get(proxy.uid, (None, set()))
+            if pending is not None and pending != "del" and fields: pending = pending | set(fields)
+            else: pending = None
+            self._dirty[proxy.uid] = (proxy, pending)
+        self._schedule()
+
+    def proxy_added(self, proxy: AddedProxy): self.proxy_changed(proxy)
+
+    def proxy_removed(self, proxy: AddedProxy):
+        with self._lock:
+            self._dirty.pop(proxy.uid, None); self._dirty[proxy.uid] = (proxy, "del")
+        self._schedule()
+
+    @property
+    def dirty(self) -> bool: return self._settings_dirty or bool(self._dirty)
+
+    # Writing
+    def _schedule(self):
+        if self._closing.is_set(): return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, name="state-writer", daemon=True); self._thread.start()
+        self._wake.set()
+
+    def _writer(self):
+        while not self._closing.is_set():
+            self._wake.wait()
+            self._closing.wait(self.debounce)  # let a burst of marks coalesce into one write
+            self._wake.clear()
+            try: self.flush(); self._last_error = None
+            except Exception as e:  # flush kept the marks; retry after the next debounce
+                error = f"{type(e).__name__}: {e}"
+                if error != self._last_error: self.log(f"Saving state failed, will retry: {error}", ERROR)
+                self._last_error = error; self._wake.set()
+
+    def _records(self, settings, dirty) -> list:
+        records = [{"op": "settings", "settings": settings}] if settings is not None else []
+        for uid, (proxy, pending) in dirty.items():
+            if pending == "del": records.append({"op": "del", "id": uid})
+            elif pending is None: records.append({"op": "put", "id": uid, "proxy": proxy_to_state(proxy)})
+            else: records.append({"op": "set", "id": uid, "fields": {k: field_state(proxy, k) for k in sorted(pending)}})
+        return records
+
+    def flush(self):
+        """Writes pending marks now (one journal append), compacting when the journal has grown too long."""
+        with self._io_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+                settings = dict(self.settings) if self._settings_dirty else None; self._settings_dirty = False
+                handed, self._handed = self._handed, None
+            # A handed-over list is current only if nothing reached the journal since; marks made after the
+            # hand-over are still pending here and go to the fresh journal.
+            try:
+                if handed is not None and handed[1] == self.writes: self.compact(handed[0])
+                records = self._records(settings, dirty)
+                if not records: return
+                blob = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+                with open(self.journal_path, "a", encoding="utf-8") as f:
+                    f.write(blob); f.flush(); os.fsync(f.fileno())
+            except BaseException:
+                with self._lock:  # put the marks back; a proxy marked again meanwhile is rewritten whole
+                    for uid, mark in dirty.items():
+                        newer = self._dirty.get(uid)
+                        if newer is None: self._dirty[uid] = mark
+                        elif newer[1] != "del": self._dirty[uid] = (newer[0], None)
+                    self._settings_dirty = self._settings_dirty or settings is not None
+                    if self._handed is None: self._handed = handed
+                raise
+            self.journal_records += len(records); self.writes += 1
+            if self.journal_records > max(self.compact_min, len(self.proxies) // 2): self._compact_due()
+
+    def _compact_due(self):
+        if self._owner_call is None or threading.current_thread() is not self._thread: self.compact(); return
+        with self._lock:
+            if self._snapshot_requested: return
+            self._snapshot_requested = True
+        self._owner_call(self._hand_over)
+
+    def _hand_over(self):
+        """Runs on the owning thread: gives the writer a copy of the list to compact from."""
+        with self._lock: self._handed = (tuple(self.proxies), self.writes); self._snapshot_requested = False
+        self._schedule()
+
+    def compact(self, proxies=None):
+        """
+        Folds everything into a new snapshot (temp file + rename) and starts an empty journal.
+        `proxies` is a copy of the list handed over by its owner; without it the tracked list is copied here.
+        """
+        with self._io_lock:
+            with self._lock: settings = dict(self.settings)
+            entries = [_index_entry(p) for p in (tuple(self.proxies) if proxies is None else proxies)]
+            settings["proxy_index_fields"] = list(INDEX_FIELDS); settings["proxy_index"] = [row for row, _ in entries]; settings["proxy_payloads"] = [payload for _, payload in entries]
+            _write_snapshot(self.path, settings)
+            try: os.remove(self.journal_path)
+            except FileNotFoundError: pass
+            self.journal_records = 0; self.compactions += 1
+
+    def close(self):
+        """Stops the writer and flushes whatever is still pending."""
+        self._closing.set(); self._wake.set()
+        if self._thread is not None: self._thread.join(timeout=self.debounce + 5)
+        self.flush()
+
+    def summary(self) -> str:
+        return f"State store: {self.writes} writes, {self.journal_records} journal records, {self.compactions} compactions."
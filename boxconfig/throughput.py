@@ -0,0 +1,126 @@
+"""
+Throughput test: pulls a capped download through a SOCKS5/HTTP proxy and measures Mbps, time to first
+byte and stalls. The network stack is imported on the first test, so the UI can import this at startup.
+"""
+
+import time
+import threading
+
+from .logs import DEBUG, INFO, WARNING
+
+# --- Settings ---
+THROUGHPUT_URL = "https://speed.cloudflare.com/__down?bytes={bytes}"  # {bytes} becomes the size cap; point at a local server to test
+THROUGHPUT_TYPES = ("socks5", "http")  # other types need a running sing-box to tunnel through
+THROUGHPUT_CONCURRENCY = 2
+THROUGHPUT_CHUNK = 16 * 1024  # bytes per read; a read returns early with whatever has arrived
+THROUGHPUT_STALL = 0.5  # seconds without data (budget waits excluded) counted as one stall
+THROUGHPUT_CONNECT_TIMEOUT = 15.0
+
+# Saved-settings keys for the test, with their defaults; see throughput_options().
+THROUGHPUT_SETTINGS = {"speed_max_mb": 5, "speed_max_seconds": 10, "speed_budget_mbps": 0}
+
+def throughput_options(settings: dict) -> dict:
+    """throughput_test keyword arguments from the THROUGHPUT_SETTINGS keys of a settings dict (missing, blank or bad values use defaults)."""
+    def get(k):
+        try: return max(0.0, float(settings.get(k))) if settings.get(k) not in (None, "") else THROUGHPUT_SETTINGS[k]
+        except (TypeError, ValueError): return THROUGHPUT_SETTINGS[k]
+    return {"max_bytes": int((get("speed_max_mb") or THROUGHPUT_SETTINGS["speed_max_mb"]) * 1_000_000),
+            "max_seconds": float(get("speed_max_seconds") or THROUGHPUT_SETTINGS["speed_max_seconds"]),
+            "budget_mbps": float(get("speed_budget_mbps"))}
+
+# --- Bandwidth Budget ---
+class BandwidthBudget:
+    """
+    A token bucket of bytes shared by every running test, so concurrent tests together stay under
+    `mbps` (0 = unlimited). take(n) is called after each read and sleeps off any debt; a throttled
+    reader stops draining its socket and TCP slows the sender down to match.
+    """
+    def __init__(self, mbps=0.0, burst_seconds=0.25, clock=time.monotonic):
+        self.burst_seconds = burst_seconds; self.clock = clock
+        self._lock = threading.Lock(); self.configure(mbps)
+
+    def configure(self, mbps):
+        with self._lock:
+            self.mbps = max(0.0, float(mbps or 0)); self.rate = self.mbps * 125_000  # bytes per second
+            self._tokens = self.rate * self.burst_seconds; self._refilled = self.clock()
+
+    def take(self, n) -> float:
+        """Charges n bytes; returns the seconds slept to stay within the budget."""
+        if not self.rate: return 0.0
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.rate * self.burst_seconds, self._tokens + (now - self._refilled) * self.rate); self._refilled = now
+            self._tokens -= n; wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait: time.sleep(wait)
+        return wait
+
+BUDGET = BandwidthBudget()
+
+# --- Throughput Test ---
+def _no_log(message, level=INFO): pass
+
+def _download(session, url, max_bytes, max_seconds, budget) -> dict:
+    """Streams url until max_bytes or max_seconds; returns the throughput_stats of the transfer."""
+    start = time.perf_counter(); deadline = start + max_seconds
+    received = first = stalls = 0; throttled = 0.0; first_at = None; capped = None
+    with session.get(url, stream=True, timeout=(THROUGHPUT_CONNECT_TIMEOUT, max_seconds), headers={"Accept-Encoding": "identity"}) as response:
+        response.raise_for_status()
+        read = getattr(response.raw, "read1", response.raw.read)  # read1 (urllib3 2) returns what has arrived instead of filling the chunk
+        last = start
+        while True:
+            try: chunk = read(THROUGHPUT_CHUNK)
+            except Exception:
+                if not received: raise
+                stalls += 1; capped = "stalled"; break  # silent for the whole time cap: measure what arrived
+            now = time.perf_counter()
+            if not chunk: break
+            if first_at is None: first_at = now; first = len(chunk)
+            elif now - last > THROUGHPUT_STALL: stalls += 1
+            received += len(chunk)
+            if received >= max_bytes: capped = "size"; break
+            if now >= deadline: capped = "time"; break
+            throttled += budget.take(len(chunk)); last = time.perf_counter()
+    end = time.perf_counter()
+    if not received: raise Exception("Empty response")
+    # The rate is taken after the first byte, so connection setup shows up as TTFB rather than lowering Mbps, and
+    # without the budget waits, so a shared budget does not make the proxy look slower than it is.
+    span, body = end - first_at - throttled, received - first
+    mbps = body * 8 / span / 1e6 if body and span > 0.001 else received * 8 / (end - start) / 1e6
+    return {"mbps": round(mbps, 3), "ttfb_ms": round((first_at - start) * 1000, 1), "bytes": received, "seconds": round(end - start, 3),
+            "stalls": stalls, "capped": capped, "throttled": round(throttled, 3), "at": time.time()}
+
+def throughput_test(proxy, url=None, max_bytes=None, max_seconds=None, budget_mbps=None, budget=None, log=_no_log, on_update=None) -> bool:
+    """
+    Downloads up to max_bytes from url (THROUGHPUT_URL) through a SOCKS5/HTTP proxy for at most
+    max_seconds, sharing `budget` (BUDGET, reconfigured to budget_mbps if given) with other tests.
+    Sets throughput_mbps and throughput_stats (mbps, ttfb_ms, bytes, seconds, stalls, capped,
+    throttled, at), or throughput_mbps None and stats {"error", "at"} on failure, through
+    on_update(fields) like check_proxy. Status is left alone. Returns True if data arrived.
+    """
+    from .network import DEPENDENCIES_AVAILABLE, DNS_CACHE, SESSIONS, _describe_error, proxy_url, via_proxy_addresses
+    defaults = throughput_options({})
+    max_bytes = max_bytes or defaults["max_bytes"]; max_seconds = max_seconds or defaults["max_seconds"]
+    budget = BUDGET if budget is None else budget
+    if budget_mbps is not None and budget_mbps != budget.mbps: budget.configure(budget_mbps)
+    if on_update is None:
+        def on_update(fields):
+            for k, v in fields.items(): setattr(proxy, k, v)
+    ptype = proxy.ptype.lower(); d = proxy.data
+    log(f"Speed testing {proxy.label} ({max_bytes / 1e6:.0f} MB / {max_seconds:.0f}s cap)...", DEBUG)
+    try:
+        if ptype not in THROUGHPUT_TYPES: raise Exception(f"Speed test needs a SOCKS5/HTTP proxy, not {proxy.ptype}")
+        if not DEPENDENCIES_AVAILABLE: raise Exception("requests and PySocks needed for a speed test")
+        host, port = d.get("server"), d.get("server_port")
+        if not host or not port: raise Exception("Invalid Host/Port in config")
+        infos, _ = DNS_CACHE.resolve(host); target = (url or THROUGHPUT_URL).format(bytes=int(max_bytes))
+        def through(ip): return _download(SESSIONS.get(proxy_url(ptype, ip, port, d.get("username"), d.get("password"))), target, max_bytes, max_seconds, budget)
+        stats = via_proxy_addresses(infos, through, on_retry=lambda ip, e: log(f"-> {ip} not reachable, trying the other address family", DEBUG))
+        fields = {"throughput_mbps": stats["mbps"], "throughput_stats": stats}
+        log(f"-> Speed for {proxy.label}: {stats['mbps']:.1f} Mbps, TTFB {stats['ttfb_ms']:.0f}ms, {stats['stalls']} stalls, "
+            f"{stats['bytes'] / 1e6:.1f} MB in {stats['seconds']:.1f}s" + (f" (budget waits {stats['throttled']:.1f}s)" if stats["throttled"] else ""))
+    except Exception as e:
+        error_message = _describe_error(e)
+        fields = {"throughput_mbps": None, "throughput_stats": {"error": error_message, "at": time.time()}}
+        log(f"-> Speed test failed for {proxy.label}. Reason: {error_message}", WARNING)
+    on_update(fields)
+    return fields["throughput_mbps"] is not None
@@ -17,6 +17,9 @@ source.main = main.py
 # (list) Source files to include
 source.include_exts = py,png,jpg,kv,atlas
 
+# (list) Source directories to leave out of the APK
+source.exclude_dirs = benchmarks
+
 # (list) List of modules your app needs
 # --- FIX: Added dependencies for requests (urllib3, idna, certifi) and optional pyyaml ---
 requirements = python3,kivy,kivymd,requests,pysocks,urllib3,idna,certifi,pyyaml
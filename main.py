@@ -5,32 +5,20 @@ Sing-box Config Maker - KivyMD Edition (Final Patched Version)
 
 """
 
+import time
+_MAIN_START = time.perf_counter()
+
 import os
 import json
-import re
-import threading
-import time
-import socket
-import base64
-from urllib.parse import urlparse, parse_qs, unquote
-from dataclasses import dataclass, field
-import weakref
-from datetime import datetime
-import webbrowser
-
-# --- Dependency Management ---
-try:
-    import requests
-    import socks
-    DEPENDENCIES_AVAILABLE = True
-except ImportError:
-    DEPENDENCIES_AVAILABLE = False
+from contextlib import contextmanager
 
 from kivy.core.clipboard import Clipboard
 from kivy.clock import Clock
 from kivy.properties import ObjectProperty
-from kivy.storage.jsonstore import JsonStore
 from kivy.core.window import Window
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 
 from kivymd.app import MDApp
 from kivymd.uix.screen import MDScreen
@@ -39,181 +27,78 @@ from kivymd.uix.gridlayout import MDGridLayout
 from kivymd.uix.textfield import MDTextField
 from kivymd.uix.button import MDRaisedButton, MDIconButton, MDFlatButton
 from kivymd.uix.label import MDLabel
-from kivymd.uix.dialog import MDDialog
-from kivymd.uix.list import MDList, OneLineIconListItem
-from kivymd.uix.menu import MDDropdownMenu
+from kivymd.uix.list import OneLineIconListItem
 from kivymd.uix.tab import MDTabs, MDTabsBase
 from kivymd.uix.scrollview import MDScrollView
 from kivymd.uix.card import MDCard
 from kivymd.uix.selectioncontrol import MDCheckbox
 
+# Parsing, checks and config generation live in the Kivy-free boxconfig package.
+from boxconfig.models import AddedProxy, SORT_NAMES, STATUS_FILTERS, select_proxies, memory_report, memory_summary
+from boxconfig.decoders import detect_proxy_type, parse_wireguard_conf
+from boxconfig.links import (MERGE_SKIP, MERGE_POLICIES, IMPORT_MAX_ERROR_DETAILS, LinkParseError, ProxyIndex, ImportJob,
+                             forget_checks, insert_proxy, parse_link, proxy_from_link, proxy_identity)
+from boxconfig.config import GEN_ORDERS, UNREACHABLE_POLICIES, GENERATION_SETTINGS, FragmentCache, build_config, generation_options
+from boxconfig.engine import DEFAULT_CHECK_CONCURRENCY, CheckEngine, DeltaQueue
+from boxconfig.monitor import BUSY_STATUSES, HealthMonitor, format_age, monitor_entries
+from boxconfig.throughput import BUDGET, THROUGHPUT_CONCURRENCY, THROUGHPUT_SETTINGS, THROUGHPUT_TYPES, throughput_options
+from boxconfig.state import StateStore
+from boxconfig.logs import INFO, WARNING, ERROR, LEVEL_NAMES, RingLog
+from boxconfig.metrics import METRICS
+# The network stack (boxconfig.network/checks, requests) is imported on the first check; see MainScreen.ensure_network.
 
-# --- Data Classes ---
-@dataclass
-class AddedProxy:
-    """Holds the state for each added proxy configuration."""
-    ptype: str
-    label: str
-    data: dict
-    raw: str = ""
-    selected: bool = True
-    status: str = "Idle"
-    latency: str = "N/A"
-    info: str = "N/A"
-    _ui_widget_ref: weakref.ref = field(default=None, repr=False)
-
-    @property
-    def ui_widget(self):
-        return self._ui_widget_ref() if self._ui_widget_ref else None
-
-    @ui_widget.setter
-    def ui_widget(self, widget):
-        self._ui_widget_ref = weakref.ref(widget) if widget else None
-
-
-# --- Core Parsing & Network Functions ---
-def _decode_vmess(url: str) -> dict:
-    try:
-        payload = url.split("://", 1)[1]
-        missing = len(payload) % 4
-        if missing: payload += "=" * (4 - missing)
-        obj = json.loads(base64.urlsafe_b64decode(payload.encode()).decode("utf-8", "ignore"))
-        return {"server": obj.get("add", ""), "server_port": int(obj.get("port", 0) or 0), "uuid": obj.get("id", ""), "alter_id": int(obj.get("aid", 0) or 0), "security": obj.get("scy") or "auto", "transport": obj.get("net") or "tcp", "sni": obj.get("sni") or obj.get("host") or "", "path": obj.get("path") or "", "header": obj.get("type") or "", "tls": (obj.get("tls") or "").lower() in ("tls", "reality", "xtls")}
-    except Exception: return {}
-
-def _decode_vless(url: str) -> dict:
-    try:
-        u = urlparse(url)
-        user = unquote(u.username or ""); host = u.hostname or ""; port = int(u.port or 0); qs = parse_qs(u.query)
-        return {"server": host, "server_port": port, "uuid": user, "flow": (qs.get("flow", [None])[0]) or "", "transport": (qs.get("type", [None])[0]) or "tcp", "sni": (qs.get("sni", [None])[0]) or "", "path": (qs.get("path", [None])[0]) or "", "tls": (qs.get("security", [None])[0] or "").lower() in ("tls", "reality", "xtls")}
-    except Exception: return {}
-
-def _decode_shadowsocks(url: str) -> dict:
-    try:
-        u = urlparse(url); host = u.hostname or ""; port = int(u.port or 0); userinfo = u.netloc.split("@")[0]
-        if ":" not in userinfo:
-            missing = len(userinfo) % 4
-            if missing: userinfo += "=" * (4 - missing)
-            userinfo = base64.urlsafe_b64decode(userinfo.encode()).decode("utf-8", "ignore")
-        method, password = userinfo.split(":", 1)
-        return {"server": host, "server_port": port, "method": method, "password": password}
-    except Exception: return {}
-    
-def parse_socks_string(s: str):
-    m = re.match(r"^\s*([\w\.\-]+):(\d+)(?::([^:\s]+):([^:\s]+))?\s*$", (s or "").strip());
-    if not m: return None
-    return {"server": m.group(1), "server_port": int(m.group(2)), "username": m.group(3) or "", "password": m.group(4) or ""}
+# --- Startup Profiler ---
+STARTUP_BUDGET_MS = 2000.0  # time-to-first-frame above this is logged as a regression
+
+class StartupProfiler:
+    """Wall-clock phase timings from the first line of main.py to the first rendered frame."""
+    def __init__(self, t0): self.t0 = t0; self.phases = {}; self.first_frame_ms = None
+
+    def record(self, name, since):
+        self.phases[name] = self.phases.get(name, 0.0) + (time.perf_counter() - since) * 1000
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try: yield
+        finally: self.record(name, start)
+
+    def first_frame(self): self.first_frame_ms = (time.perf_counter() - self.t0) * 1000
+
+    def summary(self) -> str:
+        phases = ", ".join(f"{name} {ms:.0f}ms" for name, ms in self.phases.items())
+        return f"Startup: first frame after {self.first_frame_ms:.0f}ms ({phases})"
+
+STARTUP = StartupProfiler(_MAIN_START)
+STARTUP.record("imports", _MAIN_START)
 
-def _tcp_ping_host(host: str, port: int, timeout=10.0):
-    """
-    Performs a TCP connection test to a given host and port.
-    Returns a tuple of (latency_in_ms, resolved_ip_or_error_message).
-    """
-    try:
-        ip = socket.gethostbyname(host)
-        start_time = time.time()
-        with socket.create_connection((ip, int(port)), timeout=timeout):
-            end_time = time.time()
-            return (end_time - start_time) * 1000, ip
-    except socket.timeout:
-        return float('inf'), "Timeout"
-    except ConnectionRefusedError:
-        return float('inf'), "Connection Refused"
-    except socket.gaierror:
-        return float('inf'), "Host Not Found"
-    except Exception as e:
-        return float('inf'), str(e).splitlines()[0]
-
-def detect_proxy_type(s: str):
-    s = (s or "").strip()
-    if not s: return "unknown"
-    if s.startswith("[Interface]") or "PrivateKey" in s: return "wireguard"
-    ls = s.lower()
-    if ls.startswith("vmess://"): return "vmess"
-    if ls.startswith("vless://"): return "vless"
-    if ls.startswith("ss://"): return "shadowsocks"
-    try:
-        parsed = urlparse(s if "://" in s else "//" + s); scheme = (parsed.scheme or "").lower(); netloc = parsed.netloc or parsed.path
-        if scheme in ("socks5", "socks", "socks5h"): return "socks5"
-        if scheme in ("http", "https"): return "http"
-        if netloc:
-            if "@" in netloc or re.match(r"^[\w\.\-]+:\d+$", netloc): return "socks5"
-    except Exception: pass
-    if re.match(r"^\s*([\w\.\-]+):(\d+)(?::([^:\s]+):([^:\s]+))?\s*$", s): return "socks5"
-    return "unknown"
-
-def parse_wireguard_conf(text: str) -> dict:
-    out = {"private_key": "", "local_address": [], "peer_public_key": "", "server": "", "server_port": ""}
-    lines = (text or "").splitlines()
-    for L in lines:
-        if "=" not in L: continue
-        key, val = L.split("=", 1); key, val = key.strip(), val.strip()
-        if key == "PrivateKey": out["private_key"] = val
-        if key == "Address": out["local_address"] = [a.strip() for a in re.split(r"[,\s]+", val) if a.strip()]
-        if key == "PublicKey": out["peer_public_key"] = val
-        if key == "Endpoint":
-            match_ipv6 = re.match(r'\[(.*)\]:(\d+)', val)
-            if match_ipv6: out["server"] = match_ipv6.group(1); out["server_port"] = int(match_ipv6.group(2))
-            elif ':' in val.rsplit(']', 1)[-1]:
-                host, port = val.rsplit(":", 1); out["server"] = host.strip()
-                try: out["server_port"] = int(port.strip())
-                except (ValueError, TypeError): out["server_port"] = ""
-            else: out["server"] = val
-    return out
-
-def _outbound_from_added(outbound_tag_for_type, p) -> dict:
-    t = p.ptype.lower(); server_id = p.data.get("server") or "proxy"; tag = f"{outbound_tag_for_type(t).split('-')[0]}-{server_id}"
-    if t == "wireguard":
-        d = p.data; sp = int(d.get("server_port") or 51820); local_addrs = [a.strip() for a in (d.get("local_address") or "").split(",") if a.strip()]
-        return {"type":"wireguard","tag":tag,"interface_name":"wg0", "local_address": local_addrs or ["10.74.200.203/32"], "private_key": d.get("private_key",""), "peers":[{"server": d.get("server",""), "server_port": sp, "public_key": d.get("peer_public_key",""), "allowed_ips":["0.0.0.0/0","::/0"]}], "mtu":1420}
-    if t in ("socks5","http","https"):
-        d = p.data; ob = {"type":"socks" if t=="socks5" else t,"tag":tag,"server": d.get("server",""), "server_port": int(d.get("server_port") or 0)}
-        if d.get("username"): ob["username"] = d.get("username"); ob["password"] = d.get("password","")
-        return ob
-    if t == "vmess":
-        d = _decode_vmess(p.raw);
-        if not d: return {}; tag = f"VMESS-{d.get('server', 'proxy')}"
-        ob = {"type":"vmess","tag":tag,"server":d["server"],"server_port":d["server_port"], "uuid":d["uuid"],"alter_id": d.get("alter_id",0),"security": d.get("security","auto")}
-        if d.get("tls"): ob["tls"] = {"enabled": True, "server_name": d.get("sni") or ""};
-        if d.get("transport") in ("ws","grpc","quic","http"): ob["transport"] = {"type": d.get("transport"), "path": d.get("path","")}
-        return ob
-    if t == "vless":
-        d = _decode_vless(p.raw);
-        if not d: return {}; tag = f"VLESS-{d.get('server', 'proxy')}"
-        ob = {"type":"vless","tag":tag,"server":d["server"],"server_port":d["server_port"],"uuid":d["uuid"],"flow": d.get("flow","")}
-        if d.get("tls"): ob["tls"] = {"enabled": True, "server_name": d.get("sni") or ""};
-        if d.get("transport") in ("ws","grpc","quic","http"): ob["transport"] = {"type": d.get("transport"), "path": d.get("path","")}
-        return ob
-    if t == "shadowsocks":
-        d = _decode_shadowsocks(p.raw);
-        if not d: return {}; tag = f"SS-{d.get('server', 'proxy')}"
-        return {"type":"shadowsocks","tag":tag,"server":d["server"],"server_port":d["server_port"], "method": d["method"], "password": d["password"]}
-    return {}
-
-def outbound_tag_for_type(proxy_type: str):
-    t = (proxy_type or "").lower()
-    if t == "wireguard": return "WG-US";
-    if t == "socks5": return "SOCKS5-PROXY"
-    if t == "vmess": return "VMESS-PROXY";
-    if t == "vless": return "VLESS-PROXY"
-    if t == "shadowsocks": return "SS-PROXY";
-    if t == "http": return "HTTP-PROXY"
-    return "PROXY"
 
 # --- KivyMD UI Components ---
 
 class Tab(MDBoxLayout, MDTabsBase): pass
 
-class ProxyDetailWidget(MDCard):
+PROXY_ROW_HEIGHT = "170dp"  # until a row has measured its text; see ProxyDetailWidget._fit_height
+LOG_VIEW_INTERVAL = 0.5  # seconds between Log tab refreshes; workers never touch the widget
+UI_UPDATES_PER_FRAME = 64  # proxy updates applied per frame while checks run; the rest wait a frame
+PLACEHOLDER_FIELDS = ("status", "info")  # what a check sets when it starts; only saved once it has a result
+MONITOR_START_DELAY = 10.0  # seconds after the first frame before background checks begin
+MONITOR_UI_INTERVAL = 1.0  # seconds between looks for background check results
+MONITOR_ENTRIES_PER_FRAME = 500  # proxies decoded per frame while building the monitor's snapshot of the list
+AGE_REFRESH_INTERVAL = 30.0  # seconds between re-renders of the visible rows' "checked ... ago"
+
+class ProxyDetailWidget(RecycleDataViewBehavior, MDCard):
+    """
+    One row of the virtualized proxy list. The RecycleView creates only enough rows to fill the
+    screen and rebinds them to other proxies while scrolling, via data entries of {"proxy": p}
+    plus the row's measured "height" once it has been shown.
+    """
     proxy = ObjectProperty(None)
-    def __init__(self, proxy_obj: AddedProxy, **kwargs):
+    def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.proxy = proxy_obj
-        self.proxy.ui_widget = self
+        self.index = None; self._fit_trigger = Clock.create_trigger(self._fit_height)
         self.orientation = 'vertical'
         self.size_hint_y = None
-        # [MODIFIED] Card height is now adaptive to prevent text truncation
-        self.adaptive_height = True
+        self.height = PROXY_ROW_HEIGHT
         self.padding = "8dp"
         self.elevation = 3
         self.style = "filled"
@@ -221,9 +106,9 @@ class ProxyDetailWidget(MDCard):
         self.radius = [12]
 
         main_row = MDBoxLayout(adaptive_height=True, spacing="10dp")
-        self.cb_select = MDCheckbox(active=self.proxy.selected, size_hint_x=None, width="48dp")
+        self.cb_select = MDCheckbox(active=False, size_hint_x=None, width="48dp")
         self.cb_select.bind(active=self._on_selection_change)
-        self.lbl_label = MDLabel(text=self.proxy.label, font_style="Subtitle1", adaptive_height=True, shorten=True, shorten_from='right')
+        self.lbl_label = MDLabel(text="", font_style="Subtitle1", adaptive_height=True, shorten=True, shorten_from='right')
         main_row.add_widget(self.cb_select)
         main_row.add_widget(self.lbl_label)
 
@@ -254,19 +139,39 @@ class ProxyDetailWidget(MDCard):
 
         self.add_widget(main_row)
         self.add_widget(status_grid)
-        self.update_ui()
-
-    def _on_selection_change(self, instance, value): self.proxy.selected = value; self.update_ui(); MDApp.get_running_app().save_state()
+        self.main_row = main_row; self.status_grid = status_grid
+        main_row.bind(height=self._fit_trigger); status_grid.bind(height=self._fit_trigger)
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.index = index
+        super().refresh_view_attrs(rv, index, data)
+        self.update_ui(); self._fit_trigger()  # the child heights may not change on a re-bind, so measure every time
+
+    def _fit_height(self, *args):
+        # The labels wrap (long Geo-IP info, latency history, speed), so the row takes the height of its text.
+        height = self.main_row.height + self.status_grid.height + self.padding[1] + self.padding[3]
+        if self.proxy is not None and abs(height - self.height) >= 1: MDApp.get_running_app().root.row_resized(self.proxy, self.index, height)
+
+    def _on_selection_change(self, instance, value):
+        # Rebinding a recycled row sets the checkbox to the new proxy's value; only user toggles get past this.
+        if self.proxy is None or value == self.proxy.selected: return
+        self.proxy.selected = value; app = MDApp.get_running_app()
+        app.state.proxy_changed(self.proxy, "selected"); app.root.monitor.reschedule()  # selected proxies are checked more often
     def _on_check(self, instance): MDApp.get_running_app().root.check_proxy(self.proxy)
     def _on_edit(self, instance): MDApp.get_running_app().root.edit_proxy(self.proxy)
     def _on_delete(self, instance): MDApp.get_running_app().root.confirm_delete_proxy(self.proxy)
     
     def update_ui(self):
+        if self.proxy is None: return
         self.lbl_label.text = self.proxy.label
-        self.lbl_status.text = self.proxy.status
-        self.lbl_latency.text = self.proxy.latency
+        checked_at = self.proxy.checked_at
+        fresh = f" ({format_age(time.time() - checked_at)})" if checked_at and self.proxy.status not in BUSY_STATUSES else ""
+        self.lbl_status.text = self.proxy.status + fresh
+        speed = self.proxy.throughput
+        latency = self.proxy.latency_summary
+        self.lbl_latency.text = f"{latency}  |  {speed}" if speed else latency
         self.lbl_info.text = self.proxy.info
-        self.btn_check.disabled = (self.proxy.status == "Checking...")
+        self.btn_check.disabled = self.proxy.status in ("Checking...", "Queued")
         self.cb_select.active = self.proxy.selected
         
         if self.proxy.status == "Reachable":
@@ -279,8 +184,23 @@ class ProxyDetailWidget(MDCard):
 class MainScreen(MDScreen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.added_proxies = []; self.generated_config = ""; self.dns_protection_on = False; self.dialog = None
+        self.added_proxies = []; self.generated_config = ""; self.dns_protection_on = False; self.hedged_geoip = False; self.dialog = None
+        self.proxy_index = ProxyIndex(); self.merge_policy = MERGE_SKIP; self.fragment_cache = FragmentCache()
         self.log_file_path = None
+        self.check_engine = CheckEngine(self._worker_check_proxy, on_progress=self._on_check_progress, on_finished=self._on_checks_finished, on_skipped=self._on_checks_skipped)
+        self.ui_updates = DeltaQueue(); self._ui_drain = None; self._progress_dirty = False
+        self.monitor = HealthMonitor(self._worker_check_proxy, lambda: self._monitor_entries); self._monitor_entries = (); self._entries_job = None
+        self.monitor_on = True; self._monitor_tick = None; self._ages_shown_at = 0.0
+        self.speed_engine = CheckEngine(self._worker_speed_test, concurrency=THROUGHPUT_CONCURRENCY, on_finished=self._on_speed_tests_finished)
+        self.speed_settings = dict(THROUGHPUT_SETTINGS)
+        self.net = None; self.proxy_menu = None
+        self.check_concurrency = DEFAULT_CHECK_CONCURRENCY; self.check_deadline = 0; self.check_progress_text = "No checks running."
+        self.app_log = RingLog(); self._log_view_seq = -1; self.log_level_button = None
+        # Widgets of tabs that are not built yet stay None; their builders read the state above.
+        self.proxy_rv = self.lbl_check_progress = self.btn_cancel_checks = self.log_output = self.lbl_list_count = None
+        self.list_query = ""; self.list_status = None; self.list_sort = "added"; self.visible_proxies = []; self._row_of = {}; self._row_heights = {}
+        self.theme_button = self.merge_button = self.unreachable_button = self.order_button = None
+        self.gen_settings = dict(GENERATION_SETTINGS)
         root_layout = MDBoxLayout(orientation='vertical', spacing='10dp')
         header = MDBoxLayout(adaptive_height=True, spacing="10dp", padding=("10dp", "10dp", "10dp", 0))
         # [MODIFIED] App name changed in the header
@@ -307,9 +227,6 @@ class MainScreen(MDScreen):
         add_proxy_content.add_widget(paste_actions)
         self.proxy_type_button = MDRaisedButton(text="WireGuard")
         self.proxy_type_button.bind(on_release=self.open_proxy_menu)
-        proxy_types = ["WireGuard", "SOCKS5", "VMess", "VLESS", "Shadowsocks", "HTTP"]
-        menu_items = [{"text": f"{i}", "viewclass": "OneLineIconListItem", "on_release": lambda x=f"{i}": self.set_proxy_type(x)} for i in proxy_types]
-        self.proxy_menu = MDDropdownMenu(caller=self.proxy_type_button, items=menu_items, width_mult=4)
         add_proxy_content.add_widget(self.proxy_type_button)
         self.wg_grid = MDGridLayout(cols=1, adaptive_height=True, spacing="10dp")
         self.wg_server = MDTextField(hint_text="WG Host/Endpoint"); self.wg_port = MDTextField(hint_text="WG Port"); self.wg_private_key = MDTextField(hint_text="Private Key"); self.wg_local_address = MDTextField(hint_text="Local Address (e.g., 10.0.0.2/32)"); self.wg_peer_public_key = MDTextField(hint_text="Peer Public Key")
@@ -323,21 +240,63 @@ class MainScreen(MDScreen):
         add_proxy_content.add_widget(self.btn_add_proxy)
         add_proxy_scroll.add_widget(add_proxy_content); self.tab_add_proxy.add_widget(add_proxy_scroll); self.tab_panel.add_widget(self.tab_add_proxy)
         
-        # --- Proxy List Tab ---
-        self.tab_proxy_list = Tab(title="Proxy List")
+        # The other tabs are empty shells until first shown; see ensure_tab.
+        self.tab_proxy_list = Tab(title="Proxy List"); self.tab_settings = Tab(title="Settings"); self.tab_log = Tab(title="Log")
+        for tab in (self.tab_proxy_list, self.tab_settings, self.tab_log): self.tab_panel.add_widget(tab)
+        self._tab_builders = {"Proxy List": self._build_proxy_list_tab, "Settings": self._build_settings_tab, "Log": self._build_log_tab}
+
+        root_layout.add_widget(self.tab_panel)
+        self.action_bar = MDBoxLayout(adaptive_height=True, spacing="8dp", padding=("10dp", "10dp", "10dp", "20dp"))
+        self.action_bar.add_widget(MDRaisedButton(text="Generate", on_press=self.generate_config, md_bg_color=self.theme_cls.primary_color)); self.action_bar.add_widget(MDRaisedButton(text="View", on_press=self.view_config)); self.action_bar.add_widget(MDRaisedButton(text="Copy", on_press=self.copy_config)); self.action_bar.add_widget(MDRaisedButton(text="Save", on_press=self.save_config))
+        root_layout.add_widget(self.action_bar); self.add_widget(root_layout)
+        Clock.schedule_once(self.post_build_init)
+
+    # --- Lazily built tabs ---
+    def ensure_tab(self, title):
+        """Builds a tab's widgets the first time it is shown."""
+        builder = self._tab_builders.pop(title, None)
+        if builder is None: return
+        start = time.perf_counter()
+        builder()
+        self.log_message(f"Built {title} tab in {(time.perf_counter() - start) * 1000:.0f}ms.")
+
+    def _build_proxy_list_tab(self):
         proxy_list_layout = MDBoxLayout(orientation='vertical', padding="10dp", spacing="10dp")
-        self.proxies_list_container = MDList(); proxies_scroll = MDScrollView(); proxies_scroll.add_widget(self.proxies_list_container)
-        proxy_list_layout.add_widget(proxies_scroll); self.tab_proxy_list.add_widget(proxy_list_layout); self.tab_panel.add_widget(self.tab_proxy_list)
-        
-        # --- Settings Tab ---
-        self.tab_settings = Tab(title="Settings")
-        settings_content = MDBoxLayout(orientation="vertical", spacing="15dp", padding="20dp")
+        check_row = MDBoxLayout(adaptive_height=True, spacing="8dp")
+        check_row.add_widget(MDRaisedButton(text="Check All", on_press=lambda x: self.check_all(selected_only=False)))
+        check_row.add_widget(MDRaisedButton(text="Check Selected", on_press=lambda x: self.check_all(selected_only=True)))
+        check_row.add_widget(MDRaisedButton(text="Speed Test", on_press=self.speed_test_selected))
+        self.btn_cancel_checks = MDFlatButton(text="Cancel", disabled=not (self.check_engine.running or self.speed_engine.running), on_press=self.cancel_checks)
+        check_row.add_widget(self.btn_cancel_checks)
+        proxy_list_layout.add_widget(check_row)
+        self.lbl_check_progress = MDLabel(text=self.check_progress_text, font_style="Caption", adaptive_height=True)
+        proxy_list_layout.add_widget(self.lbl_check_progress)
+        view_row = MDBoxLayout(adaptive_height=True, spacing="8dp")
+        self.list_search_input = MDTextField(hint_text="Search label, type or host", text=self.list_query)
+        self._search_trigger = Clock.create_trigger(self._on_list_search, 0.25)
+        self.list_search_input.bind(text=lambda *args: self._search_trigger())
+        self.btn_list_sort = MDFlatButton(text=f"Sort: {SORT_NAMES[self.list_sort]}", on_release=self.open_sort_menu)
+        self.btn_list_filter = MDFlatButton(text=f"Show: {self.list_status or 'All'}", on_release=self.open_filter_menu)
+        view_row.add_widget(self.list_search_input); view_row.add_widget(self.btn_list_sort); view_row.add_widget(self.btn_list_filter)
+        proxy_list_layout.add_widget(view_row)
+        self.lbl_list_count = MDLabel(font_style="Caption", adaptive_height=True)
+        proxy_list_layout.add_widget(self.lbl_list_count)
+        self.proxy_rv = RecycleView()
+        rv_layout = RecycleBoxLayout(orientation='vertical', default_size=(None, PROXY_ROW_HEIGHT), default_size_hint=(1, None), size_hint_y=None, spacing="8dp")
+        rv_layout.bind(minimum_height=rv_layout.setter('height'))
+        self.proxy_rv.add_widget(rv_layout)
+        self.proxy_rv.viewclass = ProxyDetailWidget  # forwarded to the layout manager, so set after adding it
+        proxy_list_layout.add_widget(self.proxy_rv); self.tab_proxy_list.add_widget(proxy_list_layout)
+        self.apply_list_view()
+
+    def _build_settings_tab(self):
+        settings_content = MDBoxLayout(orientation="vertical", spacing="15dp", padding="20dp", adaptive_height=True)
         dns_row = MDBoxLayout(adaptive_height=True, spacing="10dp"); dns_row.add_widget(MDLabel(text="DNS Protection", adaptive_height=True, halign="left"))
         self.dns_switch = MDCheckbox(active=self.dns_protection_on, size_hint_x=None, width="48dp"); self.dns_switch.bind(active=self.toggle_dns)
         dns_row.add_widget(self.dns_switch); settings_content.add_widget(dns_row)
         
         theme_row = MDBoxLayout(adaptive_height=True, spacing="10dp"); theme_row.add_widget(MDLabel(text="App Theme", adaptive_height=True, halign="left"))
-        self.theme_button = MDRaisedButton(text="Theme: Dark", on_press=self.open_theme_menu)
+        self.theme_button = MDRaisedButton(text=f"Theme: {MDApp.get_running_app().theme_cls.theme_style}", on_press=self.open_theme_menu)
         theme_row.add_widget(self.theme_button)
         settings_content.add_widget(theme_row)
 
@@ -346,55 +305,125 @@ class MainScreen(MDScreen):
         contact_row.add_widget(MDRaisedButton(text="Contact Developer", on_press=self.contact_developer))
         settings_content.add_widget(contact_row)
 
-        self.tab_settings.add_widget(settings_content); self.tab_panel.add_widget(self.tab_settings)
-        
-        # --- Log Tab ---
-        self.tab_log = Tab(title="Log")
-        log_layout = MDBoxLayout(orientation='vertical', padding="10dp")
-        log_scroll = MDScrollView()
+        check_row = MDBoxLayout(adaptive_height=True, spacing="10dp")
+        self.check_concurrency_input = MDTextField(hint_text="Concurrent checks", text=str(self.check_concurrency), input_filter="int")
+        self.check_deadline_input = MDTextField(hint_text="Check deadline (s, 0 = none)", text=str(self.check_deadline), input_filter="int")
+        self.check_concurrency_input.bind(text=self._on_check_settings_text); self.check_deadline_input.bind(text=self._on_check_settings_text)
+        check_row.add_widget(self.check_concurrency_input); check_row.add_widget(self.check_deadline_input)
+        settings_content.add_widget(check_row)
+
+        merge_row = MDBoxLayout(adaptive_height=True, spacing="10dp"); merge_row.add_widget(MDLabel(text="Duplicate proxies", adaptive_height=True, halign="left"))
+        self.merge_button = MDRaisedButton(text=f"Duplicates: {MERGE_POLICIES[self.merge_policy]}", on_press=self.open_merge_menu)
+        merge_row.add_widget(self.merge_button); settings_content.add_widget(merge_row)
+
+        hedge_row = MDBoxLayout(adaptive_height=True, spacing="10dp"); hedge_row.add_widget(MDLabel(text="Hedged Geo-IP requests", adaptive_height=True, halign="left"))
+        self.hedge_switch = MDCheckbox(active=self.hedged_geoip, size_hint_x=None, width="48dp"); self.hedge_switch.bind(active=self.toggle_hedged_geoip)
+        hedge_row.add_widget(self.hedge_switch); settings_content.add_widget(hedge_row)
+
+        monitor_row = MDBoxLayout(adaptive_height=True, spacing="10dp"); monitor_row.add_widget(MDLabel(text="Background health checks", adaptive_height=True, halign="left"))
+        monitor_switch = MDCheckbox(active=self.monitor_on, size_hint_x=None, width="48dp"); monitor_switch.bind(active=self.toggle_monitor)
+        monitor_row.add_widget(monitor_switch); settings_content.add_widget(monitor_row)
+
+        level_row = MDBoxLayout(adaptive_height=True, spacing="10dp"); level_row.add_widget(MDLabel(text="Log level", adaptive_height=True, halign="left"))
+        self.log_level_button = MDRaisedButton(text=f"Log: {LEVEL_NAMES[self.app_log.level]}", on_press=self.open_log_level_menu)
+        level_row.add_widget(self.log_level_button); settings_content.add_widget(level_row)
+
+        speed_row = MDBoxLayout(adaptive_height=True, spacing="10dp")
+        for key, hint in (("speed_max_mb", "Speed test size (MB)"), ("speed_max_seconds", "Speed test time cap (s)"), ("speed_budget_mbps", "Bandwidth budget (Mbps, 0 = none)")):
+            field = MDTextField(hint_text=hint, text=str(self.speed_settings[key]), input_filter="float")
+            field.bind(text=lambda inst, value, key=key: self.set_speed_setting(key, value))
+            speed_row.add_widget(field)
+        settings_content.add_widget(speed_row)
+
+        order_row = MDBoxLayout(adaptive_height=True, spacing="10dp"); order_row.add_widget(MDLabel(text="Order outbounds by", adaptive_height=True, halign="left"))
+        order = self.gen_settings["gen_order"] if self.gen_settings["gen_order"] in GEN_ORDERS else GENERATION_SETTINGS["gen_order"]
+        self.order_button = MDRaisedButton(text=f"Order: {GEN_ORDERS[order]}", on_press=self.open_order_menu)
+        order_row.add_widget(self.order_button); settings_content.add_widget(order_row)
+
+        unreachable_row = MDBoxLayout(adaptive_height=True, spacing="10dp"); unreachable_row.add_widget(MDLabel(text="Unreachable proxies", adaptive_height=True, halign="left"))
+        self.unreachable_button = MDRaisedButton(text=f"Unreachable: {UNREACHABLE_POLICIES[generation_options(self.gen_settings)['unreachable']]}", on_press=self.open_unreachable_menu)
+        unreachable_row.add_widget(self.unreachable_button); settings_content.add_widget(unreachable_row)
+
+        urltest_row = MDBoxLayout(adaptive_height=True, spacing="10dp"); urltest_row.add_widget(MDLabel(text="Auto-select fastest (urltest)", adaptive_height=True, halign="left"))
+        urltest_switch = MDCheckbox(active=bool(self.gen_settings["urltest_on"]), size_hint_x=None, width="48dp")
+        urltest_switch.bind(active=lambda inst, value: self.set_generation_setting("urltest_on", value))
+        urltest_row.add_widget(urltest_switch); settings_content.add_widget(urltest_row)
+        urltest_fields = MDBoxLayout(adaptive_height=True, spacing="10dp")
+        for key, hint in (("urltest_url", "Test URL"), ("urltest_interval", "Interval, e.g. 3m"), ("urltest_tolerance", "Tolerance (ms)")):
+            field = MDTextField(hint_text=hint, text=str(self.gen_settings[key] or ""), input_filter="int" if key == "urltest_tolerance" else None)
+            field.bind(text=lambda inst, value, key=key: self.set_generation_setting(key, int(value) if key == "urltest_tolerance" and value else value))
+            urltest_fields.add_widget(field)
+        settings_content.add_widget(urltest_fields)
+
+        settings_scroll = MDScrollView(); settings_scroll.add_widget(settings_content)
+        self.tab_settings.add_widget(settings_scroll)
+
+    def _build_log_tab(self):
+        log_layout = MDBoxLayout(orientation='vertical', padding="10dp", spacing="10dp")
+        report_row = MDBoxLayout(adaptive_height=True, spacing="8dp")
+        report_row.add_widget(MDRaisedButton(text="Memory Report", on_press=lambda x: self.log_message(memory_summary(memory_report(self.added_proxies)))))
+        report_row.add_widget(MDRaisedButton(text="Check Metrics", on_press=lambda x: self.log_message(METRICS.summary())))
+        report_row.add_widget(MDFlatButton(text="Export Metrics", on_press=self.export_metrics))
+        log_layout.add_widget(report_row)
+        self.log_scroll = MDScrollView()
         self.log_output = MDTextField(multiline=True, readonly=True, hint_text="Application logs will appear here...", size_hint_y=None)
         self.log_output.bind(minimum_height=self.log_output.setter('height'))
-        log_scroll.add_widget(self.log_output)
-        log_layout.add_widget(log_scroll)
+        self.log_scroll.add_widget(self.log_output)
+        log_layout.add_widget(self.log_scroll)
         self.tab_log.add_widget(log_layout)
-        self.tab_panel.add_widget(self.tab_log)
+        self._refresh_log_view(); Clock.schedule_interval(self._refresh_log_view, LOG_VIEW_INTERVAL)
 
-        root_layout.add_widget(self.tab_panel)
-        self.action_bar = MDBoxLayout(adaptive_height=True, spacing="8dp", padding=("10dp", "10dp", "10dp", "20dp"))
-        self.action_bar.add_widget(MDRaisedButton(text="Generate", on_press=self.generate_config, md_bg_color=self.theme_cls.primary_color)); self.action_bar.add_widget(MDRaisedButton(text="View", on_press=self.view_config)); self.action_bar.add_widget(MDRaisedButton(text="Copy", on_press=self.copy_config)); self.action_bar.add_widget(MDRaisedButton(text="Save", on_press=self.save_config))
-        root_layout.add_widget(self.action_bar); self.add_widget(root_layout)
-        Clock.schedule_once(self.post_build_init)
+    def export_metrics(self, instance=None):
+        """Writes the check metrics next to the settings as JSON (with per-proxy histograms) and Prometheus text."""
+        data_dir = MDApp.get_running_app().user_data_dir; paths = [os.path.join(data_dir, f"check_metrics.{ext}") for ext in ("json", "prom")]
+        try:
+            for path in paths: METRICS.write(path)
+        except OSError as e: self.log_message(f"Could not export metrics: {e}", ERROR); return
+        self.log_message(f"Exported metrics for {METRICS.checks} checks to {paths[0]} and {paths[1]}.")
+
+    def _refresh_log_view(self, *args):
+        """Shows the ring's tail while the Log tab is open. The text is replaced whole, so its size stays bounded."""
+        if self.app_log.seq == self._log_view_seq or self.tab_panel.get_current_tab() is not self.tab_log: return
+        self._log_view_seq = self.app_log.seq
+        self.log_output.text = "".join(self.app_log.tail())
+        self.log_scroll.scroll_y = 0
+
+    def _on_check_settings_text(self, instance, value):
+        try: self.check_concurrency = max(1, int(self.check_concurrency_input.text or DEFAULT_CHECK_CONCURRENCY))
+        except ValueError: self.check_concurrency = DEFAULT_CHECK_CONCURRENCY
+        try: self.check_deadline = int(self.check_deadline_input.text or 0)
+        except ValueError: self.check_deadline = 0
+        MDApp.get_running_app().save_state()
 
-    def log_message(self, message):
-        """Appends a timestamped message to the log view and prints to console."""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] {message}\n"
-        print(log_entry.strip())
-        self.log_output.text += log_entry
-        self.log_output.cursor = (0, len(self.log_output.text))
-        
-        if self.log_file_path:
-            try:
-                with open(self.log_file_path, "a", encoding="utf-8") as f:
-                    f.write(log_entry)
-            except Exception as e:
-                print(f"CRITICAL: Failed to write to log file: {e}")
+    def log_message(self, message, level=INFO):
+        """Adds a timestamped message to the app log (Log tab, console and log file). Safe to call from any thread."""
+        self.app_log.log(message, level)
 
     def post_build_init(self, dt):
         self.set_proxy_type("WireGuard")
         app = MDApp.get_running_app()
-        self.log_file_path = os.path.join(app.user_data_dir, "singbox_app_log.txt")
+        self.log_file_path = os.path.join(app.user_data_dir, "singbox_app_log.txt"); self.app_log.open(self.log_file_path)
         self.log_message("Application initialized.")
         self.log_message(f"Logs are being saved to: {self.log_file_path}")
 
-    def open_proxy_menu(self, instance): self.proxy_menu.open()
+    def open_proxy_menu(self, instance):
+        if self.proxy_menu is None:
+            from kivymd.uix.menu import MDDropdownMenu
+            proxy_types = ["WireGuard", "SOCKS5", "VMess", "VLESS", "Shadowsocks", "HTTP"]
+            menu_items = [{"text": f"{i}", "viewclass": "OneLineIconListItem", "on_release": lambda x=f"{i}": self.set_proxy_type(x)} for i in proxy_types]
+            self.proxy_menu = MDDropdownMenu(caller=self.proxy_type_button, items=menu_items, width_mult=4)
+        self.proxy_menu.open()
+
     def set_proxy_type(self, text_item):
-        self.proxy_type_button.text = text_item; self.proxy_menu.dismiss(); ptype = text_item.lower().replace(" ", "")
+        self.proxy_type_button.text = text_item
+        if self.proxy_menu: self.proxy_menu.dismiss()
+        ptype = text_item.lower().replace(" ", "")
         self.add_proxy_form_container.clear_widgets()
         if ptype == 'wireguard': self.add_proxy_form_container.add_widget(self.wg_grid)
         elif ptype in ('socks5', 'http'): self.add_proxy_form_container.add_widget(self.proxy_grid)
 
     def open_theme_menu(self, instance):
+        from kivymd.uix.menu import MDDropdownMenu
         themes = ["Light", "Dark", "Maroon"]
         menu_items = [{"text": theme, "viewclass": "OneLineListItem", "on_release": lambda x=theme: self.change_theme(x)} for theme in themes]
         # [MODIFIED] Set max_height on dropdown to prevent it being cut off
@@ -415,10 +444,74 @@ class MainScreen(MDScreen):
             app.theme_cls.theme_style = theme_style
             app.theme_cls.primary_palette = "BlueGray"
         
-        self.theme_button.text = f"Theme: {theme_style}"
+        if self.theme_button: self.theme_button.text = f"Theme: {theme_style}"
         self.log_message(f"Theme changed to {theme_style}.")
+        app.save_state()
+
+    def open_log_level_menu(self, instance):
+        from kivymd.uix.menu import MDDropdownMenu
+        menu_items = [{"text": name, "viewclass": "OneLineListItem", "on_release": lambda x=level: self.set_log_level(x)} for level, name in LEVEL_NAMES.items()]
+        self.log_level_menu = MDDropdownMenu(caller=instance, items=menu_items, width_mult=4)
+        self.log_level_menu.open()
+
+    def set_log_level(self, level):
+        if getattr(self, "log_level_menu", None): self.log_level_menu.dismiss()
+        self.app_log.level = level if level in LEVEL_NAMES else INFO
+        if self.log_level_button: self.log_level_button.text = f"Log: {LEVEL_NAMES[self.app_log.level]}"
+        self.log_message(f"Log level set to {LEVEL_NAMES[self.app_log.level]}.", WARNING if self.app_log.level > INFO else INFO)
+        MDApp.get_running_app().save_state()
+
+    def set_generation_setting(self, key, value):
+        if self.gen_settings.get(key) == value: return
+        self.gen_settings[key] = value
+        MDApp.get_running_app().save_state()
+
+    def open_order_menu(self, instance):
+        from kivymd.uix.menu import MDDropdownMenu
+        menu_items = [{"text": text, "viewclass": "OneLineListItem", "on_release": lambda x=order: self.set_gen_order(x)} for order, text in GEN_ORDERS.items()]
+        self.order_menu = MDDropdownMenu(caller=instance, items=menu_items, width_mult=4)
+        self.order_menu.open()
+
+    def set_gen_order(self, order):
+        if getattr(self, "order_menu", None): self.order_menu.dismiss()
+        self.set_generation_setting("gen_order", order)
+        if self.order_button: self.order_button.text = f"Order: {GEN_ORDERS[order]}"
+        self.log_message(f"Generated outbounds ordered by: {GEN_ORDERS[order]}.")
+
+    def set_speed_setting(self, key, value):
+        try: value = max(0.0, float(value)) if value else THROUGHPUT_SETTINGS[key]
+        except ValueError: return
+        if self.speed_settings.get(key) == value: return
+        self.speed_settings[key] = value
+        MDApp.get_running_app().save_state()
+
+    def open_unreachable_menu(self, instance):
+        from kivymd.uix.menu import MDDropdownMenu
+        menu_items = [{"text": text, "viewclass": "OneLineListItem", "on_release": lambda x=policy: self.set_unreachable_policy(x)} for policy, text in UNREACHABLE_POLICIES.items()]
+        self.unreachable_menu = MDDropdownMenu(caller=instance, items=menu_items, width_mult=4)
+        self.unreachable_menu.open()
+
+    def set_unreachable_policy(self, policy):
+        if getattr(self, "unreachable_menu", None): self.unreachable_menu.dismiss()
+        self.set_generation_setting("gen_unreachable", policy)
+        if self.unreachable_button: self.unreachable_button.text = f"Unreachable: {UNREACHABLE_POLICIES[policy]}"
+        self.log_message(f"Unreachable proxies in generated configs: {UNREACHABLE_POLICIES[policy]}.")
+
+    def open_merge_menu(self, instance):
+        from kivymd.uix.menu import MDDropdownMenu
+        menu_items = [{"text": text, "viewclass": "OneLineListItem", "on_release": lambda x=policy: self.set_merge_policy(x)} for policy, text in MERGE_POLICIES.items()]
+        self.merge_menu = MDDropdownMenu(caller=instance, items=menu_items, width_mult=4)
+        self.merge_menu.open()
+
+    def set_merge_policy(self, policy):
+        if getattr(self, "merge_menu", None): self.merge_menu.dismiss()
+        self.merge_policy = policy if policy in MERGE_POLICIES else MERGE_SKIP
+        if self.merge_button: self.merge_button.text = f"Duplicates: {MERGE_POLICIES[self.merge_policy]}"
+        self.log_message(f"Duplicate policy set to {MERGE_POLICIES[self.merge_policy]}.")
+        MDApp.get_running_app().save_state()
 
     def contact_developer(self, instance):
+        import webbrowser
         webbrowser.open("https://t.me/sir10ma")
         self.log_message("Opened developer contact link.")
 
@@ -426,6 +519,7 @@ class MainScreen(MDScreen):
         try:
             if self.dialog: self.dialog.dismiss()
         except Exception: pass
+        from kivymd.uix.dialog import MDDialog
         self.dialog = MDDialog(title=title, text=message, buttons=[MDFlatButton(text="OK", on_release=lambda x: self.dialog.dismiss())])
         self.dialog.open()
 
@@ -433,6 +527,7 @@ class MainScreen(MDScreen):
         try:
             if self.dialog: self.dialog.dismiss()
         except Exception: pass
+        from kivymd.uix.dialog import MDDialog
         self.dialog = MDDialog(title=title, type="custom", content_cls=content_cls, buttons=buttons or [MDFlatButton(text="OK", on_release=lambda x: self.dialog.dismiss())])
         self.dialog.open()
         
@@ -443,10 +538,11 @@ class MainScreen(MDScreen):
                     self.tab_panel.switch_tab(tab)
                     return
         except Exception as e:
-            self.log_message(f"Error switching tab: {e}")
+            self.log_message(f"Error switching tab: {e}", ERROR)
 
     def on_tab_switch(self, instance_tabs, instance_tab, instance_tab_label, tab_text):
-        """Handles visibility of the action bar based on the current tab."""
+        """Builds the tab on first visit and handles visibility of the action bar based on the current tab."""
+        self.ensure_tab(tab_text)
         if tab_text in ["Settings", "Log"]:
             self.action_bar.height = 0
             self.action_bar.opacity = 0
@@ -465,8 +561,11 @@ class MainScreen(MDScreen):
         
         if detected_type in ["vmess", "vless", "shadowsocks"]:
             self.log_message(f"Detected {detected_type} link.")
-            if self.add_proxy_from_string(txt):
-                self.show_dialog("Success", f"Added '{self.added_proxies[-1].label}' to the list.")
+            proxy, _ = proxy_from_link(txt)
+            if proxy:
+                result, kept = self.insert_proxy(proxy)
+                if result == "skipped": self.show_dialog("Duplicate", f"'{kept.label}' is already in the list.")
+                else: self.show_dialog("Success", f"{result.capitalize()} '{kept.label}' in the list.")
                 self.refresh_added_list(); self.switch_to_tab("Proxy List"); self.paste_input.text = ""
             else: self.show_dialog("Error", "Could not parse the proxy link.")
 
@@ -485,15 +584,8 @@ class MainScreen(MDScreen):
 
         elif detected_type in ("socks5", "http"):
             self.log_message(f"Detected {detected_type} string.")
-            parsed_data = None
-            if detected_type == "socks5":
-                parsed_data = parse_socks_string(txt)
-            elif detected_type == "http":
-                try:
-                    u = urlparse(txt if "://" in txt else f"{detected_type}://" + txt)
-                    parsed_data = {"server": u.hostname or "", "server_port": int(u.port or 0), "username": u.username or "", "password": u.password or ""}
-                except (ValueError, TypeError):
-                    parsed_data = None
+            try: parsed_data = parse_link(txt).fields
+            except LinkParseError: parsed_data = None
 
             if parsed_data and parsed_data.get("server"):
                 self.set_proxy_type(detected_type.upper())
@@ -544,22 +636,56 @@ class MainScreen(MDScreen):
         self.show_dialog_with_content("Batch Import", batch_input, [MDFlatButton(text="CANCEL", on_release=lambda x: self.dialog.dismiss()), MDFlatButton(text="IMPORT", on_release=lambda x: self.import_links(batch_input.text))])
 
     def import_links(self, text):
-        self.dialog.dismiss(); links = text.strip().splitlines(); added_count = sum(1 for link in links if self.add_proxy_from_string(link))
-        self.refresh_added_list(); self.show_dialog("Success", f"Added {added_count} proxies.")
-        self.log_message(f"Batch imported {added_count} proxies.")
+        from kivymd.uix.progressbar import MDProgressBar
+        self.dialog.dismiss()
+        content = MDBoxLayout(orientation="vertical", adaptive_height=True, spacing="10dp")
+        self.lbl_import_progress = MDLabel(text="Parsing links...", adaptive_height=True)
+        self.import_progress_bar = MDProgressBar(value=0, max=100, size_hint_y=None, height="4dp")
+        content.add_widget(self.lbl_import_progress); content.add_widget(self.import_progress_bar)
+        self._import_error_details = 0; self._import_duplicates = 0
+        self.import_job = ImportJob(text, on_batch=self._on_import_batch, on_finished=self._on_import_finished)
+        self.show_dialog_with_content("Importing", content, [MDFlatButton(text="CANCEL", on_release=lambda x: self.import_job.cancel())])
+        self.import_job.start()
+
+    def _on_import_batch(self, proxies, errors, fraction):
+        job = self.import_job
+        def apply(dt):
+            for p in proxies:
+                result, _ = self.insert_proxy(p)
+                if result != "added": self._import_duplicates += 1
+            if proxies: self.refresh_added_list()
+            for line_no, reason in errors:
+                self._import_error_details += 1
+                if self._import_error_details <= IMPORT_MAX_ERROR_DETAILS: self.log_message(f"-> Import line {line_no}: {reason}", WARNING)
+            self.import_progress_bar.value = fraction * 100
+            self.lbl_import_progress.text = f"Imported {job.added} proxies, {job.failed} failed ({fraction:.0%})"
+            job.batch_done()
+        Clock.schedule_once(apply)
+
+    def _on_import_finished(self, summary):
+        def finish(dt):
+            if self.dialog: self.dialog.dismiss()
+            hidden = self._import_error_details - IMPORT_MAX_ERROR_DETAILS
+            if hidden > 0: self.log_message(f"-> ... {hidden} more import errors not shown.")
+            state = "cancelled" if summary["cancelled"] else "finished"
+            added = summary['added'] - self._import_duplicates
+            self.log_message(f"Batch import {state}: {added} added, {self._import_duplicates} duplicates ({MERGE_POLICIES[self.merge_policy]}), {summary['failed']} failed, {summary['blank']} blank lines in {summary['elapsed']:.1f}s.")
+            MDApp.get_running_app().save_state()
+            self.show_dialog("Cancelled" if summary["cancelled"] else "Success", f"Added {added} proxies ({self._import_duplicates} duplicates).")
+        Clock.schedule_once(finish)
+
+    def insert_proxy(self, proxy: AddedProxy, policy=None):
+        """Adds proxy, or merges it into an identical one. Returns (result, kept_proxy), see boxconfig.links.insert_proxy."""
+        result, kept = insert_proxy(self.added_proxies, self.proxy_index, proxy, policy or self.merge_policy)
+        if result != "skipped": MDApp.get_running_app().state.proxy_changed(kept)
+        return result, kept
 
     def add_proxy_from_string(self, text: str) -> bool:
-        s = text.strip();
-        if not s: return False
-        ptype = detect_proxy_type(s)
-        if ptype not in ["unknown", "wireguard", "socks5", "http"]:
-            decoded = _decode_vmess(s) or _decode_vless(s) or _decode_shadowsocks(s) or {}
-            if not decoded: return False
-            label = f"{ptype.upper()} {decoded.get('server') or '(Pasted)'}"
-            self.added_proxies.append(AddedProxy(ptype=ptype, label=label, data={}, raw=s))
-            self.log_message(f"Added proxy from string: {label}")
-            return True
-        return False
+        proxy, _ = proxy_from_link(text)
+        if not proxy: return False
+        result, kept = self.insert_proxy(proxy)
+        self.log_message(f"{result.capitalize()} proxy from string: {kept.label}")
+        return result != "skipped"
         
     def clear_form_inputs(self):
         for field in [self.wg_server, self.wg_port, self.wg_private_key, self.wg_local_address, self.wg_peer_public_key]:
@@ -568,25 +694,89 @@ class MainScreen(MDScreen):
             field.text = ""
 
     def add_current_proxy(self, instance=None):
-        ptype = self.proxy_type_button.text.lower().replace(" ", ""); proxy_added = False; label = ""
+        ptype = self.proxy_type_button.text.lower().replace(" ", ""); proxy_added = None; label = ""
         if ptype == "wireguard":
             if not (self.wg_private_key.text.strip() and self.wg_server.text.strip()): self.show_dialog("Error", "Provide WG PrivateKey and Host."); return
             data = {"private_key": self.wg_private_key.text.strip(), "server": self.wg_server.text.strip(), "server_port": int(self.wg_port.text.strip() or 51820), "peer_public_key": self.wg_peer_public_key.text.strip(), "local_address": self.wg_local_address.text.strip()}
-            label = f"WG {data['server']}:{data['server_port']}"; self.added_proxies.append(AddedProxy(ptype="wireguard", label=label, data=data)); proxy_added = True
+            label = f"WG {data['server']}:{data['server_port']}"; proxy_added = AddedProxy(ptype="wireguard", label=label, data=data)
         elif ptype in ("socks5", "http"):
             if not (self.proxy_host.text.strip() and self.proxy_port.text.strip()): self.show_dialog("Error", "Enter host and port."); return
             data = {"server": self.proxy_host.text.strip(), "server_port": int(self.proxy_port.text.strip() or 0), "username": self.proxy_user.text.strip(), "password": self.proxy_pass.text.strip()}
-            label = f"{ptype.upper()} {data['server']}:{data['server_port']}"; self.added_proxies.append(AddedProxy(ptype=ptype, label=label, data=data)); proxy_added = True
+            label = f"{ptype.upper()} {data['server']}:{data['server_port']}"; proxy_added = AddedProxy(ptype=ptype, label=label, data=data)
         else: self.show_dialog("Error", f"Cannot add '{ptype}' from form. Please use the paste buttons."); return
         if proxy_added: 
-            self.log_message(f"Added proxy from form: {label}")
-            self.refresh_added_list(); self.show_dialog("Added", f"'{label}' added to list.")
+            result, kept = self.insert_proxy(proxy_added)
+            if result == "skipped":
+                self.log_message(f"Skipped duplicate proxy from form: {label}")
+                self.show_dialog("Duplicate", f"'{kept.label}' is already in the list."); return
+            self.log_message(f"{result.capitalize()} proxy from form: {label}")
+            self.refresh_added_list(); self.show_dialog(result.capitalize(), f"'{label}' {result} in list.")
             self.clear_form_inputs()
 
     def refresh_added_list(self):
-        self.proxies_list_container.clear_widgets()
-        for p in self.added_proxies: self.proxies_list_container.add_widget(ProxyDetailWidget(proxy_obj=p))
-        MDApp.get_running_app().save_state()
+        self.apply_list_view(); self.update_monitor_entries()
+
+    def update_monitor_entries(self):
+        """
+        Gives the running monitor a fresh snapshot of the list; it never reads added_proxies itself. The
+        snapshot decodes every proxy, so it is built MONITOR_ENTRIES_PER_FRAME at a time.
+        """
+        if not self.monitor.running: return
+        if self._entries_job is not None: self._entries_job.cancel()
+        proxies = list(self.added_proxies); entries = []
+        def build(dt):
+            entries.extend(monitor_entries(proxies[len(entries):len(entries) + MONITOR_ENTRIES_PER_FRAME]))
+            if len(entries) < len(proxies): return
+            self._entries_job = None; self._monitor_entries = tuple(entries); self.monitor.refresh()
+            return False
+        self._entries_job = Clock.schedule_interval(build, 0)
+
+    # --- Proxy list view (search, filter, sort) ---
+    def apply_list_view(self, *args):
+        """Recomputes the visible rows from the data model. Only row data is replaced; no widgets are rebuilt."""
+        self.visible_proxies = select_proxies(self.added_proxies, self.list_query, self.list_status, self.list_sort)
+        self._row_of = {id(p): i for i, p in enumerate(self.visible_proxies)}
+        if self.proxy_rv is None: return
+        heights = self._row_heights
+        self.proxy_rv.data = [{"proxy": p, "height": heights[id(p)]} if id(p) in heights else {"proxy": p} for p in self.visible_proxies]
+        self.lbl_list_count.text = f"Showing {len(self.visible_proxies)} of {len(self.added_proxies)} proxies"
+
+    def refresh_proxy(self, proxy: AddedProxy):
+        """Re-renders one proxy's row in place, if it is currently visible. Row data holds the proxy itself, so it is left alone (replacing it relays out the whole list)."""
+        row = self._row_of.get(id(proxy))
+        if row is None or self.proxy_rv is None: return
+        view = self.proxy_rv.view_adapter.get_visible_view(row)
+        if view is not None: view.update_ui()
+
+    def row_resized(self, proxy: AddedProxy, index, height):
+        """Records a row's measured height in its data entry, so the layout reserves that much for it."""
+        self._row_heights[id(proxy)] = height
+        rv = self.proxy_rv
+        if rv is None or index is None or index >= len(rv.data) or rv.data[index]["proxy"] is not proxy: return
+        rv.data[index]["height"] = height; rv.refresh_from_data(modified=slice(index, index + 1))
+
+    def _on_list_search(self, *args):
+        self.list_query = self.list_search_input.text; self.apply_list_view()
+
+    def open_sort_menu(self, instance):
+        from kivymd.uix.menu import MDDropdownMenu
+        menu_items = [{"text": text, "viewclass": "OneLineListItem", "on_release": lambda x=key: self.set_list_sort(x)} for key, text in SORT_NAMES.items()]
+        self.list_menu = MDDropdownMenu(caller=instance, items=menu_items, width_mult=3)
+        self.list_menu.open()
+
+    def set_list_sort(self, sort):
+        self.list_menu.dismiss(); self.list_sort = sort
+        self.btn_list_sort.text = f"Sort: {SORT_NAMES[sort]}"; self.apply_list_view()
+
+    def open_filter_menu(self, instance):
+        from kivymd.uix.menu import MDDropdownMenu
+        menu_items = [{"text": status or "All", "viewclass": "OneLineListItem", "on_release": lambda x=status: self.set_list_filter(x)} for status in (None,) + STATUS_FILTERS]
+        self.list_menu = MDDropdownMenu(caller=instance, items=menu_items, width_mult=3)
+        self.list_menu.open()
+
+    def set_list_filter(self, status):
+        self.list_menu.dismiss(); self.list_status = status
+        self.btn_list_filter.text = f"Show: {status or 'All'}"; self.apply_list_view()
         
     def confirm_delete_proxy(self, proxy_to_remove):
         self.show_dialog_with_content(
@@ -601,194 +791,185 @@ class MainScreen(MDScreen):
     def remove_proxy(self, proxy_to_remove: AddedProxy): 
         self.dialog.dismiss()
         self.log_message(f"Removed proxy: {proxy_to_remove.label}")
-        self.added_proxies.remove(proxy_to_remove); self.refresh_added_list()
+        self.added_proxies.remove(proxy_to_remove); self.proxy_index.discard(proxy_to_remove); self._row_heights.pop(id(proxy_to_remove), None)
+        MDApp.get_running_app().state.proxy_removed(proxy_to_remove); self.refresh_added_list()
 
     def check_proxy(self, proxy: AddedProxy):
-        proxy.status = "Checking..."; proxy.latency = "..."; proxy.info = "..."; 
-        if proxy.ui_widget:
-            Clock.schedule_once(lambda dt: proxy.ui_widget.update_ui())
-        threading.Thread(target=self._worker_check_proxy, args=(proxy,), daemon=True).start()
-
-    def _worker_check_proxy(self, proxy: AddedProxy):
-        app = MDApp.get_running_app()
-        ptype = proxy.ptype.lower()
-        d = proxy.data
-        host, port, user, pw = None, None, None, None
-        
-        Clock.schedule_once(lambda dt: app.root.log_message(f"Checking proxy: {proxy.label} ({proxy.ptype})"))
+        self.queue_checks([proxy])
+
+    def check_all(self, selected_only=False):
+        proxies = [p for p in self.added_proxies if p.selected or not selected_only]
+        if not proxies: self.show_dialog("Check", "No proxies to check."); return
+        queued = self.queue_checks(proxies)
+        self.log_message(f"Queued {queued} proxies for checking ({self.check_engine.concurrency} concurrent).")
+
+    def queue_checks(self, proxies) -> int:
+        self.ensure_network()
+        self.check_engine.concurrency = self.check_concurrency; deadline = self.check_deadline
+        proxies = [p for p in proxies if p.status not in BUSY_STATUSES]
+        for proxy in proxies:
+            previous = proxy.status; proxy.status = "Queued"
+            # Mark first, then look: the monitor claims a proxy before re-reading its status, so one of the two backs off.
+            if self.monitor.checking(proxy.uid): proxy.status = previous; continue
+            proxy.decoded  # decoded here: check workers only read proxies
+            self.refresh_proxy(proxy)
+        proxies = [p for p in proxies if p.status == "Queued"]
+        queued = self.check_engine.submit(proxies, deadline=deadline or None)
+        if queued: self._start_ui_drain()
+        if self.btn_cancel_checks: self.btn_cancel_checks.disabled = False
+        self._update_check_progress(self.check_engine.progress())
+        return queued
+
+    def cancel_checks(self, instance=None):
+        dropped = self.check_engine.cancel() + self.speed_engine.cancel()
+        if self.net: self.net.PROBER.cancel_all()
+        self.log_message(f"Cancelled {len(dropped)} pending checks.")
+
+    def _on_checks_skipped(self, proxies):
+        for p in proxies: self.ui_updates.post(p, {"status": "Idle"})
+
+    def _on_check_progress(self, progress):
+        self._progress_dirty = True  # picked up by the next frame's drain
+
+    # --- Worker results ---
+    # Workers never touch proxies or widgets: they post field deltas to ui_updates, which a
+    # per-frame Clock callback applies on the UI thread while checks are running.
+    def _start_ui_drain(self):
+        if self._ui_drain is None: self._ui_drain = Clock.schedule_interval(self._drain_ui_updates, 0)
+
+    def _drain_ui_updates(self, dt, limit=UI_UPDATES_PER_FRAME):
+        state = MDApp.get_running_app().state
+        for proxy, fields in self.ui_updates.drain(limit):
+            for k, v in fields.items(): setattr(proxy, k, v)
+            # A check's opening "Checking..." status and "..." info are never saved, so a sweep journals each proxy once
+            # and a kill mid-sweep leaves its last finished result on disk.
+            busy = fields.get("status") in BUSY_STATUSES
+            saved = [k for k in fields if not (busy and k in PLACEHOLDER_FIELDS)]
+            if saved: state.proxy_changed(proxy, *saved)
+            self.refresh_proxy(proxy)
+        if self._progress_dirty:
+            self._progress_dirty = False; self._update_check_progress(self.check_engine.progress())
+        progress = self.check_engine.progress()
+        if not self.ui_updates and not progress["running"] and not progress["queued"] and not self.speed_engine.running:
+            self._ui_drain = None
+            return False
+
+    def _update_check_progress(self, progress):
+        self.check_progress_text = f"Checked {progress['done']}/{progress['total']} - {progress['ok']} reachable, {progress['failed']} failed, {progress['running']} running - {progress['rate']:.1f} checks/sec"
+        if self.lbl_check_progress: self.lbl_check_progress.text = self.check_progress_text
+
+    def _on_checks_finished(self, progress):
+        def finish(dt):
+            self._drain_ui_updates(dt, limit=None)
+            if self.btn_cancel_checks: self.btn_cancel_checks.disabled = self.speed_engine.running
+            # Rows update in place during a sweep; re-sort/filter once so rows do not jump while checks run.
+            if self.list_sort != "added" or self.list_status: self.apply_list_view()
+            self._update_check_progress(progress)
+            if progress["total"] > 1:
+                skipped = f", {progress['skipped']} skipped" if progress["skipped"] else ""
+                self.log_message(f"Check sweep finished: {progress['done']} checked ({progress['ok']} reachable, {progress['failed']} failed{skipped}) in {progress['elapsed']:.1f}s - {progress['rate']:.1f} checks/sec.")
+                self.log_message(self.net.DNS_CACHE.summary())
+                self.log_message(self.net.GEOIP_CACHE.summary())
+                self.log_message(METRICS.summary())
+            self.net.GEOIP_CACHE.save()
+        Clock.schedule_once(finish)
+
+    # --- Speed tests ---
+    # A second CheckEngine with THROUGHPUT_CONCURRENCY workers; the tests share the global BUDGET and
+    # post their fields to ui_updates like checks do. Only SOCKS5/HTTP proxies can be tested in-app.
+    def speed_test_selected(self, instance=None):
+        proxies = [p for p in self.added_proxies if p.selected and p.ptype.lower() in THROUGHPUT_TYPES]
+        if not proxies: self.show_dialog("Speed Test", "Select SOCKS5 or HTTP proxies to speed test."); return
+        self.ensure_network()
+        for p in proxies: p.decoded  # decoded here: speed test workers only read proxies
+        options = throughput_options(self.speed_settings); BUDGET.configure(options["budget_mbps"])
+        queued = self.speed_engine.submit(proxies)
+        if queued: self._start_ui_drain()
+        if self.btn_cancel_checks: self.btn_cancel_checks.disabled = False
+        budget = f"{options['budget_mbps']:g} Mbps budget" if options["budget_mbps"] else "no bandwidth budget"
+        self.log_message(f"Queued {queued} proxies for a speed test ({self.speed_engine.concurrency} concurrent, up to "
+                         f"{options['max_bytes'] / 1e6:g} MB or {options['max_seconds']:g}s each, {budget}).")
+
+    def _worker_speed_test(self, proxy: AddedProxy) -> bool:
+        from boxconfig.throughput import throughput_test
+        return throughput_test(proxy, log=self.app_log.log, on_update=lambda fields: self.ui_updates.post(proxy, fields), **throughput_options(self.speed_settings))
+
+    def _on_speed_tests_finished(self, progress):
+        def finish(dt):
+            self._drain_ui_updates(dt, limit=None)
+            if self.btn_cancel_checks: self.btn_cancel_checks.disabled = self.check_engine.running
+            if self.list_sort == "speed": self.apply_list_view()
+            tested = [p for p in self.added_proxies if p.throughput_mbps is not None]
+            best = max(tested, key=lambda p: p.throughput_mbps, default=None)
+            fastest = f", fastest {best.label} at {best.throughput_mbps:.1f} Mbps" if best else ""
+            self.log_message(f"Speed test finished: {progress['ok']} measured, {progress['failed']} failed in {progress['elapsed']:.1f}s{fastest}.")
+        Clock.schedule_once(finish)
+
+    # --- Background health monitor ---
+    # The monitor re-checks proxies through _worker_check_proxy on its own threads; its results land
+    # in ui_updates like a sweep's, and a slow Clock tick starts the drain when there are any.
+    def start_monitor(self):
+        if not self.monitor_on or self.monitor.running: return
+        self.ensure_network(); self.monitor.start(); self.update_monitor_entries()
+        if self._monitor_tick is None: self._monitor_tick = Clock.schedule_interval(self._on_monitor_tick, MONITOR_UI_INTERVAL)
+        self.log_message("Background health checks started.")
+
+    def stop_monitor(self):
+        if not self.monitor.running: return
+        self.monitor.stop()
+        if self._monitor_tick is not None: self._monitor_tick.cancel(); self._monitor_tick = None
+        if self._entries_job is not None: self._entries_job.cancel(); self._entries_job = None
+        self.log_message(self.monitor.summary())
+
+    def _on_monitor_tick(self, dt):
+        if self.ui_updates: self._start_ui_drain()
+        if time.monotonic() - self._ages_shown_at >= AGE_REFRESH_INTERVAL: self.refresh_visible_rows()
+
+    def refresh_visible_rows(self):
+        """Re-renders the rows on screen, e.g. so "checked ... ago" keeps up with the clock."""
+        self._ages_shown_at = time.monotonic()
+        if self.proxy_rv is None: return
+        for view in list(self.proxy_rv.view_adapter.views.values()): view.update_ui()
+
+    def toggle_monitor(self, instance, value):
+        self.monitor_on = value
+        if value: self.start_monitor()
+        else: self.stop_monitor()
+        MDApp.get_running_app().save_state()
 
-        try:
-            if ptype in ('socks5', 'http', 'wireguard'):
-                host, port, user, pw = d.get('server'), d.get('server_port'), d.get('username'), d.get('password')
-            elif ptype in ('vmess', 'vless', 'shadowsocks'):
-                decoded = {
-                    'vmess': _decode_vmess, 'vless': _decode_vless, 'shadowsocks': _decode_shadowsocks
-                }[ptype](proxy.raw)
-                host, port = decoded.get('server'), decoded.get('server_port')
-
-            if not host or not port:
-                raise Exception("Invalid Host/Port in config")
-
-            if ptype == 'wireguard':
-                if not DEPENDENCIES_AVAILABLE:
-                    raise Exception("requests module needed for WG check")
-                
-                Clock.schedule_once(lambda dt: app.root.log_message(f"-> Resolving endpoint {host} for WireGuard..."))
-                try:
-                    start_time = time.time()
-                    resolved_ip = socket.gethostbyname(host)
-                    latency_ms = (time.time() - start_time) * 1000
-                    proxy.status = "Reachable"
-                    proxy.latency = f"{latency_ms:.0f}ms (Resolve)"
-                    proxy.info = f"Endpoint IP: {resolved_ip}"
-                    Clock.schedule_once(lambda dt: app.root.log_message(f"-> Success for {proxy.label}. Endpoint resolved."))
-                    
-                    Clock.schedule_once(lambda dt: app.root.log_message(f"-> Performing Geo-IP lookup for WireGuard IP {resolved_ip}..."))
-                    try:
-                        response = requests.get(f"https://ip-api.com/json/{resolved_ip}?fields=status,message,country,regionName", timeout=10)
-                        response.raise_for_status()
-                        geo_data = response.json()
-                        if geo_data.get("status") == "success":
-                            proxy.info = f"{geo_data.get('country', 'N/A')}, {geo_data.get('regionName', 'N/A')} - {resolved_ip}"
-                            Clock.schedule_once(lambda dt: app.root.log_message(f"-> Geo-IP for WG Success: {proxy.info}"))
-                    except Exception as e:
-                        Clock.schedule_once(lambda dt, exc=e: app.root.log_message(f"-> Geo-IP for WG failed: {exc}"))
-
-                except socket.gaierror:
-                    raise Exception("Host Not Found")
-            
-            elif ptype in ('socks5', 'http') and DEPENDENCIES_AVAILABLE:
-                Clock.schedule_once(lambda dt: app.root.log_message(f"-> Performing Geo-IP check for {host}:{port}..."))
-                proxy_url = f"{'socks5h' if ptype == 'socks5' else 'http'}://"
-                if user and pw: proxy_url += f"{user}:{pw}@"
-                proxy_url += f"{host}:{port}"
-                proxies = {"http": proxy_url, "https": proxy_url}
-                
-                try:
-                    start_time = time.time()
-                    api_url = "https://ip-api.com/json/?fields=status,message,country,regionName,query"
-                    response = requests.get(api_url, proxies=proxies, timeout=15, verify=False)
-                    latency_ms = (time.time() - start_time) * 1000
-                    response.raise_for_status()
-                    api_data = response.json()
-                    if api_data.get("status") != "success": raise Exception("API 1 Error")
-                    proxy.info = f"{api_data.get('country', 'N/A')}, {api_data.get('regionName', 'N/A')} - {api_data.get('query', 'N/A')}"
-                except Exception as e1:
-                    Clock.schedule_once(lambda dt: app.root.log_message(f"-> API 1 failed: {e1}. Trying fallback..."))
-                    start_time = time.time()
-                    api_url = "https://ipinfo.io/json"
-                    response = requests.get(api_url, proxies=proxies, timeout=15, verify=False)
-                    latency_ms = (time.time() - start_time) * 1000
-                    response.raise_for_status()
-                    api_data = response.json()
-                    proxy.info = f"{api_data.get('country', 'N/A')}, {api_data.get('region', 'N/A')} - {api_data.get('ip', 'N/A')}"
-                
-                proxy.status = "Reachable"
-                proxy.latency = f"{latency_ms:.0f}ms"
-                Clock.schedule_once(lambda dt: app.root.log_message(f"-> Geo-IP Success for {proxy.label}: {proxy.info}"))
-
-            else: # Fallback for other types or if dependencies are missing
-                latency_ms, resolved_ip = _tcp_ping_host(host, int(port))
-                if latency_ms == float('inf'):
-                    raise Exception(resolved_ip)
-                proxy.status = "Reachable"
-                proxy.latency = f"{latency_ms:.0f}ms"
-                proxy.info = f"Resolved IP: {resolved_ip}"
-                Clock.schedule_once(lambda dt: app.root.log_message(f"-> Ping Success for {proxy.label}. Latency: {proxy.latency}"))
+    def ensure_network(self):
+        """Imports the network stack on the first check and loads the persisted Geo-IP cache."""
+        if self.net is None:
+            start = time.perf_counter()
+            import boxconfig.checks  # also imports boxconfig.network
+            net = boxconfig.network
+            cached_geo = net.GEOIP_CACHE.load(os.path.join(MDApp.get_running_app().user_data_dir, "geoip_cache.json"))
+            self.log_message(f"Network stack loaded in {(time.perf_counter() - start) * 1000:.0f}ms.")
+            if cached_geo: self.log_message(f"Loaded {cached_geo} cached Geo-IP entries.")
+            self.net = net
+        return self.net
+
+    def _worker_check_proxy(self, proxy: AddedProxy) -> bool:
+        from boxconfig.checks import check_proxy
+        return check_proxy(proxy, hedged=self.hedged_geoip, log=self.app_log.log, on_update=lambda fields: self.ui_updates.post(proxy, fields))
 
-        except Exception as e:
-            proxy.status = "Unreachable"
-            proxy.latency = "N/A"
-            error_message = str(e).splitlines()[0]
-            proxy.info = f"Error: {error_message}"
-            Clock.schedule_once(lambda dt: app.root.log_message(f"-> Failure for {proxy.label}. Reason: {error_message}"))
-
-        if proxy.ui_widget:
-            Clock.schedule_once(lambda dt: proxy.ui_widget.update_ui())
-            
     def generate_config(self, instance=None):
-        outbounds = [{"type": "direct", "tag": "direct"}]
-        proxy_tags = []
-        final_route_tag = "direct"
-        dns_detour_tag = "direct"
         selected_proxies = [p for p in self.added_proxies if p.selected]
-
-        if selected_proxies:
-            for p in selected_proxies:
-                ob = _outbound_from_added(outbound_tag_for_type, p)
-                if ob:
-                    ob['tag'] = ob['tag'].split('-')[0]
-                    if ob['tag'] in [o['tag'] for o in outbounds]:
-                        ob['tag'] = f"{ob['tag']}_{p.data.get('server_port')}"
-                    outbounds.append(ob)
-                    proxy_tags.append(ob["tag"])
-            
-            if proxy_tags:
-                proxy_selector = {
-                    "type": "selector",
-                    "tag": "PROXY",
-                    "outbounds": proxy_tags + ["direct"],
-                    "default": proxy_tags[0]
-                }
-                outbounds.append(proxy_selector)
-
-                dns_selector = {
-                    "type": "selector",
-                    "tag": "dns-out",
-                    "outbounds": proxy_tags + ["direct"],
-                    "default": proxy_tags[0]
-                }
-                outbounds.append(dns_selector)
-
-                final_route_tag = "PROXY"
-                dns_detour_tag = "dns-out"
-            
-            self.show_dialog("Generated", f"Config created with {len(proxy_tags)} proxies.")
-            self.log_message(f"Generated config with {len(proxy_tags)} proxies.")
+        t0 = time.perf_counter()
+        options = generation_options(self.gen_settings)
+        self.generated_config, proxy_tags = build_config(selected_proxies, self.fragment_cache, **options)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+
+        if proxy_tags:
+            best = "urltest picks the fastest" if options["urltest"] is not None else f"default {proxy_tags[0]}"
+            self.show_dialog("Generated", f"Config created with {len(proxy_tags)} proxies ({best}).")
+            self.log_message(f"Generated config with {len(proxy_tags)} proxies in {elapsed_ms:.0f}ms, {best} "
+                             f"(reused {self.fragment_cache.reused}/{len(proxy_tags)} outbound fragments).")
+        elif selected_proxies:
+            self.show_dialog("Generated", "No selected proxy is usable; direct-only config generated.")
         else:
             self.show_dialog("Generated", "Direct-only config generated.")
 
-        config_template = {
-            "log": {"level": "error"},
-            "dns": {
-                "servers": [
-                    {
-                        "address": "https://1.1.1.1/dns-query",
-                        "detour": dns_detour_tag
-                    }
-                ]
-            },
-            "inbounds": [
-                {
-                    "type": "tproxy",
-                    "tag": "tproxy-in",
-                    "listen": "::",
-                    "listen_port": 9898,
-                    "sniff": True
-                },
-                {
-                    "type": "redirect",
-                    "tag": "redirect-in",
-                    "listen": "::",
-                    "listen_port": 9797,
-                    "sniff": True,
-                    "sniff_override_destination": False
-                }
-            ],
-            "outbounds": outbounds,
-            "route": {
-                "final": final_route_tag,
-                "auto_detect_interface": False
-            },
-            "experimental": {
-                "clash_api": {
-                    "external_controller": "0.0.0.0:9090",
-                    "external_ui": "dashboard"
-                }
-            }
-        }
-        self.generated_config = json.dumps(config_template, indent=2)
-
     def view_config(self, instance):
         if not self.generated_config: self.show_dialog("Error", "No config generated yet."); return
         content_box = MDBoxLayout(orientation="vertical", adaptive_height=True)
@@ -813,11 +994,17 @@ class MainScreen(MDScreen):
             self.log_message(f"Config saved to {save_path}")
         except Exception as e:
             self.show_dialog("Error", f"Failed to save: {e}")
-            self.log_message(f"Error saving config: {e}")
+            self.log_message(f"Error saving config: {e}", ERROR)
 
     def toggle_dns(self, instance, value):
         self.dns_protection_on = value
         self.log_message(f"DNS Protection turned {'ON' if value else 'OFF'}.")
+        MDApp.get_running_app().save_state()
+
+    def toggle_hedged_geoip(self, instance, value):
+        self.hedged_geoip = value
+        self.log_message(f"Hedged Geo-IP requests turned {'ON' if value else 'OFF'}.")
+        MDApp.get_running_app().save_state()
 
     def edit_proxy(self, proxy: AddedProxy):
         content = MDTextField(text=proxy.raw if proxy.raw else json.dumps(proxy.data, indent=2), multiline=True)
@@ -825,34 +1012,46 @@ class MainScreen(MDScreen):
     
     def save_proxy_edit(self, proxy, text):
         self.dialog.dismiss()
-        ptype = proxy.ptype.lower()
+        ptype = proxy.ptype.lower(); app = MDApp.get_running_app()
         try:
-            original_label = proxy.label
+            original_label = proxy.label; original = (proxy.ptype, proxy.raw, proxy.data, proxy.parsed, proxy.updated_at)
+            identity = proxy_identity(proxy)
             if proxy.raw: # For link-based proxies
-                proxy.raw = text.strip()
-                decoded = {}
-                if ptype == "vmess": decoded = _decode_vmess(proxy.raw)
-                elif ptype == "vless": decoded = _decode_vless(proxy.raw)
-                elif ptype == "shadowsocks": decoded = _decode_shadowsocks(proxy.raw)
-                if decoded.get('server'): 
-                    proxy.label = f"{ptype.upper()} {decoded.get('server')}"
+                edited, reason = proxy_from_link(text)
+                if edited is None:
+                    self.show_dialog("Error", f"Invalid link for edit: {reason}. Edit discarded.")
+                    self.log_message(f"Discarded edit of '{original_label}': {reason}.", WARNING); return
+                proxy.ptype = edited.ptype; proxy.label = edited.label; proxy.data = edited.data; proxy.raw = edited.raw; proxy.parsed = edited.parsed
             else: # For form-based proxies
                 proxy.data = json.loads(text)
                 if proxy.data.get('server'): 
                     proxy.label = f"{ptype.upper()} {proxy.data.get('server')}"
+            proxy.updated_at = time.time()
+            duplicate = self.proxy_index.find(proxy)
+            if duplicate is not None:
+                if self.merge_policy == MERGE_SKIP:
+                    proxy.ptype, proxy.raw, proxy.data, proxy.parsed, proxy.updated_at = original; proxy.label = original_label
+                    self.show_dialog("Duplicate", f"The edit matches '{duplicate.label}', which is already in the list. Edit discarded.")
+                    self.log_message(f"Discarded edit of '{original_label}': duplicate of '{duplicate.label}'."); return
+                # The edited proxy is always the newest copy, so both other policies keep it.
+                self.added_proxies.remove(duplicate); self.proxy_index.discard(duplicate); app.state.proxy_removed(duplicate); self._row_heights.pop(id(duplicate), None)
+                self.log_message(f"Removed duplicate '{duplicate.label}' after edit.")
+            if proxy_identity(proxy) != identity: forget_checks(proxy)  # the results describe the old endpoint
+            self.proxy_index.rekey(proxy); app.state.proxy_changed(proxy)
             self.log_message(f"Edited proxy '{original_label}' to '{proxy.label}'.")
             self.refresh_added_list()
         except Exception as e:
             self.show_dialog("Error", f"Invalid format for edit: {e}")
-            self.log_message(f"Failed to save proxy edit: {e}")
+            self.log_message(f"Failed to save proxy edit: {e}", ERROR)
 
 class SingboxApp(MDApp):
     def build(self):
         # [MODIFIED] App title changed
-        self.title = "BoxConfig"; self.theme_cls.primary_palette = "BlueGray"; self.theme_cls.accent_palette = "Amber"; self.theme_cls.theme_style = "Dark"
-        self.store = JsonStore(os.path.join(self.user_data_dir, 'settings.json'))
-        Window.bind(on_request_close=self.handle_back_button)
-        return MainScreen()
+        with STARTUP.phase("build"):
+            self.title = "BoxConfig"; self.theme_cls.primary_palette = "BlueGray"; self.theme_cls.accent_palette = "Amber"; self.theme_cls.theme_style = "Dark"
+            self.state = StateStore(os.path.join(self.user_data_dir, 'settings.json'))
+            Window.bind(on_request_close=self.handle_back_button)
+            return MainScreen()
 
     def handle_back_button(self, *args, **kwargs):
         """Handles the back button press for natural navigation."""
@@ -863,40 +1062,72 @@ class SingboxApp(MDApp):
         return False
 
     def on_start(self):
-        if self.store.exists('settings'):
-            settings = self.store.get('settings')
+        Window.bind(on_flip=self._on_first_frame)
+        main_screen = self.root
+        with STARTUP.phase("state load"): settings, proxies = self.state.load()
+        self.state.track(main_screen.added_proxies, owner_call=lambda fn: Clock.schedule_once(lambda dt: fn()))
+        self.state.log = main_screen.app_log.log
+        if settings or proxies:
             theme_style = settings.get('theme_style', 'Dark')
             self.theme_cls.theme_style = theme_style
-            self.root.theme_button.text = f"Theme: {theme_style}"
-            dns_on = settings.get('dns_on', False)
-            self.root.dns_protection_on = dns_on
-            self.root.dns_switch.active = dns_on
-            proxies_data = settings.get('proxies', [])
-            main_screen = self.root
-            main_screen.added_proxies.clear()
-            for p_data in proxies_data:
-                p_data.pop('_ui_widget_ref', None)
-                main_screen.added_proxies.append(AddedProxy(**p_data))
-            main_screen.refresh_added_list()
-            self.root.log_message("Loaded saved state from settings.")
+            try: main_screen.check_concurrency = max(1, int(settings.get('check_concurrency') or DEFAULT_CHECK_CONCURRENCY))
+            except ValueError: main_screen.check_concurrency = DEFAULT_CHECK_CONCURRENCY
+            try: main_screen.check_deadline = int(settings.get('check_deadline') or 0)
+            except ValueError: main_screen.check_deadline = 0
+            main_screen.dns_protection_on = settings.get('dns_on', False)
+            main_screen.hedged_geoip = settings.get('hedged_geoip', False)
+            main_screen.merge_policy = settings.get('merge_policy', MERGE_SKIP) if settings.get('merge_policy') in MERGE_POLICIES else MERGE_SKIP
+            main_screen.app_log.level = settings.get('log_level', INFO) if settings.get('log_level') in LEVEL_NAMES else INFO
+            main_screen.monitor_on = bool(settings.get('monitor_on', True))
+            main_screen.gen_settings.update((k, settings[k]) for k in GENERATION_SETTINGS if k in settings)
+            main_screen.speed_settings.update((k, settings[k]) for k in THROUGHPUT_SETTINGS if k in settings)
+            with STARTUP.phase("state load"):
+                main_screen.added_proxies.clear()
+                main_screen.added_proxies.extend(proxies)
+                main_screen.proxy_index.rebuild(main_screen.added_proxies)
+            with STARTUP.phase("refresh_added_list"): main_screen.refresh_added_list()
+            self.root.log_message(f"Loaded {len(proxies)} saved proxies in {self.state.load_ms:.0f}ms "
+                                  f"({self.state.journal_records} journal records replayed).")
+
+    def _on_first_frame(self, *args):
+        Window.unbind(on_flip=self._on_first_frame)
+        STARTUP.first_frame()
+        self.root.log_message(STARTUP.summary())
+        if STARTUP.first_frame_ms > STARTUP_BUDGET_MS:
+            self.root.log_message(f"Startup exceeded its {STARTUP_BUDGET_MS:.0f}ms budget.", WARNING)
+        Clock.schedule_once(lambda dt: self.root.start_monitor(), MONITOR_START_DELAY)
+
+    def on_pause(self):
+        self.root.monitor.pause()  # no background checks while the app is in the background
+        return True
+
+    def on_resume(self):
+        self.root.monitor.resume(); self.root.refresh_visible_rows()
 
     def save_state(self):
+        """Records the current settings; proxy changes are marked where they happen. Writes are debounced by the store."""
         main_screen = self.root
-        proxies_data = []
-        for p in main_screen.added_proxies:
-            p_dict = p.__dict__.copy()
-            p_dict.pop('_ui_widget_ref', None) 
-            proxies_data.append(p_dict)
-        
-        self.store.put('settings',
+        self.state.update_settings(
             theme_style=self.theme_cls.theme_style,
             dns_on=main_screen.dns_protection_on,
-            proxies=proxies_data
+            hedged_geoip=main_screen.hedged_geoip,
+            merge_policy=main_screen.merge_policy,
+            check_concurrency=main_screen.check_concurrency,
+            check_deadline=main_screen.check_deadline,
+            log_level=main_screen.app_log.level,
+            monitor_on=main_screen.monitor_on,
+            **main_screen.gen_settings, **main_screen.speed_settings
         )
 
     def on_stop(self):
         self.root.log_message("Application stopping. Saving state.")
-        self.save_state()
+        self.root.check_engine.cancel(); self.root.speed_engine.cancel(); self.root.stop_monitor()
+        net = self.root.net
+        if net:
+            net.GEOIP_CACHE.save()
+            if net.SESSIONS: net.SESSIONS.close_all()
+        self.save_state(); self.state.close()
+        self.root.app_log.close()
 
 if __name__ == "__main__":
     SingboxApp().run()